@@ -0,0 +1,100 @@
+"""Benchmark of loading a large fiction config, as a Box validated with a new schema and as a typed config.
+
+Usage: python -m benchmarks.config_loading [SUBSTITUTIONS] [RUNS]
+"""
+import os
+import pickle
+import sys
+import tempfile
+import time
+
+from box import Box
+from schema import Schema
+
+from scraper.config import FictionConfig, read_config_file, validate_fiction_config
+from scraper.const import FICTION_CONFIG_SCHEMA
+
+CONFIG_HEADER = """startUrl: https://www.royalroad.com/fiction/1/benchmark/chapter/0/chapter
+tocUrl: https://www.royalroad.com/fiction/1/benchmark
+tocLinkSelector: "#chapters tbody tr.chapter-row td:first-child a"
+skipUrls:
+%(skip_urls)s
+metadata:
+  title: Benchmark Fiction
+  author: Benchmark Author
+  description: A fiction with a long list of substitutions
+selectors:
+  titleElement: .fic-header h1
+  contentElement: .chapter-content
+  nextChapterElement: .nav-buttons a
+  contentStartElement:
+%(content_start)s
+  cutOffElement:
+    - hr.end
+    - div.author-note
+substitutions:
+"""
+
+SUBSTITUTION = """  - selectorType: %(type)s
+    selector: "%(selector)s"
+    chapterUrl: https://www.royalroad.com/fiction/1/benchmark/chapter/%(index)s/chapter
+    replaceWith: "replacement %(index)s"
+    warn: false
+"""
+
+
+def create_config_file(path, substitutions):
+    types = [("css", "p.note-%s"), ("text", "Typo %s"), ("regex", r"Pattern\\s+%s")]
+    with open(path, "w", encoding="utf-8") as file:
+        file.write(CONFIG_HEADER % {
+            "skip_urls": "".join("  - https://www.royalroad.com/fiction/1/benchmark/chapter/%s/skip\n" % i for i in range(substitutions // 10)),
+            "content_start": "".join(
+                "    - chapterUrl: https://www.royalroad.com/fiction/1/benchmark/chapter/%s/chapter\n      selector: p.start\n" % i
+                for i in range(substitutions // 10)
+            ),
+        })
+        for i in range(substitutions):
+            selector_type, selector = types[i % len(types)]
+            file.write(SUBSTITUTION % {"type": selector_type, "selector": selector % i, "index": i})
+
+
+def load_box(path):
+    config = Box.from_yaml(filename=path, camel_killer_box=True, default_box=True)
+    return config, Schema(FICTION_CONFIG_SCHEMA).validate(config)
+
+
+def load_typed(path):
+    data = read_config_file(path)
+    return data, FictionConfig.from_dict(validate_fiction_config(data))
+
+
+def measure(func, runs):
+    durations = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = func()
+        durations.append(time.perf_counter() - start)
+    return min(durations), result
+
+
+def main(substitutions=2000, runs=5):
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "benchmark.yaml")
+        create_config_file(path, substitutions)
+
+        print("Config with %s substitutions, %.0f KB" % (substitutions, os.path.getsize(path) / 1024))
+        print("%-14s %10s %12s %10s %12s" % ("", "total ms", "validate ms", "build ms", "pickled KB"))
+
+        # Parsing the YAML file takes the same time for both, the validation of the parsed data is measured separately
+        total, (box, validated) = measure(lambda: load_box(path), runs)
+        validate, _ = measure(lambda: Schema(FICTION_CONFIG_SCHEMA).validate(box), runs)
+        print("%-14s %10.1f %12.1f %10s %12.1f" % ("Box", total * 1000, validate * 1000, "-", len(pickle.dumps(validated)) / 1024))
+
+        total, (data, config) = measure(lambda: load_typed(path), runs)
+        validate, validated = measure(lambda: validate_fiction_config(data), runs)
+        build, _ = measure(lambda: FictionConfig.from_dict(validated), runs)
+        print("%-14s %10.1f %12.1f %10.1f %12.1f" % ("typed config", total * 1000, validate * 1000, build * 1000, len(pickle.dumps(config)) / 1024))
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
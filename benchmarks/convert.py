@@ -0,0 +1,68 @@
+"""Benchmark of Converter.convert with a synthetic Royal Road chapter.
+
+Usage: python -m benchmarks.convert [CHAPTERS]
+"""
+import sys
+import time
+
+from scraper.config import FictionConfig
+from scraper.converter import Converter
+
+PARAGRAPH = "<p>%s</p>" % ("Lorem ipsum dolor sit amet, <em>consectetur</em> adipiscing elit &amp; more. " * 6)
+
+CHAPTER_PAGE = """<!DOCTYPE html>
+<html><head><title>Chapter %(index)s - Benchmark Fiction | Royal Road</title>
+<style>.cjBenchmark{
+display: none;
+speak: never;
+}</style></head>
+<body><div class="page-container">%(boilerplate)s
+<div class="fic-header"><h1>Chapter %(index)s</h1></div>
+<div class="chapter-inner chapter-content">%(paragraphs)s<p class="cjBenchmark">This story was stolen.</p>%(paragraphs)s</div>
+<div class="nav-buttons"><a href="/fiction/1/benchmark/chapter/%(next)s/chapter">Next Chapter</a></div>
+%(boilerplate)s</div></body></html>
+"""
+
+BOILERPLATE = "".join('<div class="widget"><ul>%s</ul></div>' % ('<li><a href="/x">Link</a></li>' * 20) for _ in range(20))
+
+CONFIG = FictionConfig.from_dict({
+    "start_url": "https://www.royalroad.com/fiction/1/benchmark/chapter/0/chapter",
+    "metadata": {"title": "Benchmark Fiction", "author": "Benchmark Author"},
+    "selectors": {
+        "title_element": ".fic-header h1",
+        "content_element": ".chapter-content",
+        "next_chapter_element": ".nav-buttons a",
+        "content_start_element": None,
+        "cut_off_element": None,
+    },
+    "substitutions": [
+        {"selector_type": "css", "selector": "p.author-note", "chapter_url": "", "replace_with": "", "warn": False},
+        {"selector_type": "text", "selector": "Lorem", "chapter_url": "", "replace_with": "Lorum", "warn": True},
+        {"selector_type": "regex", "selector": r"dolor\s+sit", "chapter_url": "", "replace_with": "dolor", "warn": True},
+    ],
+})
+
+
+def chapter_page(index, paragraphs=30):
+    return CHAPTER_PAGE % {
+        "index": index,
+        "next": index + 1,
+        "paragraphs": PARAGRAPH * (paragraphs // 2),
+        "boilerplate": BOILERPLATE,
+    }
+
+
+def main(chapters=200):
+    converter = Converter(CONFIG, load_manifest=False)
+    pages = [chapter_page(i) for i in range(chapters)]
+
+    start = time.perf_counter()
+    for (i, page) in enumerate(pages):
+        converter.convert(page, {"title": "Chapter %s" % i, "url": "https://www.royalroad.com/fiction/1/benchmark/chapter/%s/chapter" % i})
+    duration = time.perf_counter() - start
+
+    print("Converted %s chapters in %.2fs, %.2fms per chapter" % (chapters, duration, duration / chapters * 1000))
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,173 @@
+"""Synthetic fiction sites for the benchmarks, served by a local HTTP server.
+
+The pages follow the layouts of Royal Road, FictionPress and The Wandering Inn, so the selectors of the config
+generators and the Royal Road chapter fixes apply to them. Chapters are generated from their index, so every request
+for a chapter returns the same page.
+"""
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PARAGRAPH = "<p>Chapter %(index)s, paragraph %(p)s: Lorem ipsum dolor sit amet, <em>consectetur</em> adipiscing " \
+            "elit &amp; more. Sed do eiusmod tempor incididunt ut labore et dolore magna aliqua.</p>"
+
+NAVIGATION = "".join('<li><a href="/browse/%s">Category %s</a></li>' % (i, i) for i in range(40))
+SIDEBAR = "".join('<div class="widget"><h4>Widget %s</h4><ul>%s</ul></div>' % (i, NAVIGATION) for i in range(12))
+SCRIPT = "<script>%s</script>" % ("window.dataLayer.push({'event': 'view', 'id': 12345});" * 200)
+
+
+def paragraphs(index, count=40):
+    return "".join(PARAGRAPH % {"index": index, "p": p} for p in range(count))
+
+
+def royalroad_chapter(index, chapters):
+    next_link = '<a class="btn btn-primary" href="/royalroad/fiction/1/benchmark/chapter/%s/c">Next <br/>Chapter</a>' % (index + 1) \
+        if index + 1 < chapters else '<button class="btn btn-primary" disabled>Next <br/>Chapter</button>'
+    return """<!DOCTYPE html>
+<html><head><title>Chapter %(index)s - Benchmark Fiction | Royal Road</title>%(script)s
+<style>.cjBench%(index)s{
+display: none;
+speak: never;
+}</style></head>
+<body><div class="page-container"><nav><ul>%(navigation)s</ul></nav>
+<div class="fic-header"><h1 class="font-white">Chapter %(index)s</h1><h2>Benchmark Fiction</h2></div>
+<div class="chapter-inner chapter-content">%(paragraphs)s<p class="cjBench%(index)s">This story was stolen from Royal Road.</p></div>
+<div class="nav-buttons">%(next)s</div>
+<div class="sidebar">%(sidebar)s</div></div></body></html>
+""" % {"index": index, "next": next_link, "paragraphs": paragraphs(index), "navigation": NAVIGATION, "sidebar": SIDEBAR, "script": SCRIPT}
+
+
+def royalroad_toc(chapters):
+    rows = "".join(
+        '<tr class="chapter-row"><td><a href="/royalroad/fiction/1/benchmark/chapter/%s/c">Chapter %s</a></td><td>1 day ago</td></tr>' % (i, i)
+        for i in range(chapters)
+    )
+    return """<!DOCTYPE html>
+<html><head><title>Benchmark Fiction | Royal Road</title></head>
+<body><div class="fic-header"><h1>Benchmark Fiction</h1></div><table id="chapters"><tbody>%s</tbody></table></body></html>
+""" % rows
+
+
+def fictionpress_chapter(index, chapters):
+    options = "".join('<option value="%s"%s>%s. Chapter %s</option>' % (i + 1, " selected" if i == index else "", i + 1, i) for i in range(chapters))
+    # The crawler follows the href attribute of the next chapter element, so the button has one
+    next_button = '<button class="btn" type="button" href="/fictionpress/s/1/%s/Benchmark">Next &gt;</button>' % (index + 2) \
+        if index + 1 < chapters else ""
+    return """<!DOCTYPE html>
+<html><head><title>Benchmark Fiction Chapter %(index)s, a fiction | FictionPress</title>%(script)s</head>
+<body><div id="top"><ul>%(navigation)s</ul></div>
+<div id="profile_top"><b class="xcontrast_txt">Benchmark Fiction</b> By: <a class="xcontrast_txt" href="/u/1/">Author</a></div>
+<span><select id="chap_select">%(options)s</select></span>
+<div id="storytext" class="storytext xcontrast_txt">%(paragraphs)s</div>
+<span>%(next)s</span></body></html>
+""" % {"index": index, "options": options, "next": next_button, "paragraphs": paragraphs(index), "navigation": NAVIGATION, "script": SCRIPT}
+
+
+def wanderinginn_chapter(index, chapters):
+    next_link = '<a href="/wanderinginn/%s/chapter-%s/">Next Chapter</a>' % (index + 1, index + 1) if index + 1 < chapters else ""
+    return """<!DOCTYPE html>
+<html><head><title>%(index)s.00 &#8211; The Wandering Inn</title>%(script)s</head>
+<body><div id="page"><header><ul>%(navigation)s</ul></header>
+<article><header class="entry-header"><h1 class="entry-title">%(index)s.00</h1></header>
+<div class="entry-content"><p><a href="/wanderinginn/%(previous)s/">Previous Chapter</a> <a href="/table-of-contents/">Table of Contents</a></p>
+%(paragraphs)s<hr/><p><a href="/wanderinginn/%(previous)s/">Previous Chapter</a> %(next)s</p></div></article>
+<aside>%(sidebar)s</aside></div></body></html>
+""" % {"index": index, "previous": index - 1, "next": next_link, "paragraphs": paragraphs(index), "navigation": NAVIGATION,
+       "sidebar": SIDEBAR, "script": SCRIPT}
+
+
+# Selectors of the generated configs of the sites, or of the published config for The Wandering Inn
+SITES = {
+    "royalroad": {
+        "start_path": "/royalroad/fiction/1/benchmark/chapter/0/c",
+        "toc_path": "/royalroad/fiction/1/benchmark",
+        "toc_link_selector": "#chapters tbody tr.chapter-row td:first-child a",
+        "selectors": {
+            "title_element": ".fic-header h1",
+            "content_element": ".chapter-content",
+            "next_chapter_element": ".nav-buttons a:-soup-contains(\"Next Chapter\")",
+        },
+    },
+    "fictionpress": {
+        "start_path": "/fictionpress/s/1/1/Benchmark",
+        "selectors": {
+            "title_element": "select#chap_select option[selected]",
+            "content_element": "#storytext",
+            "next_chapter_element": "button.btn:-soup-contains(\"Next\")",
+        },
+    },
+    "wanderinginn": {
+        "start_path": "/wanderinginn/0/chapter-0/",
+        "selectors": {
+            "title_element": "h1.entry-title",
+            "content_element": ".entry-content",
+            "next_chapter_element": ".entry-content a:-soup-contains(\"Next Chapter\")",
+            "cut_off_element": "hr",
+        },
+    },
+}
+
+# Routes of the chapter pages, with the offset of the chapter numbers in their paths
+ROUTES = [
+    (re.compile(r"/royalroad/fiction/1/benchmark/chapter/(\d+)/c"), royalroad_chapter, 0),
+    (re.compile(r"/fictionpress/s/1/(\d+)/Benchmark"), fictionpress_chapter, 1),
+    (re.compile(r"/wanderinginn/(\d+)/chapter-\d+/"), wanderinginn_chapter, 0),
+]
+
+
+def render_page(path, chapters):
+    """Render the page of a path, or return None if there is no such page."""
+    if path == SITES["royalroad"]["toc_path"]:
+        return royalroad_toc(chapters)
+
+    for (pattern, render, offset) in ROUTES:
+        if (m := pattern.fullmatch(path)) and 0 <= (index := int(m.group(1)) - offset) < chapters:
+            return render(index, chapters)
+
+    return None
+
+
+class FixtureServer(ThreadingHTTPServer):
+    """Serves the fixture sites with a fiction of the given number of chapters, in a background thread."""
+
+    daemon_threads = True
+
+    def __init__(self, chapters, port=0):
+        super().__init__(("127.0.0.1", port), FixtureRequestHandler)
+        self.chapters = chapters
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        return "http://127.0.0.1:%s" % self.server_address[1]
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.shutdown()
+        self.server_close()
+
+
+class FixtureRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately, which would otherwise wait for delayed ACKs on keep-alive connections
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        page = render_page(self.path, self.server.chapters)
+
+        if page is None:
+            self.send_error(404)
+            return
+
+        content = page.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        pass
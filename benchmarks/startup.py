@@ -0,0 +1,47 @@
+"""Benchmark of the CLI startup time.
+
+Runs CLI commands which don't need the client in new processes and reports their wall time, next to the time of an
+empty interpreter, which is the lower bound.
+
+Usage: python -m benchmarks.startup [RUNS]
+"""
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+CLI = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "webfictionscraper.py")
+
+COMMANDS = {
+    "interpreter": [sys.executable, "-c", "pass"],
+    "--help": [sys.executable, CLI, "--help"],
+    "list-configs": [sys.executable, CLI, "list-configs"],
+    "print-paths": [sys.executable, CLI, "print-paths"],
+    "import scraper": [sys.executable, "-c", "import scraper"],
+}
+
+
+def measure(command, runs):
+    durations = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def main(runs=20):
+    baseline = None
+    print("%-16s %10s %10s %14s" % ("command", "min ms", "median ms", "over python ms"))
+
+    for (name, command) in COMMANDS.items():
+        durations = measure(command, runs)
+        median = statistics.median(durations)
+        if baseline is None:
+            baseline = median
+        print("%-16s %10.1f %10.1f %14.1f" % (name, min(durations) * 1000, median * 1000, (median - baseline) * 1000))
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
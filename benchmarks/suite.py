@@ -0,0 +1,170 @@
+"""Offline benchmark of the download, conversion and binding stages with synthetic fictions.
+
+The chapters are served by a local HTTP server with the page layouts of Royal Road, FictionPress and The Wandering Inn
+(see benchmarks.fixtures), so no requests leave the machine. Each stage runs in its own process, which reports its
+duration and peak memory.
+
+Usage: python -m benchmarks.suite [--chapters 100,1000,5000] [--sites royalroad,fictionpress,wanderinginn]
+                                  [--crawler Crawler|AsyncCrawler] [--streaming-bind] [--output FILE]
+"""
+import argparse
+import dataclasses
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, where the peak memory of Python allocations is measured with tracemalloc instead
+    resource = None
+
+from scraper.config import FictionConfig, validate_fiction_config
+from benchmarks.fixtures import SITES, FixtureServer
+
+STAGES = ["crawl", "convert", "bind"]
+
+
+def create_config(site: str, base_url: str, working_folder: str, crawler_module: str = "Crawler",
+                  streaming_bind: bool = False) -> FictionConfig:
+    """Create a validated fiction config for a fixture site, with the file paths the client would derive."""
+    fixture = SITES[site]
+    config = {
+        "start_url": base_url + fixture["start_path"],
+        "crawler_module": crawler_module,
+        "streaming_bind": streaming_bind,
+        "metadata": {"title": "Benchmark Fiction", "author": "Benchmark Author", "identifier": "benchmark-%s" % site},
+        "selectors": dict(fixture["selectors"]),
+    }
+    if "toc_path" in fixture:
+        config["toc_url"] = base_url + fixture["toc_path"]
+        config["toc_link_selector"] = fixture["toc_link_selector"]
+
+    config = validate_fiction_config(config)
+    config["files"].update({
+        "working_folder": working_folder,
+        "cache_folder": os.path.join(working_folder, "cache"),
+        "book_folder": os.path.join(working_folder, "book"),
+        "epub_file": os.path.join(working_folder, "Benchmark Fiction.epub"),
+        "cover_file": os.path.join(working_folder, "cover.jpg"),
+        "manifest_file": os.path.join(working_folder, "manifest.json"),
+        "bind_state_file": os.path.join(working_folder, "bind.json"),
+        "format_state_file": os.path.join(working_folder, "formats.json"),
+    })
+    return FictionConfig.from_dict(config)
+
+
+def run_stage(stage: str, config: FictionConfig) -> dict:
+    """Run a stage in the current process.
+
+    :return: duration in seconds, number of processed chapters and peak memory in MB of the process
+    """
+    from scraper.manifest import Manifest
+    from scraper.chapter_fixes import register_chapter_fixes, remove_piracy_paragraphs
+
+    # The Royal Road chapter fixes are registered by host, so they're added for the fixture server as well
+    base_url = config.start_url[:config.start_url.index("/", len("http://"))]
+    register_chapter_fixes({base_url + "/royalroad/": remove_piracy_paragraphs})
+
+    if resource is None:
+        tracemalloc.start()
+    start = time.perf_counter()
+
+    if stage == "crawl":
+        from scraper.crawler import Crawler, AsyncCrawler
+        crawler = AsyncCrawler(config) if config.crawler_module == "AsyncCrawler" else Crawler(config)
+        crawler.start_download()
+        chapters = len(Manifest(config.files.manifest_file))
+    elif stage == "convert":
+        # Chapters are converted in this process, to measure Converter.convert without the worker pool
+        from scraper.converter import Converter
+        converter = Converter(config)
+        for (i, chapter) in enumerate(converter.manifest):
+            converter.convert_file(i, chapter)
+            converter.manifest.put(i, {**chapter, "converted": True})
+        converter.manifest.save()
+        chapters = len(converter.manifest)
+    else:
+        from scraper.binder import Binder
+        binder = Binder(config)
+        binder.bind_book()
+        chapters = len(binder.manifest)
+
+    duration = time.perf_counter() - start
+
+    if resource is None:
+        peak_memory = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+        tracemalloc.stop()
+    else:
+        # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+        peak_memory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+    return {"duration": duration, "chapters": chapters, "peak_memory": peak_memory}
+
+
+def benchmark(site: str, chapters: int, crawler_module: str, streaming_bind: bool) -> dict:
+    """Download, convert and bind a synthetic fiction, running each stage in a new process."""
+    results = {}
+    with FixtureServer(chapters) as server, tempfile.TemporaryDirectory() as folder:
+        for f in ("cache", "book"):
+            os.mkdir(os.path.join(folder, f))
+        config = create_config(site, server.base_url, folder, crawler_module, streaming_bind)
+
+        for stage in STAGES:
+            p = subprocess.run(
+                [sys.executable, "-m", "benchmarks.suite", "--stage", stage, "--config", json.dumps(dataclasses.asdict(config))],
+                stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+            )
+            if p.returncode != 0:
+                raise RuntimeError("Stage %s failed for %s:\n%s" % (stage, site, p.stderr))
+            # The stages echo their progress, the result is the last line
+            results[stage] = json.loads(p.stdout.strip().splitlines()[-1])
+
+        results["epub_size"] = os.path.getsize(config.files.epub_file) / (1024 * 1024)
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark of the download, conversion and binding stages")
+    parser.add_argument("--chapters", default="100,1000,5000", help="comma separated chapter counts of the fictions")
+    parser.add_argument("--sites", default=",".join(SITES), help="comma separated fixture sites")
+    parser.add_argument("--crawler", default="Crawler", choices=["Crawler", "AsyncCrawler"])
+    parser.add_argument("--streaming-bind", action="store_true")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--stage", choices=STAGES, help=argparse.SUPPRESS)
+    parser.add_argument("--config", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.stage:
+        result = run_stage(args.stage, FictionConfig.from_dict(json.loads(args.config)))
+        print(json.dumps(result))
+        return
+
+    results = []
+    print("%-14s %8s %14s %16s %10s %10s %10s %10s" % (
+        "site", "chapters", "crawl ch/s", "convert ch/s", "bind s", "crawl MB", "convert MB", "bind MB"))
+
+    for chapters in map(int, args.chapters.split(",")):
+        for site in args.sites.split(","):
+            r = benchmark(site, chapters, args.crawler, args.streaming_bind)
+            results.append({"site": site, "chapters": chapters, **r})
+            print("%-14s %8s %14.1f %16.1f %10.2f %10.1f %10.1f %10.1f" % (
+                site, chapters,
+                r["crawl"]["chapters"] / r["crawl"]["duration"],
+                r["convert"]["chapters"] / r["convert"]["duration"],
+                r["bind"]["duration"],
+                r["crawl"]["peak_memory"], r["convert"]["peak_memory"], r["bind"]["peak_memory"],
+            ), flush=True)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,29 @@
-from .client import FictionScraperClient
-from .crawler import Crawler, WanderingInnPatreonCrawler
-from .converter import Converter
-from .binder import Binder
-from .generator import ConfigGenerator, RoyalRoadConfigGenerator
-from .manifest import Manifest
+from importlib import import_module
+
+# The classes are imported from their modules on first access, so importing a single module of the package doesn't
+# load bs4, ebooklib and requests with all the others
+_exports = {
+    "FictionScraperClient": ".client",
+    "Crawler": ".crawler",
+    "WanderingInnPatreonCrawler": ".crawler",
+    "Converter": ".converter",
+    "Binder": ".binder",
+    "ConfigGenerator": ".generator",
+    "RoyalRoadConfigGenerator": ".generator",
+    "Manifest": ".manifest",
+}
+
+__all__ = list(_exports)
+
+
+def __getattr__(name):
+    if name not in _exports:
+        raise AttributeError("module %r has no attribute %r" % (__name__, name))
+
+    value = getattr(import_module(_exports[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
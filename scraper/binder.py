@@ -1,24 +1,152 @@
+import hashlib
+import json
 import os
+import re
+import zipfile
+from multiprocessing import Pool, cpu_count
 from urllib.parse import urlparse
 
 from click import echo
 from ebooklib import epub
-from requests import get
-from click import echo
 
 from .manifest import Manifest
+from .config import FictionConfig
+from .session import get_session
+from .epub_writer import StreamingEpubWriter
+from .ebook_formats import get_format_file
 from .const import DC_KEYS
 
 
+def bind_volume(config: FictionConfig, volume: tuple, cover_file: str | None, state: dict):
+    """Bind a volume in a worker process, see Binder.bind_volume."""
+    return Binder(config, load_manifest=False).bind_volume(volume, cover_file, state)
+
+
 class Binder:
-    def __init__(self, config):
+    def __init__(self, config: FictionConfig, load_manifest=True):
         self.config = config
-        self.manifest = Manifest(config.files.manifest_file)
+        self.manifest = Manifest(config.files.manifest_file) if load_manifest else None
+
+    def bind_book(self, pool=None):
+        """Create the EPUB, or one EPUB per volume if the config splits the fiction into volumes.
+
+        Volumes are bound in parallel worker processes, each of them with its own table of contents. Volume files of
+        an earlier bind which the current volumes don't produce anymore are removed.
+
+        :param pool: multiprocessing pool to bind the volumes with, a new pool is created if not provided
+        """
+        volumes = self.get_volumes()
+        cover_file = self.get_cover_file()
+        states = self.load_bind_states() if self.config.streaming_bind else {}
+        tasks = [(self.config, v, cover_file, states.get(v[0], {})) for v in volumes]
+
+        if len(volumes) > 1:
+            # Binding is mostly CPU bound, so threads would wait for each other on the GIL
+            if pool is None:
+                with Pool(processes=min(len(volumes), cpu_count())) as pool:
+                    results = pool.starmap(bind_volume, tasks)
+            else:
+                results = pool.starmap(bind_volume, tasks)
+        else:
+            results = [self.bind_volume(*task[1:]) for task in tasks]
+
+        self.remove_stale_volumes([epub_file for (epub_file, _) in results])
+
+        if self.config.streaming_bind:
+            self.save_bind_states(dict(results))
+
+        if self.config.volumes:
+            echo("Created %s EPUB volumes!" % len(volumes))
+        else:
+            echo("Created EPUB!")
+
+    def bind_volume(self, volume: tuple[str, dict, list[dict]], cover_file: str | None, state: dict) -> tuple[str, dict | None]:
+        """Bind the EPUB file of a volume.
+
+        :param volume: EPUB file, metadata and chapters of the volume
+        :param state: state of the EPUB file from the last bind, only used in streaming mode
+        :return: tuple of the EPUB file and the state of its chapters in streaming mode
+        """
+        epub_file, metadata, chapters = volume
+        if self.config.streaming_bind:
+            return epub_file, self.bind_epub_streaming(epub_file, metadata, chapters, cover_file, state)
+        self.bind_epub(epub_file, metadata, chapters, cover_file)
+        return epub_file, None
+
+    def get_volume_file(self, number: int) -> str:
+        (root, ext) = os.path.splitext(self.config.files.epub_file)
+        return "%s - Volume %s%s" % (root, number, ext)
+
+    def remove_stale_volumes(self, epub_files: list[str]):
+        """Remove the volume EPUBs of an earlier bind which aren't part of the current ones, with the other formats
+        created from them and their bind states."""
+        (root, ext) = os.path.splitext(self.config.files.epub_file)
+        folder = os.path.dirname(self.config.files.epub_file)
+        pattern = re.compile(re.escape(os.path.basename(root)) + r" - Volume \d+" + re.escape(ext))
+        stale = [
+            os.path.join(folder, f) for f in os.listdir(folder)
+            if pattern.fullmatch(f) and os.path.join(folder, f) not in epub_files
+        ]
+
+        for epub_file in stale:
+            for path in [epub_file] + [get_format_file(epub_file, f) for f in self.config.files.ebook_formats]:
+                if os.path.isfile(path):
+                    os.remove(path)
+            echo("Removed %s, which is not a volume anymore" % os.path.basename(epub_file))
+
+        if stale and (states := self.read_bind_states()):
+            self.write_bind_states({k: v for (k, v) in states.items() if k not in stale})
+
+    def get_volumes(self) -> list[tuple[str, dict, list[dict]]]:
+        """Split the converted chapters into volumes by chapter count, size or a pattern matching the first chapter
+        title of each volume.
+
+        :return: list of EPUB file, metadata and chapters of each volume
+        """
+        chapters = [c for c in self.manifest if c.get("converted")]
+        volumes = self.config.volumes
+
+        if not volumes:
+            return [(self.config.files.epub_file, self.config.metadata, chapters)]
+
+        max_chapters = volumes.max_chapters
+        max_size = (volumes.max_size or 0) * 1024 * 1024
+        pattern = re.compile(volumes.title_pattern) if volumes.title_pattern else None
+
+        parts = [[]]
+        size = 0
+        for c in chapters:
+            chapter_size = os.path.getsize(os.path.join(self.config.files.book_folder, os.path.basename(c.get("file")))) \
+                if max_size else 0
+
+            if len(parts[-1]) > 0 and (
+                    (max_chapters and len(parts[-1]) >= max_chapters)
+                    or (max_size and size + chapter_size > max_size)
+                    or (pattern and pattern.search(c.get("title")))
+            ):
+                parts.append([])
+                size = 0
 
-    def bind_book(self):
+            parts[-1].append(c)
+            size += chapter_size
+
+        result = []
+        for (i, part) in enumerate(parts, 1):
+            metadata = self.config.metadata.copy()
+            metadata["title"] = "%s - Volume %s" % (self.config.metadata["title"], i)
+            if metadata.get("identifier"):
+                metadata["identifier"] = "%s-%s" % (self.config.metadata["identifier"], i)
+            result.append((self.get_volume_file(i), metadata, part))
+
+        return result
+
+    def get_epub_files(self) -> list[str]:
+        return [epub_file for (epub_file, _, _) in self.get_volumes()]
+
+    def bind_epub(self, epub_file: str, metadata: dict, chapters: list[dict], cover_file: str | None):
         book = epub.EpubBook()
 
-        for (m, v) in self.config.metadata.items():
+        for (m, v) in metadata.items():
             m = m.lower()
             if m in DC_KEYS:
                 if m == "identifier":
@@ -34,55 +162,160 @@ class Binder:
             else:
                 book.add_metadata(None, "meta", "", {"name": m, "content": str(v)})
 
-        cover_file = self.config.files.cover_file
         if cover_file:
-            url = urlparse(cover_file)
-            if all([url.scheme, url.netloc]):
-                file_name = os.path.basename(url.path)
-                file_path = os.path.join(self.config.files.working_folder, file_name)
-                if not os.path.isfile(file_path):
-                    echo("Downloading cover image...")
-                    r = get(cover_file, stream=True)
-                    if r.status_code == 200:
-                        with open(file_path, "wb") as file:
-                            for chunk in r:
-                                file.write(chunk)
-                cover_file = file_path
-
-            if os.path.isfile(cover_file):
-                with open(cover_file, "rb") as file:
-                    book.set_cover(os.path.basename(cover_file), file.read())
-
-        style = "@namespace epub \"http://www.idpf.org/2007/ops\";\n"
-        if self.config.style:
-            style += self.config.style
+            with open(cover_file, "rb") as file:
+                book.set_cover(os.path.basename(cover_file), file.read())
 
-        stylesheet = epub.EpubItem(uid="style", file_name="style.css", media_type="text_css", content=style)
+        stylesheet = epub.EpubItem(uid="style", file_name="style.css", media_type="text_css", content=self.get_style())
         book.add_item(stylesheet)
 
-        chapters = []
+        items = []
         base_folder = self.config.files.book_folder
-        for (i, c) in enumerate(filter(lambda x: x.get("converted"), self.manifest)):
+        for c in chapters:
             file_name = os.path.basename(c.get("file"))
             chapter = epub.EpubHtml(
                 title=c.get("title"),
                 file_name=file_name,
-                lang=self.config.metadata.language,
+                lang=metadata["language"],
             )
 
             with open(os.path.join(base_folder, file_name), "rb") as file:
                 chapter.set_content(file.read())
 
             chapter.add_item(stylesheet)
-            chapters.append(chapter)
+            items.append(chapter)
             book.add_item(chapter)
 
-        book.toc = tuple(chapters)
-        book.spine = chapters
+        book.toc = tuple(items)
+        book.spine = items
 
         book.add_item(epub.EpubNcx())
         book.add_item(epub.EpubNav())
 
-        epub.write_epub(self.config.files.epub_file, book, {})
+        epub.write_epub(epub_file, book, {})
 
-        echo("Created EPUB!")
+    def bind_epub_streaming(self, epub_file: str, metadata: dict, chapters: list[dict], cover_file: str | None, state: dict) -> dict:
+        """Create the EPUB by writing the chapters into the archive one at a time, so memory usage stays bounded.
+
+        Chapters which didn't change since the EPUB was last created are copied from it without compressing them again.
+
+        :param state: state of the EPUB file from the last bind
+        :return: state of the bound chapters
+        """
+        base_folder = self.config.files.book_folder
+        bound_chapters = state.get("chapters", {})
+        chapter_states = {}
+        copied = 0
+
+        with StreamingEpubWriter(epub_file, metadata) as writer:
+            source_file = open(epub_file, "rb") if len(bound_chapters) > 0 else None
+
+            # The existing EPUB is closed before the writer replaces it with the new one
+            try:
+                source = zipfile.ZipFile(source_file) if source_file else None
+                writer.add_stylesheet(self.get_style())
+
+                if cover_file:
+                    writer.set_cover(cover_file)
+
+                for c in chapters:
+                    file_name = os.path.basename(c.get("file"))
+                    chapter_file = os.path.join(base_folder, file_name)
+                    chapter_states[file_name] = self.get_file_state(chapter_file, bound_chapters.get(file_name))
+
+                    if source and bound_chapters.get(file_name, {}).get("hash") == chapter_states[file_name]["hash"]:
+                        writer.copy_chapter(source, source_file, c.get("title"), file_name)
+                        copied += 1
+                    else:
+                        writer.add_chapter(c.get("title"), chapter_file)
+            finally:
+                if source_file:
+                    source_file.close()
+
+        if copied > 0:
+            echo("%s: Reused %s of %s chapters from the existing EPUB" % (os.path.basename(epub_file), copied, len(chapters)))
+
+        return chapter_states
+
+    @staticmethod
+    def get_file_state(path: str, previous: dict | None = None) -> dict:
+        """Get size, modification time and content hash of a file, the hash is reused if size and time didn't change."""
+        stat = os.stat(path)
+        if previous and previous.get("size") == stat.st_size and previous.get("mtime") == stat.st_mtime_ns:
+            return previous
+
+        with open(path, "rb") as file:
+            file_hash = hashlib.sha256(file.read()).hexdigest()
+
+        return {"size": stat.st_size, "mtime": stat.st_mtime_ns, "hash": file_hash}
+
+    def read_bind_states(self) -> dict:
+        path = self.config.files.bind_state_file
+
+        if os.path.isfile(path):
+            with open(path, "r", encoding="utf-8") as file:
+                try:
+                    return json.load(file)
+                except json.JSONDecodeError:
+                    pass
+
+        return {}
+
+    def load_bind_states(self) -> dict:
+        """Load what was written into the EPUB files by the last bind, for the files which weren't changed since."""
+        states = {}
+
+        for (epub_file, state) in self.read_bind_states().items():
+            if os.path.isfile(epub_file):
+                stat = os.stat(epub_file)
+                if state.get("size") == stat.st_size and state.get("mtime") == stat.st_mtime_ns:
+                    states[epub_file] = state
+
+        return states
+
+    def save_bind_states(self, chapter_states: dict):
+        """Record the chapters of the created EPUB files.
+
+        :param chapter_states: dict of the chapter states of each created EPUB file
+        """
+        states = self.read_bind_states()
+
+        for (epub_file, chapters) in chapter_states.items():
+            stat = os.stat(epub_file)
+            states[epub_file] = {"size": stat.st_size, "mtime": stat.st_mtime_ns, "chapters": chapters}
+
+        self.write_bind_states(states)
+
+    def write_bind_states(self, states: dict):
+        path = self.config.files.bind_state_file
+        with open(path + ".tmp", "w", encoding="utf-8") as file:
+            json.dump(states, file)
+        os.replace(path + ".tmp", path)
+
+    def get_cover_file(self) -> str | None:
+        """Get the path of the cover image, which is downloaded first if the config has a URL."""
+        cover_file = self.config.files.cover_file
+        if cover_file:
+            url = urlparse(cover_file)
+            if all([url.scheme, url.netloc]):
+                file_name = os.path.basename(url.path)
+                file_path = os.path.join(self.config.files.working_folder, file_name)
+                if not os.path.isfile(file_path):
+                    echo("Downloading cover image...")
+                    r = get_session().get(cover_file, stream=True)
+                    if r.status_code == 200:
+                        with open(file_path, "wb") as file:
+                            for chunk in r:
+                                file.write(chunk)
+                cover_file = file_path
+
+            if os.path.isfile(cover_file):
+                return cover_file
+
+        return None
+
+    def get_style(self) -> str:
+        style = "@namespace epub \"http://www.idpf.org/2007/ops\";\n"
+        if self.config.style:
+            style += self.config.style
+        return style
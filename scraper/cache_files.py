@@ -0,0 +1,114 @@
+import gzip
+import io
+import os
+
+from bs4 import BeautifulSoup, Doctype, Tag
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSION_EXTENSIONS = {
+    "none": "",
+    "gzip": ".gz",
+    "zstd": ".zst",
+}
+
+
+def check_compression(compression: str) -> str | None:
+    """Check if the codec of a compression is installed.
+
+    :return: error message if it isn't installed, otherwise None
+    """
+    if compression == "zstd" and zstandard is None:
+        return "cache_compression 'zstd' requires the zstandard package of the compression extra"
+    return None
+
+
+def get_cache_file(path: str) -> str | None:
+    """Find the file of a downloaded chapter, which has the extension of its compression."""
+    for ext in COMPRESSION_EXTENSIONS.values():
+        if os.path.isfile(path + ext):
+            return path + ext
+    return None
+
+
+def open_cache_file(path: str):
+    """Open the file of a downloaded chapter for reading, decompressing it if it is compressed.
+
+    :param path: path of the chapter file without the extension of the compression
+    :return: binary file object
+    """
+    cache_file = get_cache_file(path)
+
+    if cache_file is None:
+        raise FileNotFoundError("File %s not found" % path)
+    if cache_file.endswith(".gz"):
+        return gzip.open(cache_file, "rb")
+    if cache_file.endswith(".zst"):
+        if zstandard is None:
+            raise RuntimeError("Reading %s requires the zstandard package" % cache_file)
+        with open(cache_file, "rb") as file:
+            return io.BytesIO(zstandard.ZstdDecompressor().decompress(file.read()))
+
+    return open(cache_file, "rb")
+
+
+def write_cache_file(path: str, content: bytes, compression: str = "none"):
+    """Write the file of a downloaded chapter and remove other versions of it with a different compression."""
+    if error := check_compression(compression):
+        raise RuntimeError(error)
+
+    cache_file = path + COMPRESSION_EXTENSIONS[compression]
+
+    if compression == "gzip":
+        with gzip.open(cache_file, "wb") as file:
+            file.write(content)
+    elif compression == "zstd":
+        with open(cache_file, "wb") as file:
+            file.write(zstandard.ZstdCompressor().compress(content))
+    else:
+        with open(cache_file, "wb") as file:
+            file.write(content)
+
+    for ext in COMPRESSION_EXTENSIONS.values():
+        if path + ext != cache_file and os.path.isfile(path + ext):
+            os.remove(path + ext)
+
+
+def extract_content(content: bytes, selectors) -> bytes:
+    """Reduce a chapter page to the elements needed to convert it and to find the next chapter.
+
+    The title, content and next chapter elements are kept, with their ancestors as empty shells, as well as all
+    <style> elements, which are used by chapter fixes, and the encoding declaration. If the selectors don't find the
+    same elements in the reduced page, e.g. because they depend on removed siblings, the whole page is kept.
+    """
+    soup = BeautifulSoup(content, "lxml")
+    element_selectors = [selectors.title_element, selectors.content_element, selectors.next_chapter_element]
+    keep = set()
+    ancestors = set()
+
+    for selector in element_selectors + ["style", "meta[charset]", "meta[http-equiv]"]:
+        for el in soup.select(selector):
+            keep.add(id(el))
+            ancestors.update(id(p) for p in el.parents)
+
+    def prune(el):
+        for child in list(el.children):
+            if id(child) in keep or isinstance(child, Doctype):
+                continue
+            if id(child) in ancestors:
+                prune(child)
+            elif isinstance(child, Tag):
+                child.decompose()
+            else:
+                child.extract()
+
+    counts = [len(soup.select(s)) for s in element_selectors]
+    prune(soup)
+
+    if [len(soup.select(s)) for s in element_selectors] != counts:
+        return content
+
+    return soup.encode()
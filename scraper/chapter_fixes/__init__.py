@@ -0,0 +1,172 @@
+import re
+import threading
+from collections.abc import MutableMapping
+from importlib import import_module
+from urllib.parse import urlparse
+
+from bs4 import BeautifulSoup
+
+from ..utils import PrefixIndex
+
+# Modules with the chapter fixes of a site, by host. Each module defines a CHAPTER_FIXES dict, which maps URL prefixes
+# to fix functions, and is only imported when a chapter of the site is converted.
+CHAPTER_FIX_MODULES = {
+    "www.royalroad.com": ".royalroad",
+}
+
+# Chapter fixes by host, as dicts of URL prefixes to fix functions in registration order, and their prefix indexes
+_fixes = {}
+_fix_indexes = {}
+# Hosts whose fix module was imported and registered
+_loaded_hosts = set()
+_fixes_lock = threading.RLock()
+
+
+def fix_div_paragraphs(soup: BeautifulSoup, content_el: BeautifulSoup, content_el_selector: str):
+    """Some chapters have <div> elements instead of proper <p> paragraphs, so rename all <div> tags to <p>"""
+    for el in content_el.find_all("div", recursive=False):
+        el.name = "p"
+
+
+def unwrap_div(soup: BeautifulSoup, content_el: BeautifulSoup, content_el_selector: str):
+    """Unwrap the first div element"""
+    el = content_el.select_one("div")
+    if el is not None:
+        el.unwrap()
+
+
+def unwrap_article(soup: BeautifulSoup, content_el: BeautifulSoup, content_el_selector: str):
+    """Unwrap the first article element"""
+    el = content_el.select_one("article")
+    if el is not None:
+        el.unwrap()
+
+
+def unwrap_toplevel_divs(soup: BeautifulSoup, content_el: BeautifulSoup, content_el_selector: str):
+    """Unwrap all divs at content element root level"""
+    while (el := content_el.select_one(content_el_selector + " > div")) is not None and content_el.select_one(content_el_selector + " > p") is None:
+        el.unwrap()
+
+
+def unwrap_toplevel_divs_alt(soup: BeautifulSoup, content_el: BeautifulSoup, content_el_selector: str):
+    divs = content_el.select(content_el_selector + " > div")
+    for el in divs:
+        el.unwrap()
+
+
+def fix_nested_div_paragraphs(soup: BeautifulSoup, content_el: BeautifulSoup, content_el_selector: str):
+    # Unwrap the top-level <div>s
+    for el in content_el.find_all(content_el_selector + " > div"):
+        el.unwrap()
+    # Convert the new top-level <div>s in <p>s
+    return fix_div_paragraphs(soup, content_el, content_el_selector)
+
+
+def fix_blockquote_and_div(soup: BeautifulSoup, content_el: BeautifulSoup, content_el_selector: str):
+    """Unwrap blockquotes that include a div"""
+    content_el.select_one("blockquote > div").unwrap()
+    return unwrap_div(soup, content_el, content_el_selector)
+
+
+# Regex to find the class name of the hidden warning paragraph
+rr_warning_pattern = re.compile(r"(\.\w+)\s*\{\s*\n*display:\s*none;\s*\n*speak:\s*never;\s*\n*}")
+
+
+def remove_piracy_paragraphs(soup: BeautifulSoup, content_el: BeautifulSoup, content_el_selector: str):
+    """Remove hidden stolen warning paragraphs from Royal Road chapters"""
+    # The class is defined in a <style> element, so there's no need to serialize the whole document
+    bad_class_match = rr_warning_pattern.findall("".join(el.get_text() for el in soup.find_all("style")))
+    if len(bad_class_match) > 0:
+        for element in content_el.find_all(None, {"class": bad_class_match[0].replace(".", "")}):
+            element.decompose()
+
+
+def _update_index(host: str):
+    # The index is replaced instead of changed, so lookups without the lock see either the old or the new one
+    index = PrefixIndex()
+    for (url, func) in _fixes.get(host, {}).items():
+        index.add(url, func)
+    _fix_indexes[host] = index
+
+
+def load_chapter_fixes(host: str):
+    """Import and register the fix module of a host, if it has one and it isn't registered yet."""
+    if host in _loaded_hosts or host not in CHAPTER_FIX_MODULES:
+        return
+
+    with _fixes_lock:
+        if host not in _loaded_hosts:
+            fixes = import_module(CHAPTER_FIX_MODULES[host], __name__).CHAPTER_FIXES
+            _fixes[host] = {**fixes, **_fixes.get(host, {})}
+            _update_index(host)
+            # Only marked as loaded after the fixes are registered, so concurrent callers wait for them
+            _loaded_hosts.add(host)
+
+
+def register_chapter_fixes(chapter_fixes: dict):
+    """Add chapter fixes, which map URL prefixes to fix functions, to the index of their hosts.
+
+    Like in a dict, a fix for an already registered URL prefix replaces the old one.
+    """
+    with _fixes_lock:
+        hosts = set()
+        for (url, func) in chapter_fixes.items():
+            host = urlparse(url).netloc
+            # The fixes of the host module come first, as they would have in the CHAPTER_FIXES dict
+            load_chapter_fixes(host)
+            _fixes.setdefault(host, {})[url] = func
+            hosts.add(host)
+
+        for host in hosts:
+            _update_index(host)
+
+
+def get_chapter_fixes(url: str) -> list:
+    """Get all chapter fixes whose URL prefix matches the chapter URL, in the order they were registered."""
+    host = urlparse(url).netloc
+    load_chapter_fixes(host)
+
+    if (index := _fix_indexes.get(host)) is None:
+        return []
+
+    return index.find(url)
+
+
+class ChapterFixMapping(MutableMapping):
+    """All chapter fixes as one mapping of URL prefixes to fix functions, like the CHAPTER_FIXES dict of this module
+    was before the fixes were split into modules by host.
+
+    The fix modules of all hosts are only imported when the mapping is read, setting an item registers a chapter fix.
+    """
+
+    @staticmethod
+    def get_all() -> dict:
+        for host in CHAPTER_FIX_MODULES:
+            load_chapter_fixes(host)
+        with _fixes_lock:
+            return {url: func for fixes in _fixes.values() for (url, func) in fixes.items()}
+
+    def __getitem__(self, url):
+        return self.get_all()[url]
+
+    def __setitem__(self, url, func):
+        register_chapter_fixes({url: func})
+
+    def __delitem__(self, url):
+        host = urlparse(url).netloc
+        load_chapter_fixes(host)
+        with _fixes_lock:
+            del _fixes.get(host, {})[url]
+            _update_index(host)
+
+    def __iter__(self):
+        return iter(self.get_all())
+
+    def __len__(self):
+        return len(self.get_all())
+
+    def __repr__(self):
+        return repr(self.get_all())
+
+
+CHAPTER_FIXES = ChapterFixMapping()
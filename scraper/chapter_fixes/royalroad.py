@@ -0,0 +1,23 @@
+from . import (
+    remove_piracy_paragraphs,
+    fix_div_paragraphs,
+    unwrap_toplevel_divs,
+    fix_nested_div_paragraphs,
+    fix_blockquote_and_div,
+    unwrap_toplevel_divs_alt,
+)
+
+CHAPTER_FIXES = {
+    "https://www.royalroad.com/": remove_piracy_paragraphs,
+    "https://www.royalroad.com/fiction/14167/metaworld-chronicles/chapter/494392/chapter-346-bride-and-groom": fix_div_paragraphs,
+    "https://www.royalroad.com/fiction/14167/metaworld-chronicles/chapter/541710/chapter-368-even-death-may-die": fix_div_paragraphs,
+    "https://www.royalroad.com/fiction/14167/metaworld-chronicles/chapter/551476/chapter-372-a-little-knowledge": fix_div_paragraphs,
+    "https://www.royalroad.com/fiction/14167/metaworld-chronicles/chapter/601164/chapter-389-taking-the-low-road": fix_div_paragraphs,
+    "https://www.royalroad.com/fiction/14167/metaworld-chronicles/chapter/605224/chapter-390-deep-politics": fix_div_paragraphs,
+    "https://www.royalroad.com/fiction/14167/metaworld-chronicles/chapter/623067/chapter-396-bait-and-switch": fix_div_paragraphs,
+    "https://www.royalroad.com/fiction/26675/a-journey-of-black-and-red/chapter/407352/22-the-waiting-maw": unwrap_toplevel_divs,
+    "https://www.royalroad.com/fiction/26675/a-journey-of-black-and-red/chapter/426349/34-ring-breaker": fix_nested_div_paragraphs,
+    "https://www.royalroad.com/fiction/36735/the-perfect-run/chapter/576217/8-past-fragment-len": fix_blockquote_and_div,
+    "https://www.royalroad.com/fiction/41033/kairos-a-greek-myth-litrpg/chapter/677603/26-the-wedding": unwrap_toplevel_divs_alt,
+    "https://www.royalroad.com/fiction/47557/underland/chapter/775480/8-vernburg": unwrap_toplevel_divs,
+}
@@ -1,22 +1,36 @@
 import os
 import sys
 import shutil
+import time
 import uuid
 import json
+from concurrent.futures import ThreadPoolExecutor
+from functools import cached_property
+from multiprocessing import Pool, cpu_count
 from urllib.parse import urlparse
 
 from box import Box, BoxList
 from click import echo, confirm
 from schema import Schema, SchemaError
-from requests import get
+from requests import RequestException
 
 from .converter import Converter
 from .binder import Binder
-from .crawler import Crawler, WanderingInnPatreonCrawler
+from .ebook_formats import FormatConverter, get_format_file
+from .crawler import Crawler, WanderingInnPatreonCrawler, AsyncCrawler
 from .generator import RoyalRoadConfigGenerator
-from .const import VALID_FILENAME_CHARS, FICTION_CONFIG_SCHEMA, CLIENT_CONFIG_SCHEMA
-from .utils import BASE_DIR, DATA_DIR, CONFIGS_DIR, normalize_string, lowercase_clean
+from .config import FictionConfig, read_config_file, snake_case_keys, validate_fiction_config
+from .const import VALID_FILENAME_CHARS, CLIENT_CONFIG_SCHEMA
+from .utils import BASE_DIR, DATA_DIR, CONFIGS_DIR, normalize_string, lowercase_clean, list_config_names, print_paths
 from .manifest import Manifest
+from .cache_files import check_compression
+from .config_index import ConfigIndex
+from .migration import migrate_chapter_files
+from .feed import FeedCache, fetch_feed
+from .session import configure_session, get_session
+from .page_cache import configure_page_cache
+from .rate_limit import get_rate_limiter
+from .metrics import get_metrics, write_report
 
 SEPARATOR = 30 * "-" + "\n"
 
@@ -25,7 +39,15 @@ class FictionScraperClient:
     def __init__(self):
         self.init_directories()
         self.client_config = self.load_client_config()
-        self.fiction_schema_config = self.get_fiction_config_schema()
+        configure_session(**self.client_config.http)
+        get_rate_limiter().configure(**self.client_config.rate_limit)
+        if self.client_config.page_cache is not None:
+            configure_page_cache(**self.client_config.page_cache)
+
+    @cached_property
+    def fiction_schema_config(self) -> dict | None:
+        """JSON schema of the fiction configs, which is only downloaded when it's needed for the first time."""
+        return self.get_fiction_config_schema()
 
     @staticmethod
     def init_directories():
@@ -34,16 +56,17 @@ class FictionScraperClient:
 
     @staticmethod
     def print_paths():
-        echo("Base: %s" % BASE_DIR)
-        echo("Client config: %s" % os.path.join(BASE_DIR, "client.yaml"))
-        echo("Fiction configs: %s" % CONFIGS_DIR)
-        echo("Data (downloads, books): %s" % DATA_DIR)
+        print_paths()
 
     @staticmethod
-    def get_fiction_config_schema() -> str | None:
+    def get_fiction_config_schema() -> dict | None:
         file_path = os.path.join(BASE_DIR, "fiction_config.schema.json")
         if not os.path.isfile(file_path):
-            r = get('https://raw.githubusercontent.com/Curetix/webfiction-scraper-configs/main/schema/fiction_config.schema.json')
+            try:
+                r = get_session().get('https://raw.githubusercontent.com/Curetix/webfiction-scraper-configs/main/schema/fiction_config.schema.json')
+            except RequestException as error:
+                echo("Couldn't download the fiction config schema: %s" % error)
+                return None
 
             if r.ok:
                 with open(file_path, "wb") as file:
@@ -57,7 +80,7 @@ class FictionScraperClient:
 
         return schema
 
-    def run(self, config_name: str, download: bool, clean_download: bool, convert: bool, clean_convert: bool, bind: bool, ebook_convert: bool):
+    def run(self, config_name: str, download: bool, clean_download: bool, convert: bool, clean_convert: bool, bind: bool, ebook_convert: bool, update: bool = False, report: str = None, prometheus: str = None):
         """Run the scraper with the provided config_name and tasks.
 
         :param config_name: name or path of fiction config file
@@ -67,6 +90,9 @@ class FictionScraperClient:
         :param clean_convert: flag if currently converted chapters should be cleared
         :param bind: flag if eBook should be created
         :param ebook_convert: flag if eBook should be converted into configured formats
+        :param update: flag if downloaded chapters should be checked for changes and downloaded again
+        :param report: path of the JSON run report, if it should be written
+        :param prometheus: path of the metrics in Prometheus text format, if they should be written
         """
         config = self.load_fiction_config(config_name)
 
@@ -74,6 +100,21 @@ class FictionScraperClient:
             echo("Invalid config file!")
             sys.exit(1)
 
+        get_metrics().reset()
+        timings = self.run_config(config, download, clean_download, convert, clean_convert, bind, ebook_convert, update)
+
+        if report or prometheus:
+            write_report({"config": config_name, **get_metrics().get_report(timings)}, report, prometheus)
+
+    def run_config(self, config: FictionConfig, download: bool, clean_download: bool, convert: bool, clean_convert: bool, bind: bool, ebook_convert: bool, update: bool = False, pool=None) -> dict[str, float]:
+        """Run the tasks for a loaded fiction config.
+
+        :param pool: optional multiprocessing pool for the chapter conversion, e.g. shared by multiple runs
+        :return: durations of the tasks in seconds
+        """
+        timings = {}
+        start = time.perf_counter()
+
         if not os.path.isdir(f := config.files.working_folder):
             os.mkdir(f)
 
@@ -83,52 +124,77 @@ class FictionScraperClient:
         if not os.path.isdir(f := config.files.book_folder):
             os.mkdir(f)
 
-        if url := config.get("official_book_url"):
-            echo("The author %s has published an official book for %s!" % (config.metadata.author, config.metadata.title))
+        migrate_chapter_files(config.files)
+
+        if url := config.official_book_url:
+            echo("The author %s has published an official book for %s!" % (config.metadata["author"], config.metadata["title"]))
             echo("If you want to support their work, consider purchasing it here:")
             if type(url) is str:
                 echo(" %s" % url)
-            elif type(url) is BoxList:
+            elif isinstance(url, list):
                 for u in url:
                     echo(" - %s" % u)
 
-        if download or clean_download:
+        if download or clean_download or update:
             echo("Downloading chapters...")
 
-            if config.get("crawler_module") == "WanderingInnPatreonCrawler":
+            if config.crawler_module == "WanderingInnPatreonCrawler":
                 crawler = WanderingInnPatreonCrawler(config, self.client_config.get("patreon_session_cookie"))
+            elif config.crawler_module == "AsyncCrawler":
+                crawler = AsyncCrawler(config)
             else:
                 crawler = Crawler(config)
 
             if clean_download:
                 crawler.clean()
+            elif update:
+                crawler.update_chapters()
             crawler.start_download()
 
+            for (host, m) in get_rate_limiter().get_metrics().items():
+                if m["wait_time"] > 0:
+                    echo("Rate limit of %s: %s requests waited %.1fs in total, at most %.1fs" % (
+                        host, m["requests"], m["wait_time"], m["max_wait_time"]))
+
+            timings["download"] = time.perf_counter() - start
+            start = time.perf_counter()
+
         if convert or clean_convert or clean_download:
             echo(SEPARATOR + "Converting chapters...")
             converter = Converter(config)
             if clean_download or clean_convert:
                 converter.clean()
-            converter.convert_all()
+            converter.convert_all(pool)
+
+            timings["convert"] = time.perf_counter() - start
+            start = time.perf_counter()
 
         if bind:
             echo(SEPARATOR + "Binding chapters into eBook...")
             binder = Binder(config)
-            binder.bind_book()
+            binder.bind_book(pool)
+
+            timings["bind"] = time.perf_counter() - start
+            start = time.perf_counter()
 
-        if ebook_convert and len(config.files.get("ebook_formats", [])) > 0:
+        epub_files = Binder(config).get_epub_files() if config.volumes else [config.files.epub_file]
+
+        if ebook_convert and len(config.files.ebook_formats) > 0:
             echo(SEPARATOR + "Creating other eBook formats...")
-            for f in config.files.get("ebook_formats", []):
-                echo("Converting epub into " + f)
-                os.system(
-                    "ebook-convert \"%s\" \"%s\"" % (config.files.epub_file, config.files.epub_file.replace("epub", f)))
+            FormatConverter(config.files.format_state_file).convert_all(epub_files, config.files.ebook_formats)
+
+            timings["format"] = time.perf_counter() - start
 
-        if config.files.get("copy_book_to"):
+        if config.files.copy_book_to:
             echo(SEPARATOR + "Copying files...")
             formats = ["epub"] + config.files.ebook_formats
-            for f in formats:
-                source = config.files.epub_file.replace("epub", f)
-                target = config.files.copy_book_to.replace("epub", f)
+            for (epub_file, f) in [(e, f) for e in epub_files for f in formats]:
+                source = get_format_file(epub_file, f)
+                if config.volumes:
+                    # Volumes keep their file names, copy_book_to only sets the directory
+                    target = os.path.join(os.path.dirname(config.files.copy_book_to), os.path.basename(source))
+                else:
+                    target = get_format_file(config.files.copy_book_to, f)
                 if os.path.isfile(source):
                     if os.path.isdir(os.path.dirname(target)):
                         from shutil import copyfile
@@ -139,6 +205,129 @@ class FictionScraperClient:
                 else:
                     echo("%s not found!" % source)
 
+        return timings
+
+    def run_all(self, config_names: list[str], download: bool, clean_download: bool, convert: bool, clean_convert: bool, bind: bool, ebook_convert: bool, update: bool = False, jobs: int = 4, report: str = None, prometheus: str = None):
+        """Run the scraper with many configs at once.
+
+        Fictions from different sites are processed in parallel, fictions from the same site one after another, so
+        no site gets more requests than with a single run. All runs share one pool for the chapter conversion.
+
+        :param config_names: names or paths of fiction config files
+        :param jobs: maximum number of sites processed in parallel
+        :param report: path of the JSON run report, if it should be written
+        :param prometheus: path of the metrics in Prometheus text format, if they should be written
+        """
+        results = {}
+        hosts = {}
+        get_metrics().reset()
+
+        for config_name in config_names:
+            try:
+                config = self.load_fiction_config(config_name)
+            except SystemExit:
+                config = None
+
+            if not config:
+                results[config_name] = ("failed", 0, {}, "Invalid config file")
+                continue
+
+            host = urlparse(config.toc_url or config.start_url).netloc
+            hosts.setdefault(host, []).append((config_name, config))
+
+        def run_host(configs):
+            for (name, c) in configs:
+                start = time.perf_counter()
+                try:
+                    timings = self.run_config(c, download, clean_download, convert, clean_convert, bind, ebook_convert, update, pool)
+                    results[name] = ("ok", time.perf_counter() - start, timings, "")
+                except (Exception, SystemExit) as e:
+                    results[name] = ("failed", time.perf_counter() - start, {}, str(e) or type(e).__name__)
+
+        # The pool is created before any threads are started, so the worker processes are forked from a clean state
+        with Pool(processes=cpu_count()) as pool:
+            with ThreadPoolExecutor(max_workers=jobs) as executor:
+                for future in [executor.submit(run_host, configs) for configs in hosts.values()]:
+                    future.result()
+
+        echo(SEPARATOR + "Summary:")
+        for name in config_names:
+            status, duration, timings, error = results[name]
+            stages = ", ".join("%s %.1fs" % (stage, t) for (stage, t) in timings.items())
+            echo("  %-40s %-6s %7.1fs  %s" % (name, status, duration, error or stages))
+
+        failed = [name for name in config_names if results[name][0] != "ok"]
+        echo("%s of %s configs finished successfully" % (len(config_names) - len(failed), len(config_names)))
+
+        if report or prometheus:
+            # Stages of all runs are summed up, the metrics of concurrent runs can't be told apart
+            stages = {}
+            for (_, _, timings, _) in results.values():
+                for (stage, t) in timings.items():
+                    stages[stage] = stages.get(stage, 0) + t
+
+            runs = {name: {"status": status, "duration": duration, "stages": timings, "error": error}
+                    for (name, (status, duration, timings, error)) in results.items()}
+            write_report({"runs": runs, **get_metrics().get_report(stages)}, report, prometheus)
+
+        return results
+
+    def watch(self, interval: int = 0):
+        """Poll the feeds of the monitored fictions and run the configs of fictions with new feed items.
+
+        :param interval: minutes to wait between polls, or 0 to poll only once
+        """
+        monitored = self.client_config.get("monitored_fictions")
+
+        if len(monitored) == 0:
+            echo("No monitored fictions configured in the client config!")
+            return
+
+        cache = FeedCache(os.path.join(BASE_DIR, "feeds.json"))
+
+        while True:
+            echo("Checking %s feeds for new items..." % len(monitored))
+
+            def fetch(fiction):
+                cached = cache.get(fiction.config_name, {})
+                if cached.get("rss_feed_url") != fiction.rss_feed_url:
+                    cached = {}
+                try:
+                    return cached, fetch_feed(fiction.rss_feed_url, cached)
+                except Exception as e:
+                    # A failing feed is treated as unchanged, so the other feeds and the next polls aren't affected
+                    echo("Could not fetch feed %s: %s" % (fiction.rss_feed_url, e))
+                    return cached, ({}, None)
+
+            with ThreadPoolExecutor(max_workers=8) as executor:
+                results = list(executor.map(fetch, monitored))
+
+            for fiction, (cached, (validators, items)) in zip(monitored, results):
+                entry = {**cached, **validators, "rss_feed_url": fiction.rss_feed_url}
+
+                if items is not None:
+                    new_items = set(items) - set(cached.get("seen", []))
+
+                    if len(new_items) > 0:
+                        echo(SEPARATOR + "Found %s new items for config %s" % (len(new_items), fiction.config_name))
+                        try:
+                            self.run(fiction.config_name, True, False, True, False, True, True)
+                        except (Exception, SystemExit) as e:
+                            # Items are not marked as seen, so the config is run again with the next poll
+                            echo("Running config %s failed: %s" % (fiction.config_name, e))
+                            continue
+
+                    entry["seen"] = items
+
+                cache[fiction.config_name] = entry
+                cache.save()
+
+            if not interval:
+                return
+
+            echo("Checking feeds again in %s minutes" % interval)
+            time.sleep(interval * 60)
+
     @staticmethod
     def load_client_config() -> Box:
         """Load the client configuration file from the users data directory, if it exists.
@@ -156,9 +345,9 @@ class FictionScraperClient:
 
             return validated
 
-        return Box(config_overrides=Box())
+        return Box(config_overrides=Box(), monitored_fictions=BoxList(), http=Box(), rate_limit=Box(), page_cache=None)
 
-    def load_fiction_config(self, config_name: str) -> Box | None:
+    def load_fiction_config(self, config_name: str) -> FictionConfig | None:
         """Load the fiction configuration from the provided config_name, if it exists.
 
         :param config_name: path or name of fiction config
@@ -178,7 +367,7 @@ class FictionScraperClient:
             echo("Invalid file extension, only .yaml is supported!")
             sys.exit(1)
 
-        config = Box.from_yaml(filename=path, camel_killer_box=True, default_box=True)
+        config = read_config_file(path)
 
         if override := self.client_config.get("config_overrides").get(config_name.lower()):
             # Supports nested dictionary updates
@@ -191,25 +380,31 @@ class FictionScraperClient:
                         d[k] = v
                 return d
 
-            update(config, override)
+            update(config, override.to_dict())
 
         try:
-            validated = Schema(FICTION_CONFIG_SCHEMA).validate(config)
+            validated = validate_fiction_config(config)
         except SchemaError as error:
             echo("\nValidation failed for config '%s':" % config_name)
             echo(error)
             return None
 
-        files = validated.files
-        metadata = validated.metadata
-        title = normalize_string(metadata.title)
+        # Codecs are optional dependencies, so a missing one is reported now instead of when the first chapter is saved
+        if error := check_compression(validated["cache_compression"]):
+            echo("\nValidation failed for config '%s':" % config_name)
+            echo(error)
+            return None
+
+        files = validated["files"]
+        metadata = validated["metadata"]
+        title = normalize_string(metadata["title"])
 
         if not metadata.get("identifier"):
             ident_string = "%s-%s" % (
                 lowercase_clean(metadata.get("author")),
                 lowercase_clean(metadata.get("title")),
             )
-            validated.metadata.identifier = str(uuid.uuid5(
+            metadata["identifier"] = str(uuid.uuid5(
                 uuid.NAMESPACE_DNS, ident_string
             ))
 
@@ -223,6 +418,8 @@ class FictionScraperClient:
         cache_folder = os.path.join(working_folder, "cache")
         book_folder = os.path.join(working_folder, "book")
         manifest_file = os.path.join(working_folder, "manifest.json")
+        bind_state_file = os.path.join(working_folder, "bind.json")
+        format_state_file = os.path.join(working_folder, "formats.json")
 
         epub_file = files.get("epub_file")
         cover_file = files.get("cover_file")
@@ -240,14 +437,18 @@ class FictionScraperClient:
         elif cover_file and not os.path.isabs(cover_file):
             cover_file = os.path.join(working_folder, cover_file)
 
-        validated.files.working_folder = working_folder
-        validated.files.cache_folder = cache_folder
-        validated.files.book_folder = book_folder
-        validated.files.epub_file = epub_file
-        validated.files.cover_file = cover_file
-        validated.files.manifest_file = manifest_file
+        files.update(
+            working_folder=working_folder,
+            cache_folder=cache_folder,
+            book_folder=book_folder,
+            epub_file=epub_file,
+            cover_file=cover_file,
+            manifest_file=manifest_file,
+            bind_state_file=bind_state_file,
+            format_state_file=format_state_file,
+        )
 
-        return validated
+        return FictionConfig.from_dict(validated)
 
     @staticmethod
     def generate_fiction_config(url, name=None) -> str:
@@ -275,7 +476,7 @@ class FictionScraperClient:
             name = config.metadata.title
 
         try:
-            Schema(FICTION_CONFIG_SCHEMA).validate(config)
+            validate_fiction_config(snake_case_keys(config.to_dict()))
         except SchemaError as e:
             echo(e)
             if not confirm("Couldn't validate newly generated config, save anyways?"):
@@ -290,7 +491,7 @@ class FictionScraperClient:
     @staticmethod
     def list_fiction_configs(remote=False) -> list[str] | None:
         if remote:
-            r = get('https://api.github.com/repos/curetix/webfiction-scraper-configs/contents/configs')
+            r = get_session().get('https://api.github.com/repos/curetix/webfiction-scraper-configs/contents/configs')
 
             if r.ok:
                 json = r.json()
@@ -299,11 +500,16 @@ class FictionScraperClient:
             else:
                 return None
         else:
-            if os.path.isdir(CONFIGS_DIR):
-                configs = [f.replace(".yaml", "") for f in os.listdir(CONFIGS_DIR) if f.endswith(".yaml")]
-                return configs
-            else:
-                return None
+            return list_config_names()
+
+    def index_fiction_configs(self) -> dict[str, dict]:
+        """Get the title, author, validation status and working folder stats of the configs in the users configs
+        folder from the config index, loading only the configs which changed since they were indexed.
+
+        :return: index entries by config name
+        """
+        index = ConfigIndex(os.path.join(BASE_DIR, "config_index.json"))
+        return index.refresh(self, list_config_names() or [])
 
     @staticmethod
     def get_fiction_config_path(config_name) -> str | None:
@@ -320,7 +526,7 @@ class FictionScraperClient:
         elif file_exists and overwrite:
             echo("The file %s already exists in the configs folder and will be overwritten." % file_path)
 
-        r = get('https://raw.githubusercontent.com/Curetix/webfiction-scraper-configs/main/configs/%s' % ("%s.yaml" % name))
+        r = get_session().get('https://raw.githubusercontent.com/Curetix/webfiction-scraper-configs/main/configs/%s' % ("%s.yaml" % name))
 
         if r.ok:
             with open(file_path, "wb") as file:
@@ -367,19 +573,19 @@ class FictionScraperClient:
                     rmtree(os.path.join(path, "cache"))
                 elif (downloads or converted) and cf == "book":
                     rmtree(os.path.join(path, "book"))
-                elif books and cf.endswith(".epub") or misc and cf != "manifest.json":
+                elif books and cf.endswith(".epub") or misc and cf not in ("manifest.json", "manifest.jsonl"):
                     p = os.path.join(path, cf)
                     if os.path.isfile(p):
                         remove(p)
                     elif os.path.isdir(p):
                         rmtree(p)
-                elif cf == "manifest.json":
+                elif cf in ("manifest.json", "manifest.jsonl"):
                     p = os.path.join(path, cf)
                     if downloads:
-                        remove(p)
-                    elif converted:
-                        manifest = Manifest(p)
-                        manifest.load()
+                        if os.path.isfile(p):
+                            remove(p)
+                    elif converted and not (cf == "manifest.jsonl" and "manifest.json" in os.listdir(path)):
+                        manifest = Manifest(os.path.join(path, "manifest.json"))
                         for i in range(len(manifest)):
                             manifest[i].update({"converted": False})
                         manifest.save()
@@ -0,0 +1,279 @@
+import copy
+import re
+from dataclasses import dataclass, field
+
+from ruamel.yaml import YAML
+from schema import And, Optional, Or, SchemaError, SchemaMissingKeyError, SchemaWrongKeyError
+
+from .const import FICTION_CONFIG_SCHEMA
+
+_yaml = YAML(typ="safe")
+
+_first_cap_pattern = re.compile(r"(.)([A-Z][a-z]+)")
+_all_cap_pattern = re.compile(r"([a-z0-9])([A-Z])")
+
+
+def snake_case(key: str) -> str:
+    """Convert a camelCase key of a config file to snake_case, the same way as the camel killer of Box."""
+    key = _all_cap_pattern.sub(r"\1_\2", _first_cap_pattern.sub(r"\1_\2", key))
+    return re.sub(" *_+", "_", key.lower())
+
+
+def snake_case_keys(data):
+    """Convert the keys of all dicts in a config to snake_case."""
+    if isinstance(data, dict):
+        return {snake_case(k) if isinstance(k, str) else k: snake_case_keys(v) for (k, v) in data.items()}
+    if isinstance(data, list):
+        return [snake_case_keys(v) for v in data]
+    return data
+
+
+def read_config_file(path: str) -> dict:
+    """Read a YAML config file into plain dicts and lists with snake_case keys."""
+    with open(path, "r", encoding="utf-8") as file:
+        return snake_case_keys(_yaml.load(file) or {})
+
+
+def compile_schema(s):
+    """Compile a schema of the schema package into a function, which validates plain dicts and lists.
+
+    Schema.validate interprets the whole schema again for every value, the compiled function only checks the data.
+    The parts of the schema package used by the config schemas are supported: dicts with literal, Optional and
+    validator keys, lists, And, Or, types, callables and literal values. Invalid data raises a SchemaError like
+    Schema.validate, the defaults of optional keys are copied, so validated configs don't share them.
+    """
+    if isinstance(s, dict):
+        return _compile_dict(s)
+
+    if isinstance(s, list):
+        validate_item = _compile_or(s)
+
+        def validate_list(data):
+            if not isinstance(data, list):
+                raise SchemaError("%r should be instance of 'list'" % (data,))
+            return [validate_item(x) for x in data]
+
+        return validate_list
+
+    # Or is a subclass of And
+    if isinstance(s, Or):
+        return _compile_or(s.args)
+
+    if isinstance(s, And):
+        validators = [compile_schema(x) for x in s.args]
+
+        def validate_and(data):
+            for validate in validators:
+                data = validate(data)
+            return data
+
+        return validate_and
+
+    if isinstance(s, type):
+        def validate_type(data):
+            if isinstance(data, s):
+                return data
+            raise SchemaError("%r should be instance of %r" % (data, s.__name__))
+
+        return validate_type
+
+    if callable(s):
+        name = getattr(s, "__name__", repr(s))
+
+        def validate_callable(data):
+            try:
+                valid = s(data)
+            except Exception as error:
+                raise SchemaError("%s(%r) raised %r" % (name, data, error))
+            if valid:
+                return data
+            raise SchemaError("%s(%r) should evaluate to True" % (name, data))
+
+        return validate_callable
+
+    def validate_literal(data):
+        if s == data:
+            return data
+        raise SchemaError("%r does not match %r" % (s, data))
+
+    return validate_literal
+
+
+def _compile_or(schemas):
+    validators = [compile_schema(x) for x in schemas]
+
+    def validate_or(data):
+        errors = []
+        for validate in validators:
+            try:
+                return validate(data)
+            except SchemaError as error:
+                errors.append(error.code)
+        raise SchemaError("%r did not validate any of the allowed schemas:\n%s" % (data, "\n".join(errors)))
+
+    return validate_or
+
+
+def _compile_dict(s):
+    # Literal keys are looked up directly, other keys are tried in the same order as Schema.validate does
+    literal_keys = {}
+    other_keys = []
+    required = []
+    defaults = []
+
+    for (i, (skey, svalue)) in enumerate(s.items()):
+        key_schema = skey.schema if isinstance(skey, Optional) else skey
+        if isinstance(key_schema, str):
+            literal_keys[key_schema] = (i, compile_schema(svalue))
+        else:
+            priority = 2 if isinstance(key_schema, type) else 1
+            other_keys.append((priority, i, compile_schema(key_schema), compile_schema(svalue)))
+
+        if not isinstance(skey, Optional):
+            required.append((i, key_schema))
+        elif hasattr(skey, "default"):
+            defaults.append((i, skey.key, skey.default))
+
+    other_keys = [(i, validate_key, validate_value) for (_, i, validate_key, validate_value) in sorted(other_keys, key=lambda k: k[:2])]
+
+    def validate_dict(data):
+        if not isinstance(data, dict):
+            raise SchemaError("%r should be instance of 'dict'" % (data,))
+
+        new = {}
+        covered = set()
+        for (key, value) in data.items():
+            if (match := literal_keys.get(key) if isinstance(key, str) else None) is None:
+                for (i, validate_key, validate_value) in other_keys:
+                    try:
+                        validate_key(key)
+                    except SchemaError:
+                        continue
+                    match = (i, validate_value)
+                    break
+
+            if match is not None:
+                (i, validate_value) = match
+                try:
+                    new[key] = validate_value(value)
+                except SchemaError as error:
+                    raise SchemaError("Key '%s' error:\n%s" % (key, error.code))
+                covered.add(i)
+
+        if missing := [key for (i, key) in required if i not in covered]:
+            raise SchemaMissingKeyError("Missing key%s: %s" % ("s" if len(missing) > 1 else "", ", ".join(repr(k) for k in sorted(missing, key=repr))))
+
+        if len(new) != len(data):
+            wrong = [k for k in data if k not in new]
+            raise SchemaWrongKeyError("Wrong key%s %s in %r" % ("s" if len(wrong) > 1 else "", ", ".join(repr(k) for k in sorted(wrong, key=repr)), data))
+
+        for (i, key, default) in defaults:
+            if i not in covered:
+                new[key] = copy.deepcopy(default)
+
+        return new
+
+    return validate_dict
+
+
+# The schema is compiled once per process
+_validate_fiction_config = compile_schema(FICTION_CONFIG_SCHEMA)
+
+
+def validate_fiction_config(data: dict) -> dict:
+    """Validate a fiction config and fill in the defaults.
+
+    :raises SchemaError: if the config is invalid
+    """
+    return _validate_fiction_config(data)
+
+
+@dataclass(slots=True)
+class ContentStartSelector:
+    chapter_url: str
+    selector: str
+
+
+@dataclass(slots=True)
+class Selectors:
+    title_element: str
+    content_element: str
+    next_chapter_element: str
+    content_start_element: list[ContentStartSelector] | None = None
+    cut_off_element: str | list[str] | None = None
+
+
+@dataclass(slots=True)
+class Substitution:
+    selector_type: str
+    selector: str
+    chapter_url: str = ""
+    replace_with: str = ""
+    warn: bool = True
+
+
+@dataclass(slots=True)
+class Volumes:
+    max_chapters: int | None = None
+    max_size: float | None = None
+    title_pattern: str | None = None
+
+
+@dataclass(slots=True)
+class Files:
+    working_folder: str | None = None
+    cache_folder: str | None = None
+    book_folder: str | None = None
+    epub_file: str | None = None
+    cover_file: str | None = None
+    manifest_file: str | None = None
+    bind_state_file: str | None = None
+    format_state_file: str | None = None
+    ebook_formats: list[str] = field(default_factory=list)
+    copy_book_to: str = ""
+
+
+@dataclass(slots=True)
+class FictionConfig:
+    """Validated fiction config, as used by the crawlers, the converter and the binder.
+
+    The metadata stays a dict, because it can contain any Dublin Core key.
+    """
+    start_url: str
+    metadata: dict
+    selectors: Selectors
+    files: Files = field(default_factory=Files)
+    official_book_url: str | list[str] | None = None
+    end_url: str = ""
+    skip_urls: list[str] = field(default_factory=list)
+    crawler_module: str = "Crawler"
+    toc_url: str = ""
+    toc_link_selector: str = "a"
+    download_workers: int = 4
+    rate_limit: float | None = None
+    pipelined_download: bool = False
+    cache_compression: str = "none"
+    cache_content_only: bool = False
+    skip_conversion: bool = False
+    remove_empty_elements: bool = True
+    streaming_bind: bool = False
+    volumes: Volumes | None = None
+    substitutions: list[Substitution] = field(default_factory=list)
+    style: str | None = None
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "FictionConfig":
+        """Create the config from a validated dict."""
+        data = dict(data)
+        selectors = dict(data.pop("selectors"))
+        if selectors.get("content_start_element") is not None:
+            selectors["content_start_element"] = [ContentStartSelector(**x) for x in selectors["content_start_element"]]
+
+        return cls(
+            metadata=dict(data.pop("metadata")),
+            selectors=Selectors(**selectors),
+            files=Files(**data.pop("files", {})),
+            volumes=Volumes(**v) if (v := data.pop("volumes", None)) is not None else None,
+            substitutions=[Substitution(**s) for s in data.pop("substitutions", [])],
+            **data,
+        )
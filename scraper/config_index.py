@@ -0,0 +1,156 @@
+import functools
+import hashlib
+import json
+import os
+
+from click import echo
+
+from . import config, const
+from .manifest import Manifest
+from .utils import CONFIGS_DIR
+
+
+def get_file_hash(path: str) -> str:
+    with open(path, "rb") as file:
+        return hashlib.sha256(file.read()).hexdigest()
+
+
+@functools.cache
+def get_schema_fingerprint() -> str:
+    """Hash of the modules which define and validate the fiction config schema, which changes when the scraper is
+    upgraded to a version that validates configs differently."""
+    digest = hashlib.sha256()
+    for module in (const, config):
+        with open(module.__file__, "rb") as file:
+            digest.update(file.read())
+    return digest.hexdigest()
+
+
+def get_stats_stamp(manifest_file: str, epub_file: str) -> list:
+    """Modification times of the manifest, its journal and the EPUB, which change whenever chapters are added,
+    converted or bound."""
+    return [
+        os.stat(p).st_mtime_ns if os.path.isfile(p) else None
+        for p in (manifest_file, Manifest.get_journal_path(manifest_file), epub_file)
+    ]
+
+
+class ConfigIndex(dict):
+    """Title, author, validation status and working folder stats of the configs in the users configs folder, by path
+    of the config file, stored as JSON file.
+
+    Configs are only loaded and validated again if their file, their override in the client config or the config
+    schema changed, the modification time and size of a file are compared first, so unchanged files aren't even read.
+    """
+
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+        self.load()
+
+    def load(self):
+        if os.path.isfile(self.path):
+            with open(self.path, "r", encoding="utf-8") as file:
+                try:
+                    self.update(json.load(file))
+                except json.JSONDecodeError:
+                    echo("Config index could not be loaded, all configs will be loaded again.")
+
+    def save(self):
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump(self, file, indent=2)
+        os.replace(temp_path, self.path)
+
+    def refresh(self, client, config_names: list[str]) -> dict[str, dict]:
+        """Update the entries of changed configs and remove the entries of deleted ones.
+
+        :param client: client used to load and validate changed configs
+        :param config_names: names of the configs in the configs folder
+        :return: entries by config name
+        """
+        entries = {}
+        changed = False
+        schema = get_schema_fingerprint()
+
+        for name in config_names:
+            path = os.path.join(CONFIGS_DIR, "%s.yaml" % name)
+            stat = os.stat(path)
+            override = client.client_config.get("config_overrides").get(name.lower())
+            override_hash = hashlib.sha256(json.dumps(override, sort_keys=True).encode()).hexdigest() if override else None
+            entry = self.get(path)
+
+            if not entry or entry["override_hash"] != override_hash or entry.get("schema") != schema \
+                    or (entry["mtime"], entry["size"]) != (stat.st_mtime_ns, stat.st_size):
+                file_hash = get_file_hash(path)
+                if entry and entry["hash"] == file_hash and entry["override_hash"] == override_hash \
+                        and entry.get("schema") == schema:
+                    entry = {**entry, "mtime": stat.st_mtime_ns, "size": stat.st_size}
+                else:
+                    entry = self.load_entry(client, name, file_hash, override_hash)
+                    entry.update(mtime=stat.st_mtime_ns, size=stat.st_size)
+                self[path] = entry
+                changed = True
+
+            if entry["valid"] and entry["stats"]["stamp"] != get_stats_stamp(entry["manifest_file"], entry["epub_file"]):
+                entry["stats"] = self.get_stats(entry["manifest_file"], entry["epub_file"])
+                changed = True
+
+            entries[name] = entry
+
+        for path in [p for p in self if os.path.dirname(p) == CONFIGS_DIR and not os.path.isfile(p)]:
+            del self[path]
+            changed = True
+
+        if changed:
+            self.save()
+
+        return entries
+
+    @staticmethod
+    def load_entry(client, name: str, file_hash: str, override_hash: str | None) -> dict:
+        entry = {
+            "hash": file_hash,
+            "override_hash": override_hash,
+            "schema": get_schema_fingerprint(),
+            "valid": False,
+            "error": None,
+            "title": None,
+            "author": None,
+            "working_folder": None,
+            "manifest_file": None,
+            "epub_file": None,
+            "stats": None,
+        }
+
+        try:
+            config = client.load_fiction_config(name)
+        except Exception as error:
+            entry["error"] = str(error)
+            return entry
+
+        if not config:
+            entry["error"] = "Validation failed"
+            return entry
+
+        entry.update(
+            valid=True,
+            title=config.metadata["title"],
+            author=config.metadata["author"],
+            working_folder=config.files.working_folder,
+            manifest_file=config.files.manifest_file,
+            epub_file=config.files.epub_file,
+            stats=ConfigIndex.get_stats(config.files.manifest_file, config.files.epub_file),
+        )
+        return entry
+
+    @staticmethod
+    def get_stats(manifest_file: str, epub_file: str) -> dict:
+        """Count the downloaded and converted chapters of a config and check if its EPUB exists."""
+        manifest = Manifest(manifest_file)
+        return {
+            "stamp": get_stats_stamp(manifest_file, epub_file),
+            "chapters": len(manifest),
+            "converted": sum(1 for c in manifest if c.get("converted")),
+            "epub": os.path.isfile(epub_file),
+        }
@@ -3,6 +3,9 @@ from schema import And, Or, Optional
 
 VALID_FILENAME_CHARS = "-_ %s%s" % (string.ascii_letters, string.digits)
 
+# File name of downloaded and converted chapters, padded so they are listed in reading order
+CHAPTER_FILE_NAME = "chapter%05d.html"
+
 CLIENT_CONFIG_SCHEMA = {
     Optional("patreon_session_cookie", default=None): str,
     Optional("config_overrides", default={}): dict,
@@ -11,7 +14,25 @@ CLIENT_CONFIG_SCHEMA = {
             "rss_feed_url": And(str, lambda s: s.startswith("http")),
             "config_name": str
         }
-    ]
+    ],
+    Optional("http", default={}): {
+        Optional("retries"): And(int, lambda n: n >= 0),
+        Optional("backoff_factor"): Or(int, float),
+        Optional("pool_size"): And(int, lambda n: n > 0),
+        Optional("timeout"): Or(int, float),
+        Optional("user_agent"): str,
+    },
+    # Requests per second by host, hosts without a rate use the default one, or aren't limited if it isn't set
+    Optional("rate_limit", default={}): {
+        Optional("requests_per_second"): And(Or(int, float), lambda n: n > 0),
+        Optional("burst"): And(int, lambda n: n > 0),
+        Optional("hosts"): {str: And(Or(int, float), lambda n: n > 0)},
+    },
+    # Downloaded pages are cached for all fiction configs if this is set, the maximum size is in MB
+    Optional("page_cache", default=None): {
+        Optional("folder"): str,
+        Optional("max_size"): And(Or(int, float), lambda n: n > 0),
+    },
 }
 
 # Valid metadata keys
@@ -43,6 +64,16 @@ FICTION_CONFIG_SCHEMA = {
     Optional("end_url", default=""): And(str, lambda s: s.startswith("http")),
     Optional("skip_urls", default=[]): [str],
     Optional("crawler_module", default="Crawler"): str,
+    Optional("toc_url", default=""): And(str, lambda s: s.startswith("http")),
+    Optional("toc_link_selector", default="a"): str,
+    Optional("download_workers", default=4): And(int, lambda n: n > 0),
+    # Requests per second to the site of the fiction, if it's lower than the rate in the client config
+    Optional("rate_limit", default=None): And(Or(int, float), lambda n: n > 0),
+    Optional("pipelined_download", default=False): bool,
+    # Compression of the downloaded chapter files, zstd requires the zstandard package of the compression extra
+    Optional("cache_compression", default="none"): Or("none", "gzip", "zstd"),
+    # Only keep the elements of downloaded chapters which are needed to convert them
+    Optional("cache_content_only", default=False): bool,
     "metadata": {
         "title": str,
         "author": str,
@@ -72,6 +103,14 @@ FICTION_CONFIG_SCHEMA = {
     },
     Optional("skip_conversion", default=False): bool,
     Optional("remove_empty_elements", default=True): bool,
+    Optional("streaming_bind", default=False): bool,
+    # Split the fiction into multiple EPUB files, a new volume starts when one of the limits would be exceeded or
+    # when a chapter title matches the title pattern. The maximum size is in MB.
+    Optional("volumes", default=None): {
+        Optional("max_chapters"): And(int, lambda n: n > 0),
+        Optional("max_size"): And(Or(int, float), lambda n: n > 0),
+        Optional("title_pattern"): str,
+    },
     Optional("substitutions", default=[]): [
         {
             "selector_type": lambda s: s == "css" or s == "regex" or s == "text",
@@ -89,7 +128,8 @@ CHAPTER_DOC = """<?xml version="1.0" encoding="UTF-8" ?>
 <html xmlns="http://www.w3.org/1999/xhtml" xml:lang="en">
 <head>
 <meta http-equiv="Content-Type" content="application/xhtml+xml; charset=utf-8" />
+<title>{title}</title>
 </head>
-<body></body>
+{body}
 </html>
 """
\ No newline at end of file
@@ -1,30 +1,67 @@
+import io
 import os
-import re
+import time
+from html import escape
+from functools import partial
 from multiprocessing import Pool, cpu_count
 
 from bs4 import BeautifulSoup
 from click import echo
 
 from .manifest import Manifest
+from .config import FictionConfig
+from .cache_files import open_cache_file
+from .metrics import get_metrics
 from .const import CHAPTER_DOC
 from .exception import ElementNotFoundException
 
-from .chapter_fixes import CHAPTER_FIXES, unwrap_toplevel_divs
+from .chapter_fixes import get_chapter_fixes, unwrap_toplevel_divs
+from .substitutions import SubstitutionPlan
+
+# Converters of a worker process, by working folder of their config
+_worker_converters = {}
+
+
+def init_worker(config):
+    """Create the converter of a worker process once, so it doesn't have to be sent with every chapter."""
+    _worker_converters[None] = Converter(config, load_manifest=False)
+
+
+def convert_chapter(task, config=None):
+    """Convert a chapter in a worker process.
+
+    :param task: tuple of manifest index, file name, url and title of the chapter
+    :param config: config of the chapter, only required if the worker wasn't initialized with one
+    :return: tuple of the manifest index of the chapter and the duration of the conversion
+    """
+    key = config.files.working_folder if config else None
+    if key not in _worker_converters:
+        _worker_converters[key] = Converter(config, load_manifest=False)
+
+    start = time.perf_counter()
+    index, file, url, title = task
+    _worker_converters[key].convert_file(index, {"file": file, "url": url, "title": title})
+    return index, time.perf_counter() - start
 
 
 class Converter:
-    def __init__(self, config):
+    def __init__(self, config: FictionConfig, load_manifest=True):
+        self.config = config
         self.files = config.files
         self.selectors = config.selectors
-        self.substitutions = config.substitutions
+        self.substitutions = SubstitutionPlan(config.substitutions)
+        # Content start selectors by chapter URL, the first one is used if there are multiple for a chapter
+        self.content_start_selectors = {}
+        for x in self.selectors.content_start_element or []:
+            self.content_start_selectors.setdefault(x.chapter_url, x.selector)
         self.remove_empty_elements = config.remove_empty_elements
         self.skip_urls = config.skip_urls
         self.skip_conversion = config.skip_conversion
-        self.manifest = Manifest(config.files.manifest_file)
+        self.manifest = Manifest(config.files.manifest_file) if load_manifest else None
 
     def convert(self, doc, chapter):
         title = chapter.get("title")
-        soup = BeautifulSoup(doc, "html.parser")
+        soup = BeautifulSoup(doc, "lxml")
 
         content_el = soup.select_one(self.selectors.content_element)
 
@@ -34,7 +71,7 @@ class Converter:
         if not self.skip_conversion:
             self.apply_chapter_fix(chapter, soup, content_el, self.selectors.content_element)
 
-            if self.selectors.content_start_element and (selector := next((x.selector for x in self.selectors.content_start_element if x.chapter_url == chapter.get("url", "")), None)):
+            if selector := self.content_start_selectors.get(chapter.get("url", "")):
                 content_start_el = content_el.select_one(selector)
                 while content_start_el and (prev := content_start_el.find_previous_sibling()):
                     prev.decompose()
@@ -52,7 +89,7 @@ class Converter:
                     raise ElementNotFoundException("Last paragraph not found for chapter: " + title)
 
             # If a cut-off element is specified, set its previous sibling as last element, otherwise the last paragraph
-            if s := self.selectors.get("cut_off_element"):
+            if s := self.selectors.cut_off_element:
                 if type(s) == str:
                     s = [s]
 
@@ -73,20 +110,7 @@ class Converter:
                         el.decompose()
 
             # Apply substitutions with CSS selector
-            for s in [s for s in self.substitutions if s.selector_type == "css"]:
-                if s.chapter_url and s.chapter_url != chapter.get("url"):
-                    continue
-
-                els = content_el.select(s.selector)
-
-                if len(els) == 0 and s.warn and s:
-                    echo("Chapter '%s': No matches for selector '%s'. Please check if the config is up-to-date." % (title, s.selector))
-
-                for el in els:
-                    if s.replace_with:
-                        el.replace_with(s.replace_with)
-                    else:
-                        el.decompose()
+            self.substitutions.apply_css(content_el, title, chapter.get("url"))
 
         # Change the content elements tag to <body> and add the chapter title
         content_el.name = "body"
@@ -94,19 +118,11 @@ class Converter:
         content_el.insert(0, soup.new_tag("h1"))
         content_el.h1.append(title)
 
-        # Create the output document and add the body
-        doc = BeautifulSoup(CHAPTER_DOC, "lxml")
-        doc.head.append(doc.new_tag("title"))
-        doc.head.title.append(title)
-        doc.body.replace_with(content_el)
+        # Serialize the body into the output document, instead of moving it into another parsed tree
+        doc = CHAPTER_DOC.format(title=escape(title, quote=False), body=content_el.decode())
 
         # Apply text and regex substitutions
-        doc = str(doc)
-        for s in self.substitutions:
-            if s.selector_type == "text":
-                doc = doc.replace(s.selector, s.replace_with)
-            elif s.selector_type == "regex":
-                doc = re.sub(r"%s" % s.selector, s.replace_with, doc)
+        doc = self.substitutions.apply_text(doc)
 
         echo("Converted chapter: %s" % title)
 
@@ -115,38 +131,56 @@ class Converter:
     @staticmethod
     def apply_chapter_fix(chapter, soup, content_el, content_el_selector):
         # Apply all chapter fixes that match (start with) the chapters url
-        for url, func in CHAPTER_FIXES.items():
-            if chapter.get("url").startswith(url):
-                func(soup, content_el, content_el_selector)
+        for func in get_chapter_fixes(chapter.get("url")):
+            func(soup, content_el, content_el_selector)
 
     def convert_file(self, index, chapter):
         in_file = os.path.join(self.files.cache_folder, chapter.get("file"))
         out_file = os.path.join(self.files.book_folder, chapter.get("file"))
 
-        if os.path.isfile(in_file):
-            with open(in_file, "r", encoding="utf8") as file:
-                doc = file.read()
-            with open(out_file, "w", encoding="utf8") as file:
-                doc = self.convert(doc, chapter)
-                file.write(doc)
-        else:
-            raise FileNotFoundError("File %s not found" % in_file)
+        # Downloaded chapters might be compressed, the file is decompressed while reading it
+        with io.TextIOWrapper(open_cache_file(in_file), encoding="utf8") as file:
+            doc = file.read()
+        with open(out_file, "w", encoding="utf8") as file:
+            doc = self.convert(doc, chapter)
+            file.write(doc)
 
         return index
 
-    def convert_all(self):
-        with Pool(processes=cpu_count()) as pool:
-            chapters_to_convert = filter(lambda t: not t[1].get("converted") and not t[1].get("url") in self.skip_urls, enumerate(self.manifest))
-            results = [pool.apply_async(self.convert_file, args=m) for m in chapters_to_convert]
-            converted_chapters = [p.get() for p in results]
-
-        for i in converted_chapters:
-            self.manifest[i].update({"converted": True})
-
-        self.manifest.save()
+    def convert_all(self, pool=None):
+        """Convert all chapters which are not converted yet.
+
+        :param pool: multiprocessing pool to use, a new pool is created if not provided
+        """
+        # Only the chapter info is sent to the workers, not the whole converter with config and manifest
+        tasks = [
+            (i, c.get("file"), c.get("url"), c.get("title"))
+            for (i, c) in enumerate(self.manifest)
+            if not c.get("converted") and not c.get("url") in self.skip_urls
+        ]
+
+        if len(tasks) > 0:
+            processes = min(cpu_count(), len(tasks))
+            chunk_size = max(1, min(32, len(tasks) // (processes * 4)))
+
+            if pool is None:
+                with Pool(processes=processes, initializer=init_worker, initargs=(self.config,)) as pool:
+                    self.collect_converted(pool.imap_unordered(convert_chapter, tasks, chunk_size))
+            else:
+                # A shared pool wasn't initialized with this config, so it's sent once per chunk instead
+                self.collect_converted(pool.imap_unordered(partial(convert_chapter, config=self.config), tasks, chunk_size))
 
         echo("Converted all chapters!")
 
+    def collect_converted(self, results):
+        """Mark chapters as converted in the manifest as soon as they are finished."""
+        try:
+            for (i, duration) in results:
+                self.manifest.put(i, {**self.manifest[i], "converted": True})
+                get_metrics().observe("convert", duration)
+        finally:
+            self.manifest.save()
+
     def clean(self):
         import shutil
         shutil.rmtree(self.files.book_folder)
@@ -1,2 +1,3 @@
 from .crawler import Crawler
 from .wandering_inn_patreon_crawler import WanderingInnPatreonCrawler
+from .async_crawler import AsyncCrawler
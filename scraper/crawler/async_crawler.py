@@ -0,0 +1,182 @@
+import asyncio
+import sys
+from collections import deque
+
+from click import echo
+
+from .crawler import Crawler, ChapterWriter, host_slot, _END
+from ..config import FictionConfig
+from ..session import RETRY_STATUS_CODES, get_session_options
+from ..rate_limit import get_rate_limiter
+from ..metrics import get_metrics
+
+# httpx is an optional dependency of the async extra
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+
+async def ordered_gather(func, items, window):
+    """Like ordered_map, but runs the calls of a coroutine function as tasks of the running event loop."""
+    pending = deque()
+    items = iter(items)
+    try:
+        while True:
+            while len(pending) < window and (item := next(items, _END)) is not _END:
+                pending.append(asyncio.ensure_future(func(item)))
+
+            if len(pending) == 0:
+                return
+
+            yield await pending.popleft()
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+class AsyncCrawler(Crawler):
+    """Crawler using asyncio and httpx, so the requests for tables of contents and updates are sent concurrently from
+    a single thread, and multiple fictions can be downloaded in one event loop.
+
+    download_chapter, download_sequential_chapter, fetch_page, get_toc_urls and revalidate_chapter are coroutines
+    here, subclasses override them and find_next_chapter_url the same way as for Crawler. Resuming, storing chapters
+    and updating the manifest is done by the methods of Crawler, only the requests are sent differently.
+    """
+
+    def __init__(self, config: FictionConfig):
+        if httpx is None:
+            echo("The AsyncCrawler requires the httpx package, install it with the async extra.")
+            sys.exit(1)
+
+        super().__init__(config)
+        self.client = None
+
+    @staticmethod
+    def create_client():
+        options = get_session_options()
+        transport = httpx.AsyncHTTPTransport(
+            retries=options["retries"],
+            limits=httpx.Limits(max_keepalive_connections=options["pool_size"]),
+        )
+        return httpx.AsyncClient(
+            transport=transport,
+            timeout=options["timeout"],
+            follow_redirects=True,
+            headers={"user-agent": options["user_agent"]},
+        )
+
+    def start_download(self):
+        asyncio.run(self.start_download_async())
+
+    def update_chapters(self):
+        asyncio.run(self.update_chapters_async())
+
+    async def start_download_async(self):
+        async with self.create_client() as self.client:
+            try:
+                if self.toc_url:
+                    await self.download_from_toc()
+                else:
+                    await self.download_sequentially()
+            finally:
+                self.manifest.save()
+                if self.page_cache:
+                    self.page_cache.save()
+
+    async def download_sequentially(self):
+        with self.exit_on_missing_element():
+            chapter = self.get_resume_chapter()
+            revalidation = await self.revalidate_chapter(chapter) if chapter else None
+            next_url, index, download = self.resume_sequential_download(revalidation)
+
+            writer = ChapterWriter(self) if self.pipelined else None
+
+            try:
+                while next_url is not None:
+                    url, title, content, soup = download or await self.download_sequential_chapter(next_url)
+                    if self.is_outdated_cached_page(url, soup):
+                        url, title, content, soup = await self.download_sequential_chapter(url, use_cache=False)
+                    next_url, index = self.add_sequential_chapter(index, url, title, content, soup, writer)
+                    download = None
+            finally:
+                if writer:
+                    writer.close()
+
+    async def update_chapters_async(self):
+        async def revalidate(item):
+            index, chapter = item
+            changed, validators, download = await self.revalidate_chapter(chapter)
+            if changed and not download:
+                download = await self.download_chapter(chapter.get("url"), use_cache=False)
+            return index, validators, download[:3] if changed else None
+
+        async with self.create_client() as self.client:
+            with self.updating_chapters() as (chapters, apply_update):
+                async for result in ordered_gather(revalidate, chapters, self.download_workers * 4):
+                    apply_update(*result)
+
+    async def revalidate_chapter(self, chapter):
+        if not any(chapter.get(k) for k in ("etag", "last_modified", "hash")):
+            return True, {}, None
+
+        r = await self.request(chapter.get("url"), headers=self.get_conditional_headers(chapter))
+        return self.compare_response(chapter, r)
+
+    async def request(self, url, headers=None):
+        """Send a GET request, limited by the host slots and retried with exponential backoff like the sessions."""
+        options = get_session_options()
+
+        for attempt in range(options["retries"] + 1):
+            async with host_slot(url, self.download_workers):
+                await get_rate_limiter().wait_async(url)
+                with get_metrics().timer("fetch"):
+                    r = await self.client.get(url, headers=headers)
+
+            if r.status_code not in RETRY_STATUS_CODES or attempt == options["retries"]:
+                self.record_response(r, attempt)
+                return r
+
+            retry_after = r.headers.get("Retry-After", "")
+            await asyncio.sleep(int(retry_after) if retry_after.isdigit() else options["backoff_factor"] * 2 ** attempt)
+
+    async def fetch_page(self, url, use_cache=True):
+        if use_cache and self.page_cache and (page := self.page_cache.get(url)):
+            final_url, content, validators = page
+            self.response_validators[final_url] = validators
+            self.cached_pages.add(final_url)
+            get_metrics().increment("page_cache_hits")
+            return final_url, content
+
+        r = await self.request(url)
+        final_url = str(r.url)
+        self.response_validators[final_url] = self.get_response_validators(r)
+        self.cached_pages.discard(final_url)
+
+        if self.page_cache and r.is_success:
+            self.page_cache.put(url, final_url, r.content, self.response_validators[final_url])
+
+        return final_url, r.content
+
+    async def download_chapter(self, url, use_cache=True):
+        return self.parse_chapter(*await self.fetch_page(url, use_cache))
+
+    async def download_sequential_chapter(self, url, use_cache=True):
+        if self.pipelined and self.parse_in_writer:
+            return self.parse_next_chapter_element(*await self.fetch_page(url, use_cache))
+        return await self.download_chapter(url, use_cache)
+
+    async def get_toc_urls(self):
+        return self.parse_toc(*await self.fetch_page(self.toc_url, use_cache=False))
+
+    async def download_from_toc(self):
+        with self.exit_on_missing_element():
+            toc_urls = await self.get_toc_urls()
+
+        async def download(url):
+            return (await self.download_chapter(url))[:3]
+
+        with self.downloading_from_toc(toc_urls) as (urls, store):
+            async for chapter in ordered_gather(download, urls, self.download_workers * 4):
+                if not store(*chapter):
+                    break
@@ -1,61 +1,553 @@
+import asyncio
+import contextlib
+import functools
+import hashlib
 import os
+import re
 import sys
+import threading
 import urllib.parse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from queue import Queue
 
+import lxml.etree
+import lxml.html
 from click import echo
-from requests import get
-from box import Box
 from bs4 import BeautifulSoup
 
 from ..manifest import Manifest
+from ..config import FictionConfig
+from ..session import get_session
+from ..page_cache import get_page_cache
+from ..rate_limit import get_rate_limiter
+from ..metrics import get_metrics
+from ..cache_files import open_cache_file, write_cache_file, extract_content
 from ..exception import ElementNotFoundException
+from ..const import CHAPTER_FILE_NAME
+
+
+class HostSlots:
+    """Semaphore which can be acquired by threads with "with" and by coroutines of any event loop with "async with".
+
+    A released slot is handed to the longest waiting thread or coroutine. Coroutines wait without blocking their
+    event loop, so crawlers running in different threads and event loops share the same limit.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.active = 0
+        # Callbacks which wake up a waiting thread or coroutine, which then owns the released slot
+        self.waiters = deque()
+        self.lock = threading.Lock()
+
+    def try_acquire(self) -> bool:
+        # Called with the lock held
+        if self.active < self.limit and not self.waiters:
+            self.active += 1
+            return True
+        return False
+
+    def acquire(self):
+        with self.lock:
+            if self.try_acquire():
+                return
+            event = threading.Event()
+            self.waiters.append(event.set)
+        event.wait()
+
+    async def acquire_async(self):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def wake():
+            loop.call_soon_threadsafe(lambda: future.done() or future.set_result(None))
+
+        with self.lock:
+            if self.try_acquire():
+                return
+            self.waiters.append(wake)
+
+        try:
+            await future
+        except asyncio.CancelledError:
+            with self.lock:
+                owned = wake not in self.waiters
+                if not owned:
+                    self.waiters.remove(wake)
+            # The slot might have been handed over right before the coroutine was cancelled
+            if owned:
+                self.release()
+            raise
+
+    def release(self):
+        while True:
+            with self.lock:
+                if not self.waiters:
+                    self.active -= 1
+                    return
+                wake = self.waiters.popleft()
+            try:
+                wake()
+                return
+            except RuntimeError:
+                # The event loop of the waiting coroutine was closed, the slot goes to the next one
+                continue
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release()
+
+    async def __aenter__(self):
+        await self.acquire_async()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        self.release()
+
+
+# Slots limiting the number of concurrent requests per host and limit, shared by all crawlers of the process, in all
+# threads and event loops. Crawlers with the same download_workers share the slots, a config with a different number
+# gets its own ones.
+_host_slots = {}
+_host_slots_lock = threading.Lock()
+
+
+def host_slot(url, limit) -> HostSlots:
+    key = (urllib.parse.urlparse(url).netloc, limit)
+    with _host_slots_lock:
+        if key not in _host_slots:
+            _host_slots[key] = HostSlots(limit)
+        return _host_slots[key]
+
+
+_END = object()
+
+
+def ordered_map(executor, func, items, window):
+    """Like executor.map, but only submits a limited number of calls ahead of the oldest unfinished one."""
+    pending = deque()
+    items = iter(items)
+    try:
+        while True:
+            while len(pending) < window and (item := next(items, _END)) is not _END:
+                pending.append(executor.submit(func, item))
+
+            if len(pending) == 0:
+                return
+
+            yield pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+# Pseudo-classes which only depend on the element and its descendants, so they match the same elements in a fragment
+# of the page
+FRAGMENT_PSEUDO_CLASSES = {"-soup-contains", "-soup-contains-own"}
+FIRST_COMPOUND_SELECTOR = re.compile(r"\s*(\*|[a-zA-Z][\w-]*)?((?:[.#][\w-]+|\[x*]|:[\w-]+(?:\(x*\))?)*)(?:\s|>|$)")
+
+
+def blank_strings(selector: str) -> str:
+    """Replace the contents of strings, attribute selectors and pseudo-class arguments, keeping the positions."""
+    def blank(match):
+        return match[0][0] + "x" * (len(match[0]) - 2) + match[0][-1]
+
+    # Strings first, so brackets in strings don't end the attribute selectors and arguments around them
+    selector = re.sub(r'"[^"]*"|\'[^\']*\'', blank, selector)
+    return re.sub(r"\[[^\]]*]|\([^)]*\)", blank, selector)
+
+
+@functools.lru_cache
+def compile_fragment_xpath(selector: str) -> str | None:
+    """Translate the first compound selector of a CSS selector into an XPath expression for the elements of a page
+    whose fragments contain all the elements the selector needs.
+
+    :return: the XPath expression, or None if the selector depends on elements outside these fragments, e.g. on
+        siblings or positions, or if the first compound selector has no type, class or ID
+    """
+    blanked = blank_strings(selector)
+    pseudo_classes = re.findall(r":+([\w-]+)", blanked)
+    if re.search(r"[,+~]", blanked) or any(p not in FRAGMENT_PSEUDO_CLASSES for p in pseudo_classes):
+        return None
+
+    if not (match := FIRST_COMPOUND_SELECTOR.match(blanked)):
+        return None
+
+    tag, compound = match.groups()
+    conditions = ["contains(concat(' ', normalize-space(@class), ' '), ' %s ')" % c
+                  for c in re.findall(r"\.([\w-]+)", compound)]
+    conditions += ["@id='%s'" % i for i in re.findall(r"#([\w-]+)", compound)]
+    if tag in (None, "*") and not conditions:
+        return None
+
+    return "//%s%s" % ((tag or "*").lower(), "".join("[%s]" % c for c in conditions))
+
+
+def parse_fragments(content: bytes, selector: str) -> BeautifulSoup:
+    """Parse only the fragment of a page which contains the first element matched by a CSS selector.
+
+    The page is parsed with lxml, which is much faster than building the BeautifulSoup tree of the whole page. The
+    elements matched by the first compound selector are parsed with BeautifulSoup in document order, until one of
+    them contains a match of the selector. The whole page is parsed if the selector doesn't work on fragments.
+
+    :return: the fragment, or an empty page if no element matched the selector
+    """
+    if (xpath := compile_fragment_xpath(selector)) is None:
+        return BeautifulSoup(content, "lxml")
+
+    try:
+        root = lxml.html.fromstring(content)
+    except (lxml.etree.ParserError, ValueError):
+        return BeautifulSoup(content, "lxml")
+
+    for el in root.xpath(xpath):
+        fragment = BeautifulSoup(lxml.html.tostring(el, with_tail=False), "lxml")
+        if fragment.select_one(selector):
+            return fragment
+
+    return BeautifulSoup("", "lxml")
 
 
 # noinspection DuplicatedCode
 class Crawler:
-    def __init__(self, config: Box):
+    # Pipelined sequential downloads only look for the next chapter link in the crawl loop and parse the chapters in
+    # the ChapterWriter. Crawlers which need the whole page to download a chapter parse it in the crawl loop.
+    parse_in_writer = True
+
+    def __init__(self, config: FictionConfig):
         self.start_url = config.start_url
         self.end_url = config.end_url
         self.skip_urls = config.skip_urls
         self.selectors = config.selectors
         self.files = config.files
         self.manifest = Manifest(config.files.manifest_file)
+        self.session = get_session()
+        self.pipelined = config.pipelined_download
+        self.toc_url = config.toc_url
+        self.toc_link_selector = config.toc_link_selector
+        self.download_workers = config.download_workers
+        self.cache_compression = config.cache_compression
+        self.cache_content_only = config.cache_content_only
+        # Cache validators of the latest responses, which are stored in the manifest with the chapter
+        self.response_validators = {}
+        self.page_cache = get_page_cache()
+
+        if config.rate_limit:
+            for url in filter(None, (self.start_url, self.toc_url)):
+                get_rate_limiter().limit_host(url, config.rate_limit)
+        # URLs of the pages which were read from the page cache instead of downloaded
+        self.cached_pages = set()
 
     def start_download(self):
-        if len(self.manifest) > 0:
-            next_url = self.manifest[-1].get("url")
-            index = len(self.manifest) - 1
-        else:
-            next_url = self.start_url
-            index = 0
+        try:
+            if self.toc_url:
+                self.download_from_toc()
+            else:
+                self.download_sequentially()
+        finally:
+            # Chapters are only appended to the manifest journal while downloading, so merge it into the manifest
+            self.manifest.save()
+            if self.page_cache:
+                self.page_cache.save()
+
+    @staticmethod
+    @contextlib.contextmanager
+    def exit_on_missing_element():
+        """Stop the crawl with the message of an ElementNotFoundException instead of a traceback."""
+        try:
+            yield
+        except ElementNotFoundException as e:
+            echo(e)
+            sys.exit()
+
+    def download_sequentially(self):
+        with self.exit_on_missing_element():
+            chapter = self.get_resume_chapter()
+            revalidation = self.revalidate_chapter(chapter) if chapter else None
+            next_url, index, download = self.resume_sequential_download(revalidation)
+
+            # In pipelined mode, parsing and saving the chapter and updating the manifest happens in a background thread,
+            # so the next request can be sent as soon as the next chapter URL has been found
+            writer = ChapterWriter(self) if self.pipelined else None
 
-        while next_url is not None:
             try:
-                url, title, content, soup = self.download_chapter(next_url)
-            except ElementNotFoundException as e:
-                echo(e)
-                sys.exit()
+                while next_url is not None:
+                    url, title, content, soup = download or self.download_sequential_chapter(next_url)
+                    if self.is_outdated_cached_page(url, soup):
+                        # The page might have been cached before the next chapter was released
+                        url, title, content, soup = self.download_sequential_chapter(url, use_cache=False)
+                    next_url, index = self.add_sequential_chapter(index, url, title, content, soup, writer)
+                    download = None
+            finally:
+                if writer:
+                    writer.close()
 
-            if not title and not content and not soup:
-                return
+    def download_sequential_chapter(self, url, use_cache=True):
+        """Download a chapter of a sequential download.
 
-            if url not in self.skip_urls:
-                file_name = self.save_chapter(content, index)
-                self.add_chapter_to_manifest(index, url, title, file_name)
-                index += 1
-                echo("Downloaded chapter %s" % title)
+        In pipelined mode, only the parts of the page which can contain the next chapter link are parsed, and the
+        title is None. The ChapterWriter parses the whole page.
+        """
+        if self.pipelined and self.parse_in_writer:
+            return self.parse_next_chapter_element(*self.fetch_page(url, use_cache))
+        return self.download_chapter(url, use_cache)
+
+    def parse_next_chapter_element(self, url, content):
+        """Parse the fragment of a chapter page with the next chapter element.
+
+        :return: tuple like download_chapter returns it, with None as title and the fragment instead of the page
+        """
+        with get_metrics().timer("parse"):
+            return url, None, content, parse_fragments(content, self.selectors.next_chapter_element)
+
+    def get_resume_chapter(self):
+        """Get the last downloaded chapter, which is revalidated before a sequential download continues after it.
+
+        :return: the manifest entry of the chapter, or None if nothing was downloaded yet or the chapter is skipped
+        """
+        if len(self.manifest) > 0 and self.manifest[-1].get("url") not in self.skip_urls:
+            return self.manifest[-1]
+        return None
+
+    def resume_sequential_download(self, revalidation):
+        """Find the chapter a sequential download starts with.
+
+        :param revalidation: result of revalidate_chapter for the resume chapter, or None if there is none
+        :return: tuple of the URL and index of the first chapter to download, and the chapter like download_chapter
+            returns it, if the revalidation already downloaded it
+        """
+        if len(self.manifest) == 0:
+            return self.start_url, 0, None
+
+        url = self.manifest[-1].get("url")
+        index = len(self.manifest) - 1
+
+        if revalidation is None:
+            return url, index, None
+
+        changed, validators, download = revalidation
+        if changed:
+            return url, index, download
+        if url == self.end_url:
+            return None, index + 1, None
+        if download is None:
+            # Not modified, so the downloaded file has the same next chapter link as the page
+            return self.find_next_cached_chapter_url(), index + 1, None
+
+        # The text of the chapter didn't change, but the links around it might have, e.g. to a new next chapter
+        final_url, _, content, soup = download
+        self.refresh_chapter(index, content, validators)
+        return self.find_next_chapter_url(final_url, soup), index + 1, None
+
+    def refresh_chapter(self, index, content, validators):
+        """Replace the file of an unchanged chapter with the page of a new response and store its validators.
+
+        The rest of the manifest entry is kept, so the chapter isn't converted again.
+        """
+        file_name = self.save_chapter(content, index)
+        self.manifest.put(index, {**self.manifest[index], **validators, "file": file_name})
+
+    def is_outdated_cached_page(self, url, soup):
+        """Check if a page from the page cache has no next chapter link, because it was cached before the next
+        chapter was released."""
+        return url in self.cached_pages and url != self.end_url \
+            and soup is not None and not soup.select_one(self.selectors.next_chapter_element)
+
+    def add_sequential_chapter(self, index, url, title, content, soup, writer=None):
+        """Store a chapter of a sequential download, unless it is skipped, and find the next chapter.
+
+        :param title: title of the chapter, or None if the page wasn't parsed yet
+        :param writer: ChapterWriter of a pipelined download, which parses and stores the chapter in the background
+        :return: tuple of the URL of the next chapter, or None if the download is finished, and its index
+        """
+        if not title and not content and not soup:
+            return None, index
+
+        if url not in self.skip_urls:
+            if writer:
+                writer.put(index, url, title, content)
             else:
-                echo("Skipped chapter %s" % title)
+                self.store_chapter(index, url, title, content)
+                echo("Downloaded chapter %s" % title)
+            index += 1
+        else:
+            echo("Skipped chapter %s" % (title or url))
 
-            if url == self.end_url:
-                return
+        if url == self.end_url:
+            return None, index
+
+        return self.find_next_chapter_url(url, soup), index
+
+    def find_next_cached_chapter_url(self):
+        """Find the URL of the chapter after the last downloaded one in its downloaded file."""
+        with open_cache_file(os.path.join(self.files.cache_folder, self.manifest[-1].get("file"))) as file:
+            soup = BeautifulSoup(file.read(), "lxml")
+        return self.find_next_chapter_url(self.manifest[-1].get("url"), soup)
+
+    def update_chapters(self):
+        """Revalidate all downloaded chapters with conditional requests and download the changed ones again."""
+        def revalidate(item):
+            index, chapter = item
+            with host_slot(chapter.get("url"), self.download_workers):
+                changed, validators, download = self.revalidate_chapter(chapter)
+                if changed and not download:
+                    download = self.download_chapter(chapter.get("url"), use_cache=False)
+                return index, validators, download[:3] if changed else None
+
+        with self.updating_chapters() as (chapters, apply_update):
+            with ThreadPoolExecutor(max_workers=self.download_workers) as executor:
+                for result in ordered_map(executor, revalidate, chapters, self.download_workers * 4):
+                    apply_update(*result)
+
+    @contextlib.contextmanager
+    def updating_chapters(self):
+        """Context of an update, which yields the chapters to revalidate as (index, manifest entry) tuples and a
+        function which applies the results of the revalidations like apply_update.
+
+        The manifest and the page cache are saved afterwards, even if the update failed.
+        """
+        chapters = [(i, c) for (i, c) in enumerate(self.manifest) if c.get("url") not in self.skip_urls]
+        updated = 0
+
+        def apply(index, validators, download):
+            nonlocal updated
+            updated += self.apply_update(index, validators, download)
+
+        echo("Checking %s chapters for changes..." % len(chapters))
+
+        try:
+            with self.exit_on_missing_element():
+                yield chapters, apply
+        finally:
+            self.manifest.save()
+            if self.page_cache:
+                self.page_cache.save()
+
+        echo("%s of %s chapters changed" % (updated, len(chapters)))
+
+    def apply_update(self, index, validators, download) -> bool:
+        """Store a changed chapter, or the new validators of an unchanged one.
+
+        :param download: tuple of URL, title and content of the changed chapter, or None if it didn't change
+        :return: True if the chapter changed
+        """
+        if download is None:
+            if validators.items() - self.manifest[index].items():
+                self.manifest.put(index, {**self.manifest[index], **validators})
+            return False
+
+        url, title, content = download
+        if not title and not content:
+            return False
+
+        self.store_chapter(index, url, title, content)
+        echo("Updated chapter %s" % title)
+        return True
+
+    def revalidate_chapter(self, chapter):
+        """Check if a downloaded chapter changed, using its ETag, Last-Modified date or content hash.
+
+        :return: tuple of the changed flag, the validators of the response and the chapter like compare_response
+            returns it, if the response contained the page
+        """
+        if not any(chapter.get(k) for k in ("etag", "last_modified", "hash")):
+            return True, {}, None
+
+        r = self.session.get(chapter.get("url"), headers=self.get_conditional_headers(chapter))
+        return self.compare_response(chapter, r)
+
+    @staticmethod
+    def get_conditional_headers(chapter):
+        headers = {}
+        if etag := chapter.get("etag"):
+            headers["If-None-Match"] = etag
+        if last_modified := chapter.get("last_modified"):
+            headers["If-Modified-Since"] = last_modified
+        return headers
+
+    def compare_response(self, chapter, r):
+        """Check if the response of a conditional request for a chapter has a changed chapter.
+
+        Only the text of the content element is compared, so ads, tokens and timestamps around it don't count as
+        changes. A changed page is parsed like download_chapter does, so it doesn't have to be downloaded again.
+
+        :return: tuple of the changed flag, the validators of the response and the chapter, if the response contained
+            the page. The chapter is a tuple like download_chapter returns it, with None as title if it didn't change.
+        """
+        if r.status_code == 304:
+            return False, self.get_response_validators(r), None
+        if r.status_code >= 400:
+            echo("Could not check chapter %s for changes, status: %s" % (chapter.get("title"), r.status_code))
+            return False, {}, None
+
+        url = str(r.url)
+        validators = self.get_response_validators(r)
+        with get_metrics().timer("parse"):
+            soup = BeautifulSoup(r.content, "lxml")
+        validators["hash"] = self.get_content_hash(r.content, soup)
+
+        if self.page_cache:
+            self.page_cache.put(chapter.get("url"), url, r.content, self.get_response_validators(r))
+
+        if validators["hash"] == chapter.get("hash"):
+            return False, validators, (url, None, r.content, soup)
+
+        self.response_validators[url] = dict(validators)
+
+        return True, validators, self.parse_chapter(url, r.content, soup)
+
+    @staticmethod
+    def get_response_validators(r):
+        validators = {}
+        if etag := r.headers.get("ETag"):
+            validators["etag"] = etag
+        if last_modified := r.headers.get("Last-Modified"):
+            validators["last_modified"] = last_modified
+        return validators
+
+    def fetch_page(self, url, use_cache=True):
+        """Get a page from the page cache, or download it and add it to the cache.
+
+        :return: tuple of the final URL after redirects and the content of the page
+        """
+        if use_cache and self.page_cache and (page := self.page_cache.get(url)):
+            final_url, content, validators = page
+            self.response_validators[final_url] = validators
+            self.cached_pages.add(final_url)
+            get_metrics().increment("page_cache_hits")
+            return final_url, content
+
+        with get_metrics().timer("fetch"):
+            r = self.session.get(url)
+        # Retries happen inside urllib3, which records them in the history of the retry state of the response
+        self.record_response(r, len(getattr(getattr(r.raw, "retries", None), "history", ())))
+        self.response_validators[r.url] = self.get_response_validators(r)
+        self.cached_pages.discard(r.url)
+
+        if self.page_cache and r.ok:
+            self.page_cache.put(url, r.url, r.content, self.response_validators[r.url])
 
-            next_url = self.find_next_chapter_url(url, soup)
+        return r.url, r.content
 
-    def download_chapter(self, url):
-        r = get(url)
+    @staticmethod
+    def record_response(r, retries=0):
+        metrics = get_metrics()
+        metrics.increment("requests")
+        metrics.increment("bytes_downloaded", len(r.content))
+        if retries:
+            metrics.increment("retries", retries)
 
-        soup = BeautifulSoup(r.content, "lxml")
+    def download_chapter(self, url, use_cache=True):
+        return self.parse_chapter(*self.fetch_page(url, use_cache))
+
+    def parse_chapter(self, url, content, soup=None):
+        if soup is None:
+            with get_metrics().timer("parse"):
+                soup = BeautifulSoup(content, "lxml")
 
         title_el = soup.select_one(self.selectors.title_element)
 
@@ -66,52 +558,154 @@ class Crawler:
         title = title.replace(" ", " ")\
             .replace("  ", " ")
 
-        return r.url, title, r.content, soup
+        # The content hash is stored in the manifest with the chapter, to detect changes when it is revalidated
+        self.response_validators.setdefault(url, {})["hash"] = self.get_content_hash(content, soup)
+
+        return url, title, content, soup
+
+    def get_content_hash(self, content, soup=None):
+        """Hash the text of the content element of a chapter page, or the whole page if it has none."""
+        if soup is None:
+            soup = BeautifulSoup(content, "lxml")
+
+        if content_el := soup.select_one(self.selectors.content_element):
+            return hashlib.sha256(content_el.get_text().encode("utf-8")).hexdigest()
+        return hashlib.sha256(content).hexdigest()
+
+    def get_toc_urls(self):
+        # The table of contents changes with every new chapter, so it's never read from the page cache
+        return self.parse_toc(*self.fetch_page(self.toc_url, use_cache=False))
+
+    def parse_toc(self, toc_url, content):
+        soup = BeautifulSoup(content, "lxml")
+
+        urls = []
+        for el in soup.select(self.toc_link_selector):
+            if (href := el.get("href")) and (url := self.resolve_url(toc_url, href)) not in urls:
+                urls.append(url)
+
+        if len(urls) == 0:
+            raise ElementNotFoundException("No chapter links found on the table of contents page")
+
+        # Only download the chapters between the start and end url, if they are listed in the table of contents
+        if self.start_url in urls:
+            urls = urls[urls.index(self.start_url):]
+        if self.end_url in urls:
+            urls = urls[:urls.index(self.end_url) + 1]
+
+        return urls
+
+    def download_from_toc(self):
+        with self.exit_on_missing_element():
+            toc_urls = self.get_toc_urls()
+
+        def download(url):
+            with host_slot(url, self.download_workers):
+                return self.download_chapter(url)[:3]
+
+        # Chapters are downloaded concurrently, but stored in reading order. Only a limited number of downloads is
+        # queued ahead of the oldest pending one, so finished chapters don't pile up in memory.
+        with self.downloading_from_toc(toc_urls) as (urls, store):
+            with ThreadPoolExecutor(max_workers=self.download_workers) as executor:
+                for chapter in ordered_map(executor, download, urls, self.download_workers * 4):
+                    if not store(*chapter):
+                        break
+
+    @contextlib.contextmanager
+    def downloading_from_toc(self, toc_urls):
+        """Context of a download from the table of contents, which yields the URLs of the new chapters and a function
+        which stores the downloaded chapters in the order they are passed to it.
+
+        The function returns False if the download should stop. The chapters are sorted in the order of the table of
+        contents afterwards, even if the download failed.
+        """
+        downloaded_urls = set(m.get("url") for m in self.manifest)
+        urls = [u for u in toc_urls if u not in downloaded_urls and u not in self.skip_urls]
+        index = len(self.manifest)
+
+        echo("Found %s chapters in the table of contents, %s of them are new" % (len(toc_urls), len(urls)))
+
+        def store(url, title, content):
+            nonlocal index
+            if not title and not content:
+                return False
+
+            self.store_chapter(index, url, title, content)
+            index += 1
+            echo("Downloaded chapter %s" % title)
+            return True
+
+        try:
+            with self.exit_on_missing_element():
+                yield urls, store
+        finally:
+            self.sort_manifest_by_toc(toc_urls)
+
+    def sort_manifest_by_toc(self, toc_urls):
+        """Put the chapters of the manifest in the order of the table of contents.
+
+        New chapters are appended to the manifest, even if they were inserted in the middle of the table of contents.
+        The chapters listed in the table of contents are sorted in the positions they occupy, the others keep their
+        positions. The entries keep their file names, so downloaded and converted files still match.
+        """
+        toc_positions = {url: i for (i, url) in enumerate(toc_urls)}
+        indexes = [i for (i, c) in enumerate(self.manifest) if c.get("url") in toc_positions]
+        entries = sorted((self.manifest[i] for i in indexes), key=lambda c: toc_positions[c.get("url")])
+
+        if any(self.manifest[i] is not c for (i, c) in zip(indexes, entries)):
+            for (i, c) in zip(indexes, entries):
+                self.manifest[i] = c
+            # The journal records entries by index, so the new order is only stored by saving the manifest
+            self.manifest.save()
+            echo("Sorted the chapters in the order of the table of contents")
+
+    def store_chapter(self, index, url, title, content):
+        file_name = self.save_chapter(content, index)
+        validators = self.response_validators.pop(url, {})
+        if "hash" not in validators:
+            validators["hash"] = self.get_content_hash(content)
+        self.add_chapter_to_manifest(index, url, title, file_name, validators)
 
     def save_chapter(self, content, index=0):
-        chapter_file = "chapter%s%s%s.html" % (
-            "0" if index < 100 else "",
-            "0" if index < 10 else "",
-            index,
-        )
-        with open(os.path.join(self.files.cache_folder, chapter_file), "wb") as file:
-            file.write(content)
+        chapter_file = CHAPTER_FILE_NAME % index
+        if self.cache_content_only:
+            content = extract_content(content, self.selectors)
+        write_cache_file(os.path.join(self.files.cache_folder, chapter_file), content, self.cache_compression)
         return chapter_file
 
-    def add_chapter_to_manifest(self, index, url, title, file_name):
+    def add_chapter_to_manifest(self, index, url, title, file_name, validators=None):
         manifest_entry = {
             "title": title,
             "file": file_name,
             "converted": False,
             "url": url,
+            **(validators or {}),
         }
 
-        if len(self.manifest) - 1 == index:
-            self.manifest[index] = manifest_entry
-        else:
-            self.manifest.append(manifest_entry)
-
-        self.manifest.save()
+        self.manifest.put(index, manifest_entry)
 
     def find_next_chapter_url(self, current_url, soup):
         next_chapter_el = soup.select_one(self.selectors.next_chapter_element)
 
         if next_chapter_el:
-            next_url = next_chapter_el.get("href")
-            if not next_url.startswith("http"):
-                # If URLs are relative, we add the scheme and hostname from the current url
-                url_parsed = urllib.parse.urlparse(current_url)
-                next_url = "%s://%s%s" % (
-                    url_parsed.scheme,
-                    url_parsed.hostname,
-                    next_url if next_url.startswith("/") else "/%s" % next_url,
-                )
-
-            return next_url
+            return self.resolve_url(current_url, next_chapter_el.get("href"))
 
         echo("Next chapter element not found")
         return None
 
+    @staticmethod
+    def resolve_url(current_url, url):
+        if not url.startswith("http"):
+            # If URLs are relative, we add the scheme and hostname from the current url
+            url_parsed = urllib.parse.urlparse(current_url)
+            url = "%s://%s%s" % (
+                url_parsed.scheme,
+                url_parsed.netloc,
+                url if url.startswith("/") else "/%s" % url,
+            )
+
+        return url
+
     def clean(self):
         import shutil
         shutil.rmtree(self.files.cache_folder)
@@ -119,3 +713,45 @@ class Crawler:
 
         self.manifest.clear()
         self.manifest.save()
+
+
+class ChapterWriter:
+    """Background stage of the pipelined download, which saves downloaded chapters in the order they were queued.
+
+    The writer parses the page for the title, extracts the content (if only the content is cached), hashes,
+    compresses and writes the chapter and updates the manifest. The crawl loop only parses the fragment of the page
+    with the next chapter link. Errors are raised in the crawl loop by the next put or by close.
+    """
+
+    def __init__(self, crawler: Crawler, max_pending=32):
+        self.crawler = crawler
+        self.queue = Queue(maxsize=max_pending)
+        self.error = None
+        self.thread = threading.Thread(target=self.run, name="chapter-writer", daemon=True)
+        self.thread.start()
+
+    def put(self, index, url, title, content):
+        if self.error:
+            raise self.error
+        self.queue.put((index, url, title, content))
+
+    def run(self):
+        while (item := self.queue.get()) is not None:
+            if self.error:
+                continue
+            try:
+                self.store(*item)
+            except Exception as e:
+                self.error = e
+
+    def store(self, index, url, title, content):
+        if title is None:
+            url, title, content, _ = self.crawler.parse_chapter(url, content)
+        self.crawler.store_chapter(index, url, title, content)
+        echo("Downloaded chapter %s" % title)
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+        if self.error:
+            raise self.error
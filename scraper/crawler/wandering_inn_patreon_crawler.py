@@ -1,27 +1,28 @@
 from click import confirm, prompt, echo
-from box import Box
 from bs4 import BeautifulSoup
-from requests import Session
 
 from .crawler import Crawler
+from ..config import FictionConfig
 from ..exception import ElementNotFoundException
+from ..session import create_session
 
 
 # noinspection DuplicatedCode
 class WanderingInnPatreonCrawler(Crawler):
-    def __init__(self, config: Box, patreon_cookie=None):
+    # Protected chapters are recognized by their password form, so pages are always parsed in the crawl loop
+    parse_in_writer = False
+
+    def __init__(self, config: FictionConfig, patreon_cookie=None):
         super().__init__(config)
         echo("Using Wandering Inn Crawler")
 
-        self.session = Session()
-        self.session.headers = {
-            "user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/123.0.0.0 Safari/537.36"
-        }
+        # The session holds the cookies for password protected chapters, so it's not shared with other crawlers
+        self.session = create_session()
 
         self.attempted_patreon_password = False
 
         if patreon_cookie:
-            self.patreon_session = Session()
+            self.patreon_session = create_session()
             self.cookies = {"session_id": patreon_cookie}
         else:
             self.patreon_session = None
@@ -72,8 +73,10 @@ class WanderingInnPatreonCrawler(Crawler):
             echo("Found a password! But does it work?")
             return password_element.find_next_sibling().get_text().strip()
 
-    def download_chapter(self, url):
+    def download_chapter(self, url, use_cache=True):
+        # Protected chapters depend on the session cookies, so pages of this site are never read from the page cache
         r = self.session.get(url)
+        self.response_validators[r.url] = self.get_response_validators(r)
 
         if r.status_code != 200:
             echo("Something went wrong! URL: %s, Status: %s" % (r.url, r.status_code))
@@ -122,6 +125,8 @@ class WanderingInnPatreonCrawler(Crawler):
 
             return self.download_chapter(r.url)
 
+        self.response_validators[r.url]["hash"] = self.get_content_hash(r.content, soup)
+
         return r.url, title, r.content, soup
 
     def find_next_chapter_url(self, current_url, soup):
@@ -0,0 +1,128 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import subprocess
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+from click import echo
+
+EBOOK_CONVERT = "ebook-convert"
+
+# Limits the number of conversions running at the same time, shared by all runs of the process
+_conversion_slots = threading.BoundedSemaphore(os.cpu_count() or 1)
+# Serializes updates of the state files by converters running at the same time
+_state_lock = threading.Lock()
+
+# The modification date changes every time the EPUB is bound, even if the content is the same
+MODIFIED_PATTERN = re.compile(rb'<meta property="dcterms:modified">[^<]*</meta>')
+
+
+def get_format_file(epub_file: str, ebook_format: str) -> str:
+    return os.path.splitext(epub_file)[0] + "." + ebook_format
+
+
+def get_epub_hash(epub_file: str) -> str:
+    """Hash the content of an EPUB file, using the CRCs of the archive members, so they don't have to be decompressed.
+
+    The modification date in the package document is ignored.
+    """
+    h = hashlib.sha256()
+    with zipfile.ZipFile(epub_file) as z:
+        for info in z.infolist():
+            h.update(info.filename.encode())
+            if info.filename.endswith(".opf"):
+                h.update(MODIFIED_PATTERN.sub(b"", z.read(info)))
+            else:
+                h.update(info.CRC.to_bytes(4, "big"))
+    return h.hexdigest()
+
+
+class FormatConverter:
+    """Converts EPUB files into other formats with Calibre's ebook-convert, running the conversions concurrently.
+
+    Outputs are skipped if they were created from an EPUB file with the same content, which is recorded in a JSON file.
+    """
+
+    def __init__(self, state_file: str):
+        self.state_file = state_file
+        self.state = self.load_state()
+        # Outputs created or failed by this converter, with the hash of their EPUB or None
+        self.changes = {}
+
+    def load_state(self) -> dict:
+        if os.path.isfile(self.state_file):
+            with open(self.state_file, "r", encoding="utf-8") as file:
+                try:
+                    return json.load(file)
+                except json.JSONDecodeError:
+                    pass
+        return {}
+
+    def convert_all(self, epub_files: list[str], ebook_formats: list[str]):
+        if not shutil.which(EBOOK_CONVERT):
+            echo("%s not found, please install Calibre to create other eBook formats" % EBOOK_CONVERT)
+            return
+
+        tasks = []
+        for epub_file in epub_files:
+            if not os.path.isfile(epub_file):
+                echo("%s not found!" % epub_file)
+                continue
+
+            epub_hash = get_epub_hash(epub_file)
+            for f in ebook_formats:
+                output_file = get_format_file(epub_file, f)
+                if self.is_up_to_date(output_file, epub_hash):
+                    echo("%s is up-to-date" % os.path.basename(output_file))
+                else:
+                    tasks.append((epub_file, output_file, epub_hash))
+
+        if len(tasks) == 0:
+            return
+
+        with ThreadPoolExecutor(max_workers=len(tasks)) as executor:
+            for (epub_file, output_file, epub_hash), result in zip(tasks, executor.map(self.convert, tasks)):
+                if result.returncode == 0:
+                    echo("Created %s" % os.path.basename(output_file))
+                    self.changes[output_file] = epub_hash
+                else:
+                    self.changes[output_file] = None
+                    output = (result.stderr or result.stdout).strip().splitlines()
+                    echo("Could not convert %s into %s, exit code: %s" % (
+                        os.path.basename(epub_file), os.path.basename(output_file), result.returncode))
+                    for line in output[-10:]:
+                        echo("  " + line)
+
+        self.save()
+
+    def is_up_to_date(self, output_file: str, epub_hash: str) -> bool:
+        return self.state.get(output_file) == epub_hash and os.path.isfile(output_file)
+
+    @staticmethod
+    def convert(task) -> subprocess.CompletedProcess:
+        epub_file, output_file, _ = task
+        with _conversion_slots:
+            return subprocess.run([EBOOK_CONVERT, epub_file, output_file], capture_output=True, text=True, errors="replace")
+
+    def save(self):
+        """Apply the changes of this converter to the current state file, so the outputs recorded by other converters
+        since this one was created are kept."""
+        with _state_lock:
+            state = self.load_state()
+            for (output_file, epub_hash) in self.changes.items():
+                if epub_hash:
+                    state[output_file] = epub_hash
+                else:
+                    state.pop(output_file, None)
+
+            temp_path = "%s.%s.tmp" % (self.state_file, os.getpid())
+            with open(temp_path, "w", encoding="utf-8") as file:
+                json.dump(state, file, indent=2)
+            os.replace(temp_path, self.state_file)
+
+            self.state = state
+            self.changes = {}
@@ -0,0 +1,234 @@
+import copy
+import mimetypes
+import os
+import struct
+import zipfile
+from datetime import datetime, timezone
+from xml.sax.saxutils import escape, quoteattr
+
+from .const import DC_KEYS
+
+CONTAINER_XML = """<?xml version="1.0" encoding="utf-8"?>
+<container xmlns="urn:oasis:names:tc:opendocument:xmlns:container" version="1.0">
+  <rootfiles>
+    <rootfile media-type="application/oebps-package+xml" full-path="EPUB/content.opf"/>
+  </rootfiles>
+</container>
+"""
+
+COVER_XHTML = """<?xml version="1.0" encoding="utf-8"?>
+<!DOCTYPE html>
+<html xmlns="http://www.w3.org/1999/xhtml" xmlns:epub="http://www.idpf.org/2007/ops" lang="{language}" xml:lang="{language}">
+  <head>
+    <title>Cover</title>
+  </head>
+  <body>
+    <img src={src} alt="Cover"/>
+  </body>
+</html>
+"""
+
+STYLESHEET_LINK = b'<link href="style.css" rel="stylesheet" type="text/css"/>\n'
+
+
+# Local file header of a zip archive member, as specified in the APPNOTE of the zip format
+LOCAL_FILE_HEADER = struct.Struct("<4s5H3L2H")
+LOCAL_FILE_HEADER_SIGNATURE = b"PK\x03\x04"
+
+# ZipFile has no public API to add compressed data. Raw copies are written like ZipFile.writestr writes members,
+# which needs these attributes, otherwise the members are decompressed and compressed again.
+RAW_COPY_ATTRIBUTES = ("fp", "start_dir", "filelist", "NameToInfo", "_didModify", "_writing")
+
+
+def read_raw_member(file, info: zipfile.ZipInfo) -> bytes:
+    """Read the compressed data of an archive member, without decompressing it.
+
+    :param file: binary file object of the archive
+    :param info: info of the member from the central directory of the archive
+    """
+    file.seek(info.header_offset)
+    header = LOCAL_FILE_HEADER.unpack(file.read(LOCAL_FILE_HEADER.size))
+    if header[0] != LOCAL_FILE_HEADER_SIGNATURE:
+        raise zipfile.BadZipFile("Bad local file header of %s" % info.filename)
+
+    # The name and extra field of the local header can differ from the central directory, so their lengths are read
+    file.seek(header[9] + header[10], os.SEEK_CUR)
+    return file.read(info.compress_size)
+
+
+class StreamingEpubWriter:
+    """Writes an EPUB file one file at a time, without keeping the chapters in memory.
+
+    Chapters are read from disk and written into the archive as they are added, only their titles and file names are
+    kept for the package document and the table of contents, which are written when the writer is closed.
+    """
+
+    def __init__(self, path, metadata: dict):
+        self.path = path
+        self.temp_path = path + ".tmp"
+        self.metadata = metadata
+        self.language = metadata.get("language", "en")
+        self.items = []
+        self.chapters = []
+        self.cover = None
+
+        self.zip = zipfile.ZipFile(self.temp_path, "w", compression=zipfile.ZIP_DEFLATED)
+        self.raw_copy = all(hasattr(self.zip, a) for a in RAW_COPY_ATTRIBUTES) and hasattr(zipfile.ZipInfo, "FileHeader")
+        # The mimetype has to be the first file and must not be compressed
+        self.zip.writestr("mimetype", "application/epub+zip", compress_type=zipfile.ZIP_STORED)
+        self.zip.writestr("META-INF/container.xml", CONTAINER_XML)
+
+    def write_item(self, uid, file_name, media_type, content, properties=None):
+        self.zip.writestr("EPUB/" + file_name, content)
+        self.items.append((uid, file_name, media_type, properties))
+
+    def add_stylesheet(self, content: str):
+        self.write_item("style", "style.css", "text/css", content)
+
+    def set_cover(self, cover_file: str):
+        file_name = os.path.basename(cover_file)
+        media_type = mimetypes.guess_type(file_name)[0] or "image/jpeg"
+        self.zip.write(cover_file, "EPUB/" + file_name)
+        self.items.append(("cover-img", file_name, media_type, "cover-image"))
+        self.write_item("cover", "cover.xhtml", "application/xhtml+xml",
+                        COVER_XHTML.format(language=escape(self.language), src=quoteattr(file_name)))
+        self.cover = file_name
+
+    def add_chapter(self, title: str, chapter_file: str):
+        file_name = os.path.basename(chapter_file)
+        uid = "chapter_%s" % len(self.chapters)
+
+        with open(chapter_file, "rb") as file:
+            content = file.read()
+        self.write_item(uid, file_name, "application/xhtml+xml", content.replace(b"</head>", STYLESHEET_LINK + b"</head>", 1))
+        self.chapters.append((uid, file_name, title))
+
+    def copy_chapter(self, source: zipfile.ZipFile, source_file, title: str, file_name: str):
+        """Copy a chapter from an existing EPUB file as it is, without decompressing and compressing it again.
+
+        :param source: the existing EPUB file
+        :param source_file: binary file object the existing EPUB was opened from, to read the compressed data
+        """
+        uid = "chapter_%s" % len(self.chapters)
+        info = source.getinfo("EPUB/" + file_name)
+        target_info = copy.copy(info)
+
+        if self.raw_copy and not self.zip._writing:
+            data = read_raw_member(source_file, info)
+
+            # The sizes and CRC are known, so they are written into the local header instead of a data descriptor
+            target_info.flag_bits &= ~0x08
+            target_info.header_offset = self.zip.fp.tell()
+            self.zip.fp.write(target_info.FileHeader())
+            self.zip.fp.write(data)
+            self.zip.start_dir = self.zip.fp.tell()
+            self.zip.filelist.append(target_info)
+            self.zip.NameToInfo[target_info.filename] = target_info
+            self.zip._didModify = True
+        else:
+            self.zip.writestr(target_info, source.read(info), compress_type=info.compress_type)
+
+        self.items.append((uid, file_name, "application/xhtml+xml", None))
+        self.chapters.append((uid, file_name, title))
+
+    def get_metadata_xml(self):
+        lines = ['<meta property="dcterms:modified">%s</meta>' % datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")]
+
+        for (m, v) in self.metadata.items():
+            m = m.lower()
+            if m == "identifier":
+                lines.append('<dc:identifier id="id">%s</dc:identifier>' % escape(str(v)))
+            elif m == "author" or m == "creator":
+                lines.append("<dc:creator>%s</dc:creator>" % escape(str(v)))
+            elif m in DC_KEYS:
+                lines.append("<dc:%s>%s</dc:%s>" % (m, escape(str(v)), m))
+            else:
+                lines.append("<meta name=%s content=%s/>" % (quoteattr(m), quoteattr(str(v))))
+
+        if self.cover:
+            lines.append('<meta name="cover" content="cover-img"/>')
+
+        return "\n    ".join(lines)
+
+    def get_nav(self):
+        title = escape(str(self.metadata.get("title", "")))
+        entries = "\n".join('        <li><a href=%s>%s</a></li>' % (quoteattr(f), escape(t)) for (_, f, t) in self.chapters)
+        return """<?xml version="1.0" encoding="utf-8"?>
+<!DOCTYPE html>
+<html xmlns="http://www.w3.org/1999/xhtml" xmlns:epub="http://www.idpf.org/2007/ops" lang="%(language)s" xml:lang="%(language)s">
+  <head>
+    <title>%(title)s</title>
+  </head>
+  <body>
+    <nav epub:type="toc" id="id" role="doc-toc">
+      <h2>%(title)s</h2>
+      <ol>
+%(entries)s
+      </ol>
+    </nav>
+  </body>
+</html>
+""" % {"language": escape(self.language), "title": title, "entries": entries}
+
+    def get_ncx(self):
+        entries = "\n".join(
+            '    <navPoint id="%s"><navLabel><text>%s</text></navLabel><content src=%s/></navPoint>' % (uid, escape(t), quoteattr(f))
+            for (uid, f, t) in self.chapters
+        )
+        return """<?xml version="1.0" encoding="utf-8"?>
+<ncx xmlns="http://www.daisy.org/z3986/2005/ncx/" version="2005-1">
+  <head>
+    <meta content=%(uid)s name="dtb:uid"/>
+    <meta content="0" name="dtb:depth"/>
+    <meta content="0" name="dtb:totalPageCount"/>
+    <meta content="0" name="dtb:maxPageNumber"/>
+  </head>
+  <docTitle>
+    <text>%(title)s</text>
+  </docTitle>
+  <navMap>
+%(entries)s
+  </navMap>
+</ncx>
+""" % {"uid": quoteattr(str(self.metadata.get("identifier", ""))), "title": escape(str(self.metadata.get("title", ""))), "entries": entries}
+
+    def get_opf(self):
+        manifest = "\n".join(
+            '    <item href=%s id="%s" media-type="%s"%s/>' % (quoteattr(f), uid, media_type, ' properties="%s"' % p if p else "")
+            for (uid, f, media_type, p) in self.items
+        )
+        spine = "\n".join(
+            (['    <itemref idref="cover" linear="no"/>'] if self.cover else [])
+            + ['    <itemref idref="%s"/>' % uid for (uid, _, _) in self.chapters]
+        )
+        return """<?xml version="1.0" encoding="utf-8"?>
+<package xmlns="http://www.idpf.org/2007/opf" unique-identifier="id" version="3.0">
+  <metadata xmlns:dc="http://purl.org/dc/elements/1.1/" xmlns:opf="http://www.idpf.org/2007/opf">
+    %(metadata)s
+  </metadata>
+  <manifest>
+%(manifest)s
+  </manifest>
+  <spine toc="ncx">
+%(spine)s
+  </spine>
+</package>
+""" % {"metadata": self.get_metadata_xml(), "manifest": manifest, "spine": spine}
+
+    def close(self):
+        """Write the table of contents and the package document and move the finished file into place."""
+        self.write_item("ncx", "toc.ncx", "application/x-dtbncx+xml", self.get_ncx())
+        self.write_item("nav", "nav.xhtml", "application/xhtml+xml", self.get_nav(), "nav")
+        self.zip.writestr("EPUB/content.opf", self.get_opf())
+        self.zip.close()
+        os.replace(self.temp_path, self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.zip.close()
+            os.remove(self.temp_path)
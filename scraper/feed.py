@@ -0,0 +1,86 @@
+import json
+import os
+import xml.etree.ElementTree as ElementTree
+
+from click import echo
+
+from .session import get_session
+
+ATOM_NS = "{http://www.w3.org/2005/Atom}"
+
+
+class FeedCache(dict):
+    """Validators and seen item ids of all monitored feeds, stored as JSON file."""
+
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+        self.load()
+
+    def load(self):
+        if os.path.isfile(self.path):
+            with open(self.path, "r", encoding="utf-8") as file:
+                try:
+                    self.update(json.load(file))
+                except json.JSONDecodeError:
+                    echo("Feed cache could not be loaded, all feed items will be treated as new.")
+
+    def save(self):
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump(self, file, indent=2)
+        os.replace(temp_path, self.path)
+
+
+def parse_feed_items(content: bytes) -> list[str]:
+    """Get the ids of all items in an RSS or Atom feed, using the guid / id or the link of the item."""
+    root = ElementTree.fromstring(content)
+    items = []
+
+    for item in root.iter("item"):
+        if (guid := item.findtext("guid")) or (guid := item.findtext("link")):
+            items.append(guid.strip())
+
+    for entry in root.iter(ATOM_NS + "entry"):
+        if guid := entry.findtext(ATOM_NS + "id"):
+            items.append(guid.strip())
+        elif (link := entry.find(ATOM_NS + "link")) is not None and link.get("href"):
+            items.append(link.get("href"))
+
+    return items
+
+
+def fetch_feed(url: str, cached: dict) -> tuple[dict, list[str] | None]:
+    """Fetch a feed with a conditional request.
+
+    :param url: URL of the RSS or Atom feed
+    :param cached: cache entry of the feed from a previous fetch
+    :return: tuple of the validators of the response and the new item ids, which is None if the feed didn't change
+    """
+    headers = {}
+    if etag := cached.get("etag"):
+        headers["If-None-Match"] = etag
+    if last_modified := cached.get("last_modified"):
+        headers["If-Modified-Since"] = last_modified
+
+    r = get_session().get(url, headers=headers)
+
+    validators = {}
+    if etag := r.headers.get("ETag", cached.get("etag")):
+        validators["etag"] = etag
+    if last_modified := r.headers.get("Last-Modified", cached.get("last_modified")):
+        validators["last_modified"] = last_modified
+
+    if r.status_code == 304:
+        return validators, None
+    if not r.ok:
+        echo("Could not fetch feed %s, status: %s" % (url, r.status_code))
+        return {}, None
+
+    try:
+        items = parse_feed_items(r.content)
+    except ElementTree.ParseError as e:
+        echo("Could not parse feed %s: %s" % (url, e))
+        return {}, None
+
+    return validators, items
@@ -1,11 +1,11 @@
 import re
 
-from requests import get
 from box import Box
 from bs4 import BeautifulSoup
 
 from .generator import ConfigGenerator
 from ..exception import ElementNotFoundException, InvalidPageException
+from ..session import get_session
 
 CHAPTER_PATTERN = re.compile(r"(?:http[s]://)?www\.fictionpress\.com/s/\d+/\d+/.+")
 
@@ -24,7 +24,7 @@ class FictionPressGenerator(ConfigGenerator):
     def get_metadata(self):
         start_url = self.config.startUrl
 
-        r = get(start_url)
+        r = get_session().get(start_url)
         soup = BeautifulSoup(r.content, "html.parser")
 
         if not re.match(CHAPTER_PATTERN, start_url):
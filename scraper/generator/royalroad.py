@@ -1,11 +1,11 @@
 import re
 
-from requests import get
 from box import Box
 from bs4 import BeautifulSoup
 
 from .generator import ConfigGenerator
 from ..exception import ElementNotFoundException, InvalidPageException
+from ..session import get_session
 
 FICTION_PAGE_PATTERN = re.compile(r"(?:http[s]://)?www\.royalroad\.com/fiction/\d+/.+")
 CHAPTER_PATTERN = re.compile(r"(?:http[s]://)?www\.royalroad\.com/fiction/\d+/.+/chapter/\d+/.+")
@@ -25,7 +25,7 @@ class RoyalRoadConfigGenerator(ConfigGenerator):
     def get_metadata(self):
         start_url = self.config.startUrl
 
-        r = get(start_url)
+        r = get_session().get(start_url)
         soup = BeautifulSoup(r.content, "html.parser")
 
         btn = soup.select_one(".fic-buttons a.btn-primary")
@@ -37,15 +37,19 @@ class RoyalRoadConfigGenerator(ConfigGenerator):
         chapter_page_match = re.match(CHAPTER_PATTERN, start_url)
 
         if fiction_page_match and not chapter_page_match:
+            toc_url = start_url
             start_url = "https://www.royalroad.com" + btn.get("href")
         elif chapter_page_match:
-            r = get("https://www.royalroad.com" + btn.get("href"))
+            toc_url = "https://www.royalroad.com" + btn.get("href")
+            r = get_session().get(toc_url)
             soup = BeautifulSoup(r.content, "html.parser")
         else:
             raise InvalidPageException()
 
         self.config.files = Box(coverFile=soup.select_one(".thumbnail").get("src"))
         self.config.startUrl = start_url
+        self.config.tocUrl = toc_url
+        self.config.tocLinkSelector = "#chapters tbody tr.chapter-row td:first-child a"
         metadata = Box(
             title=soup.select_one(".fic-header h1").get_text(),
             author=soup.select_one(".fic-header h4 a").get_text(),
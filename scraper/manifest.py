@@ -5,21 +5,81 @@ from click import echo
 
 
 class Manifest(list):
+    """List of chapter entries, stored as a JSON snapshot and a journal of entries changed since the last snapshot.
+
+    Changing single entries with put() only appends a line to the journal, save() writes a new snapshot atomically
+    and clears the journal.
+    """
+
     def __init__(self, path):
         super().__init__()
         self.path = path
+        self.journal_path = self.get_journal_path(path)
+        # Size of the complete lines of the journal, if it ends with an incomplete line
+        self.journal_end = None
         self.load()
 
+    @staticmethod
+    def get_journal_path(path):
+        return os.path.splitext(path)[0] + ".jsonl"
+
     def load(self):
+        self.clear()
+        self.journal_end = None
+
         if os.path.isfile(self.path):
-            with open(os.path.join(self.path), "r", encoding="utf-8") as file:
+            with open(self.path, "r", encoding="utf-8") as file:
                 try:
-                    items = json.load(file)
-                except JSONDecodeError as error:
+                    self.extend(json.load(file))
+                except JSONDecodeError:
                     echo('Manifest could not be loaded. You might need to use the --clean-download flag.')
-            for i in items:
-                self.append(i)
+
+        if os.path.isfile(self.journal_path):
+            with open(self.journal_path, "rb") as file:
+                offset = 0
+                for line in file:
+                    try:
+                        record = json.loads(line) if line.endswith(b"\n") else None
+                    except (JSONDecodeError, UnicodeDecodeError):
+                        record = None
+                    if record is None:
+                        # The last line is incomplete if the process was killed while writing it. It's removed by
+                        # the next put, so new changes aren't appended to it.
+                        self.journal_end = offset
+                        break
+                    if record["index"] > len(self):
+                        echo('Manifest journal does not match the manifest. You might need to use the --clean-download flag.')
+                        break
+                    self.set_entry(record["index"], record["entry"])
+                    offset += len(line)
+
+    def set_entry(self, index, entry):
+        if index < len(self):
+            self[index] = entry
+        elif index == len(self):
+            self.append(entry)
+        else:
+            raise IndexError("Manifest entry %s is missing" % len(self))
+
+    def put(self, index, entry):
+        """Set or append the entry at index and record the change in the journal."""
+        self.set_entry(index, entry)
+
+        with open(self.journal_path, "a", encoding="utf-8") as file:
+            if self.journal_end is not None:
+                file.truncate(self.journal_end)
+                self.journal_end = None
+            file.write(json.dumps({"index": index, "entry": entry}) + "\n")
 
     def save(self):
-        with open(os.path.join(self.path), "w", encoding="utf-8") as file:
+        """Write all entries into a new snapshot, replacing the old one atomically, and clear the journal."""
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
             json.dump(self, file, indent=2)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, self.path)
+
+        if os.path.isfile(self.journal_path):
+            os.remove(self.journal_path)
+        self.journal_end = None
@@ -0,0 +1,149 @@
+import cProfile
+import json
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from click import echo
+
+from .rate_limit import get_rate_limiter
+
+METRIC_PREFIX = "webfictionscraper"
+
+# Descriptions of the collected metrics, used as help texts of the Prometheus output
+METRIC_DESCRIPTIONS = {
+    "requests": "HTTP requests sent for chapters and tables of contents",
+    "bytes_downloaded": "Bytes of downloaded pages",
+    "retries": "Requests retried after errors or rate limiting responses",
+    "page_cache_hits": "Pages read from the page cache instead of downloading them",
+    "fetch": "Latency of chapter and table of contents requests",
+    "parse": "Time to parse downloaded chapters",
+    "convert": "Time to convert a chapter",
+}
+
+
+class Metrics:
+    """Counters and durations collected by all stages of a run."""
+
+    def __init__(self):
+        self.counters = {}
+        self.durations = {}
+        self.lock = threading.Lock()
+
+    def reset(self):
+        with self.lock:
+            self.counters.clear()
+            self.durations.clear()
+
+    def increment(self, name: str, value: int = 1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name: str, seconds: float):
+        with self.lock:
+            self.durations.setdefault(name, []).append(seconds)
+
+    @contextmanager
+    def timer(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def get_summaries(self) -> dict:
+        """Summarize the durations of each metric by count, sum, mean, maximum and quantiles."""
+        summaries = {}
+        with self.lock:
+            for (name, values) in self.durations.items():
+                values = sorted(values)
+                summaries[name] = {
+                    "count": len(values),
+                    "sum": sum(values),
+                    "mean": sum(values) / len(values),
+                    "max": values[-1],
+                    "p50": values[int(0.5 * (len(values) - 1))],
+                    "p95": values[int(0.95 * (len(values) - 1))],
+                }
+        return summaries
+
+    def get_report(self, stages: dict) -> dict:
+        """Create the run report.
+
+        :param stages: durations of the stages of the run in seconds
+        """
+        with self.lock:
+            counters = dict(self.counters)
+        return {
+            "created": datetime.now(timezone.utc).isoformat(),
+            "stages": stages,
+            "counters": counters,
+            "durations": self.get_summaries(),
+            "rate_limits": get_rate_limiter().get_metrics(),
+        }
+
+
+def format_prometheus(report: dict) -> str:
+    """Format a run report in the Prometheus text exposition format."""
+    lines = []
+
+    def add(name, metric_type, samples, description=None):
+        lines.append("# HELP %s_%s %s" % (METRIC_PREFIX, name, description or name.replace("_", " ").capitalize()))
+        lines.append("# TYPE %s_%s %s" % (METRIC_PREFIX, name, metric_type))
+        for (suffix, labels, value) in samples:
+            label_text = ",".join('%s="%s"' % (k, str(v).replace("\\", "\\\\").replace('"', '\\"')) for (k, v) in labels.items())
+            lines.append("%s_%s%s%s %s" % (METRIC_PREFIX, name, suffix, "{%s}" % label_text if label_text else "", value))
+
+    add("stage_seconds", "gauge", [("", {"stage": s}, t) for (s, t) in report["stages"].items()], "Duration of the stages of the run")
+
+    for (name, value) in report["counters"].items():
+        add(name + "_total", "counter", [("", {}, value)], METRIC_DESCRIPTIONS.get(name))
+
+    for (name, s) in report["durations"].items():
+        add(name + "_seconds", "summary", [
+            ("", {"quantile": "0.5"}, s["p50"]),
+            ("", {"quantile": "0.95"}, s["p95"]),
+            ("_sum", {}, s["sum"]),
+            ("_count", {}, s["count"]),
+        ], METRIC_DESCRIPTIONS.get(name))
+
+    if rate_limits := report["rate_limits"]:
+        add("rate_limit_wait_seconds_total", "counter",
+            [("", {"host": h}, m["wait_time"]) for (h, m) in rate_limits.items()], "Time requests waited for the rate limit")
+
+    return "\n".join(lines) + "\n"
+
+
+def write_report(report: dict, path: str = None, prometheus_path: str = None):
+    if path:
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+        echo("Wrote run report to %s" % path)
+
+    if prometheus_path:
+        with open(prometheus_path, "w", encoding="utf-8") as file:
+            file.write(format_prometheus(report))
+        echo("Wrote metrics to %s" % prometheus_path)
+
+
+def run_profiled(func, *args, limit: int = 30, **kwargs):
+    """Run a function with cProfile and print the functions with the highest cumulative time.
+
+    Only the calling thread is profiled, work done in other threads and worker processes shows up as waiting time.
+    """
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(func, *args, **kwargs)
+    finally:
+        echo(30 * "-" + "\nProfile:")
+        pstats.Stats(profiler).sort_stats(pstats.SortKey.CUMULATIVE).print_stats(limit)
+
+
+_metrics = Metrics()
+
+
+def get_metrics() -> Metrics:
+    """Get the metrics shared by all stages of the process."""
+    return _metrics
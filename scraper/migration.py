@@ -0,0 +1,44 @@
+import os
+import re
+
+from click import echo
+
+from .cache_files import COMPRESSION_EXTENSIONS
+from .const import CHAPTER_FILE_NAME
+from .manifest import Manifest
+
+CHAPTER_FILE_PATTERN = re.compile(r"chapter(\d+)\.html")
+
+
+def migrate_chapter_files(files):
+    """Rename the chapter files of a working folder, which were named with an older scheme, and update the manifest.
+
+    Chapters used to be padded to three digits only, so chapters from 1000 on weren't listed in reading order.
+    Interrupted migrations are continued on the next run, because the manifest is only updated at the end.
+    """
+    manifest = Manifest(files.manifest_file)
+    renames = {}
+
+    for c in manifest:
+        if (m := CHAPTER_FILE_PATTERN.fullmatch(c.get("file", ""))) and (name := CHAPTER_FILE_NAME % int(m.group(1))) != c["file"]:
+            renames[c["file"]] = name
+
+    if len(renames) == 0:
+        return
+
+    echo("Renaming %s chapter files..." % len(renames))
+
+    for (old, new) in renames.items():
+        paths = [(files.book_folder, "")] + [(files.cache_folder, ext) for ext in COMPRESSION_EXTENSIONS.values()]
+        for (folder, ext) in paths:
+            if os.path.isfile(path := os.path.join(folder, old + ext)):
+                os.replace(path, os.path.join(folder, new + ext))
+
+    for i in range(len(manifest)):
+        if manifest[i].get("file") in renames:
+            manifest[i]["file"] = renames[manifest[i]["file"]]
+    manifest.save()
+
+    # The chapters in existing EPUB files have the old names, so they can't be reused when binding the EPUB again
+    if os.path.isfile(files.bind_state_file):
+        os.remove(files.bind_state_file)
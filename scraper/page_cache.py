@@ -0,0 +1,158 @@
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+import urllib.parse
+
+from click import echo
+
+from .utils import CACHE_DIR
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+_page_cache = None
+
+
+def configure_page_cache(folder: str = CACHE_DIR, max_size: int | float = 1024):
+    """Enable the page cache for all crawlers created afterwards.
+
+    :param folder: folder of the cached pages
+    :param max_size: maximum size of the cached pages in MB, the least recently used pages are removed first
+    """
+    global _page_cache
+    _page_cache = PageCache(folder, int(max_size * 1024 * 1024))
+
+
+def get_page_cache():
+    """Get the page cache, which is None if it's not enabled in the client config."""
+    return _page_cache
+
+
+def normalize_url(url: str) -> str:
+    """Normalize a URL, so different spellings of the same URL have the same cache key."""
+    parts = urllib.parse.urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        host = "%s:%s" % (host, parts.port)
+    return urllib.parse.urlunsplit((scheme, host, parts.path or "/", parts.query, ""))
+
+
+class PageCache:
+    """Cache of downloaded pages, shared by all fiction configs.
+
+    Pages are stored gzip compressed under the hash of their content, so pages with the same content are only stored
+    once. The index maps normalized URLs to the content hash, the final URL after redirects and the cache validators of
+    the response.
+    """
+
+    def __init__(self, folder: str, max_size: int):
+        self.folder = folder
+        self.max_size = max_size
+        self.index_path = os.path.join(folder, "index.json")
+        self.index = {}
+        # Hashes of pages which were replaced by a newer version, their files are removed if no URL refers to them
+        self.replaced = set()
+        self.lock = threading.Lock()
+
+        os.makedirs(folder, exist_ok=True)
+
+        if os.path.isfile(self.index_path):
+            with open(self.index_path, "r", encoding="utf-8") as file:
+                try:
+                    self.index = json.load(file)
+                except json.JSONDecodeError:
+                    echo("Page cache index could not be loaded, all pages will be downloaded again.")
+
+    def get_object_path(self, content_hash: str) -> str:
+        return os.path.join(self.folder, content_hash[:2], content_hash + ".gz")
+
+    def get(self, url: str) -> tuple[str, bytes, dict] | None:
+        """Get a cached page.
+
+        :return: tuple of the final URL, the content and the validators of the page, or None if it isn't cached
+        """
+        key = normalize_url(url)
+        with self.lock:
+            entry = self.index.get(key)
+            if not entry:
+                return None
+            entry["accessed"] = time.time()
+
+        try:
+            with gzip.open(self.get_object_path(entry["hash"]), "rb") as file:
+                content = file.read()
+        except (OSError, EOFError):
+            with self.lock:
+                self.index.pop(key, None)
+            return None
+
+        return entry["url"], content, dict(entry.get("validators", {}))
+
+    def put(self, url: str, final_url: str, content: bytes, validators: dict = None):
+        content_hash = hashlib.sha256(content).hexdigest()
+        path = self.get_object_path(content_hash)
+
+        if not os.path.isfile(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temp_path = "%s.%s.tmp" % (path, threading.get_ident())
+            with gzip.open(temp_path, "wb") as file:
+                file.write(content)
+            os.replace(temp_path, path)
+
+        entry = {
+            "url": final_url,
+            "hash": content_hash,
+            "size": os.path.getsize(path),
+            "accessed": time.time(),
+            "validators": dict(validators or {}),
+        }
+
+        with self.lock:
+            for key in (normalize_url(url), normalize_url(final_url)):
+                if (old := self.index.get(key)) and old["hash"] != content_hash:
+                    self.replaced.add(old["hash"])
+                self.index[key] = dict(entry)
+
+    def evict(self):
+        """Remove the least recently used pages until the cache is smaller than its maximum size."""
+        with self.lock:
+            objects = {}
+            for (key, entry) in self.index.items():
+                objects.setdefault(entry["hash"], []).append(key)
+
+            for content_hash in self.replaced - objects.keys():
+                self.remove_object(content_hash)
+            self.replaced.clear()
+
+            size = sum(self.index[keys[0]]["size"] for keys in objects.values())
+            if size <= self.max_size:
+                return
+
+            # The last access of an object is the latest access of any of its URLs
+            by_access = sorted(objects.items(), key=lambda o: max(self.index[k]["accessed"] for k in o[1]))
+            for (content_hash, keys) in by_access:
+                if size <= self.max_size:
+                    break
+                size -= self.index[keys[0]]["size"]
+                for key in keys:
+                    del self.index[key]
+                self.remove_object(content_hash)
+
+    def remove_object(self, content_hash: str):
+        try:
+            os.remove(self.get_object_path(content_hash))
+        except FileNotFoundError:
+            pass
+
+    def save(self):
+        """Remove pages exceeding the maximum size and write the index."""
+        self.evict()
+
+        with self.lock:
+            temp_path = self.index_path + ".tmp"
+            with open(temp_path, "w", encoding="utf-8") as file:
+                json.dump(self.index, file)
+            os.replace(temp_path, self.index_path)
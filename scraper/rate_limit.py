@@ -0,0 +1,104 @@
+import asyncio
+import threading
+import time
+import urllib.parse
+
+
+class TokenBucket:
+    """Allows a number of requests per second on average, with bursts of up to burst requests."""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Take a token, going into debt if there are none left, so waiting requests are served in order.
+
+        :return: seconds to wait before the request may be sent
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            return 0 if self.tokens >= 0 else -self.tokens / self.rate
+
+
+class RateLimiter:
+    """Token buckets by host, shared by all requests of the process.
+
+    Hosts without a configured rate use the default rate, or aren't limited if there is none. There is no default rate
+    until one is configured, so requests are only limited by the rate_limit of the client and fiction configs. The
+    number of requests and the time they waited are recorded by host.
+    """
+
+    def __init__(self):
+        self.default_rate = None
+        self.burst = 1
+        self.host_rates = {}
+        self.buckets = {}
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def configure(self, requests_per_second: float = None, burst: int = 1, hosts: dict = None):
+        """Set the rates of the limiter and reset its buckets.
+
+        :param requests_per_second: default rate of all hosts
+        :param burst: number of requests which may be sent at once, before the rate applies
+        :param hosts: rates of single hosts, which override the default rate
+        """
+        with self.lock:
+            self.default_rate = requests_per_second
+            self.burst = burst
+            self.host_rates = dict(hosts or {})
+            self.buckets.clear()
+
+    def limit_host(self, url: str, requests_per_second: float):
+        """Limit the rate of the host of a URL, unless it already has a lower limit."""
+        host = urllib.parse.urlparse(url).netloc
+        with self.lock:
+            rate = self.host_rates.get(host, self.default_rate)
+            if rate is None or requests_per_second < rate:
+                self.host_rates[host] = requests_per_second
+                self.buckets.pop(host, None)
+
+    def reserve(self, url: str) -> float:
+        host = urllib.parse.urlparse(url).netloc
+        with self.lock:
+            if host not in self.buckets:
+                rate = self.host_rates.get(host, self.default_rate)
+                self.buckets[host] = TokenBucket(rate, self.burst) if rate else None
+            bucket = self.buckets[host]
+
+        delay = bucket.reserve() if bucket else 0
+
+        with self.lock:
+            metrics = self.metrics.setdefault(host, {"requests": 0, "wait_time": 0.0, "max_wait_time": 0.0})
+            metrics["requests"] += 1
+            metrics["wait_time"] += delay
+            metrics["max_wait_time"] = max(metrics["max_wait_time"], delay)
+
+        return delay
+
+    def wait(self, url: str):
+        if (delay := self.reserve(url)) > 0:
+            time.sleep(delay)
+
+    async def wait_async(self, url: str):
+        if (delay := self.reserve(url)) > 0:
+            await asyncio.sleep(delay)
+
+    def get_metrics(self) -> dict:
+        with self.lock:
+            return {host: dict(m) for (host, m) in self.metrics.items()}
+
+
+_rate_limiter = RateLimiter()
+
+
+def get_rate_limiter() -> RateLimiter:
+    """Get the rate limiter shared by all sessions and crawlers of the process."""
+    return _rate_limiter
@@ -0,0 +1,128 @@
+import threading
+import urllib.parse
+
+from requests import Session
+from requests.adapters import HTTPAdapter
+from urllib3.util import make_headers
+from urllib3.util.retry import Retry
+
+from .rate_limit import get_rate_limiter
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/123.0.0.0 Safari/537.36"
+
+# Responses with these status codes are retried with exponential backoff, honouring the Retry-After header
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+_options = {}
+_session = None
+_session_lock = threading.Lock()
+
+
+class RateLimitedRetry(Retry):
+    """Retry which waits for the rate limit of the host before every retry, like before the first attempt.
+
+    urllib3 retries inside the adapter, so without this the retries and their backoff would bypass the rate limiter.
+    """
+
+    rate_limit_url = None
+
+    def increment(self, method=None, url=None, response=None, error=None, _pool=None, _stacktrace=None):
+        retry = super().increment(method, url, response, error, _pool, _stacktrace)
+        # The URL is only a path, unless the request goes through a proxy
+        if url and urllib.parse.urlparse(url).netloc:
+            retry.rate_limit_url = url
+        elif _pool is not None:
+            host = "[%s]" % _pool.host if ":" in _pool.host else _pool.host
+            default_port = {"http": 80, "https": 443}.get(_pool.scheme)
+            port = "" if _pool.port in (None, default_port) else ":%s" % _pool.port
+            retry.rate_limit_url = "%s://%s%s/" % (_pool.scheme, host, port)
+        return retry
+
+    def sleep(self, response=None):
+        super().sleep(response)
+        if self.rate_limit_url:
+            get_rate_limiter().wait(self.rate_limit_url)
+
+
+class TimeoutHTTPAdapter(HTTPAdapter):
+    """HTTP adapter that applies a default timeout to all requests which don't specify one, and waits for the rate
+    limit of the host before sending a request. Retries wait for the rate limit in RateLimitedRetry."""
+
+    def __init__(self, timeout=None, **kwargs):
+        self.timeout = timeout
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = self.timeout
+        get_rate_limiter().wait(request.url)
+        return super().send(request, **kwargs)
+
+
+def configure_session(retries=5, backoff_factor=1.0, pool_size=10, timeout=30, user_agent=USER_AGENT):
+    """Set the options for all sessions created afterwards and reset the shared session.
+
+    :param retries: how often failed requests are retried
+    :param backoff_factor: factor of the exponential backoff between retries, in seconds
+    :param pool_size: number of connections kept alive per host
+    :param timeout: default connect and read timeout, in seconds
+    :param user_agent: user agent sent with every request
+    """
+    global _session
+    _options.update(
+        retries=retries,
+        backoff_factor=backoff_factor,
+        pool_size=pool_size,
+        timeout=timeout,
+        user_agent=user_agent,
+    )
+    _session = None
+
+
+def get_session_options() -> dict:
+    """Get the options set with configure_session, with the defaults for unset ones."""
+    options = dict(retries=5, backoff_factor=1.0, pool_size=10, timeout=30, user_agent=USER_AGENT)
+    options.update(_options)
+    return options
+
+
+def create_session() -> Session:
+    """Create a new session with connection pooling, compression and retries.
+
+    Use this instead of get_session if the session holds state like cookies, which shouldn't be shared.
+    """
+    options = get_session_options()
+
+    retry = RateLimitedRetry(
+        total=options["retries"],
+        backoff_factor=options["backoff_factor"],
+        status_forcelist=RETRY_STATUS_CODES,
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = TimeoutHTTPAdapter(
+        timeout=options["timeout"],
+        max_retries=retry,
+        pool_connections=options["pool_size"],
+        pool_maxsize=options["pool_size"],
+    )
+
+    session = Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update({
+        "user-agent": options["user_agent"],
+        # Includes brotli, if the brotli package of the compression extra is installed
+        "accept-encoding": make_headers(accept_encoding=True)["accept-encoding"],
+    })
+
+    return session
+
+
+def get_session() -> Session:
+    """Get the session shared by all crawlers, generators and downloads of the process."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = create_session()
+        return _session
@@ -0,0 +1,101 @@
+import re
+
+import soupsieve
+from bs4 import Tag
+from click import echo
+
+
+def overlaps(a: str, b: str) -> bool:
+    """Check if two strings can overlap in a text, i.e. one contains the other or one ends with the start of the other."""
+    if a in b or b in a:
+        return True
+    return any(a.endswith(b[:k]) or b.endswith(a[:k]) for k in range(1, min(len(a), len(b))))
+
+
+class TextReplacement:
+    """Replaces multiple strings in a single pass over the document."""
+
+    def __init__(self, substitutions):
+        self.replacements = {s.selector: s.replace_with for s in substitutions}
+        self.pattern = re.compile("|".join(re.escape(s) for s in self.replacements))
+
+    def accepts(self, s) -> bool:
+        """Check if applying the substitution in the same pass gives the same result as applying it afterwards.
+
+        That's the case if its string can't overlap with the strings of the earlier substitutions or their
+        replacements, and it's not created by joining the text around a string replaced with nothing.
+        """
+        for (selector, replace_with) in self.replacements.items():
+            if overlaps(selector, s.selector) or overlaps(replace_with, s.selector):
+                return False
+            if not replace_with and len(s.selector) > 1:
+                return False
+        return True
+
+    def add(self, s):
+        self.replacements[s.selector] = s.replace_with
+        self.pattern = re.compile("|".join(re.escape(s) for s in self.replacements))
+
+    def apply(self, doc: str) -> str:
+        if len(self.replacements) == 1:
+            return doc.replace(*next(iter(self.replacements.items())))
+        return self.pattern.sub(lambda m: self.replacements[m.group(0)], doc)
+
+
+class RegexReplacement:
+    def __init__(self, s):
+        self.pattern = re.compile(s.selector)
+        self.replace_with = s.replace_with
+
+    def apply(self, doc: str) -> str:
+        return self.pattern.sub(self.replace_with, doc)
+
+
+class SubstitutionPlan:
+    """Substitutions of a config, compiled once and then applied to all chapters.
+
+    CSS selectors are compiled and indexed by chapter URL, regular expressions are compiled and consecutive text
+    substitutions are merged into one pass where that doesn't change the result.
+    """
+
+    def __init__(self, substitutions):
+        self.css = []
+        self.chapter_css = {}
+        self.steps = []
+
+        for (position, s) in enumerate(substitutions):
+            if s.selector_type == "css":
+                rule = (position, soupsieve.compile(s.selector), s)
+                if s.chapter_url:
+                    self.chapter_css.setdefault(s.chapter_url, []).append(rule)
+                else:
+                    self.css.append(rule)
+            elif s.selector_type == "text":
+                if self.steps and isinstance(self.steps[-1], TextReplacement) and self.steps[-1].accepts(s):
+                    self.steps[-1].add(s)
+                else:
+                    self.steps.append(TextReplacement([s]))
+            elif s.selector_type == "regex":
+                self.steps.append(RegexReplacement(s))
+
+    def apply_css(self, content_el: Tag, title: str, url: str):
+        rules = self.css
+        if url in self.chapter_css:
+            rules = sorted(rules + self.chapter_css[url], key=lambda r: r[0])
+
+        for (_, selector, s) in rules:
+            els = selector.select(content_el)
+
+            if len(els) == 0 and s.warn:
+                echo("Chapter '%s': No matches for selector '%s'. Please check if the config is up-to-date." % (title, s.selector))
+
+            for el in els:
+                if s.replace_with:
+                    el.replace_with(s.replace_with)
+                else:
+                    el.decompose()
+
+    def apply_text(self, doc: str) -> str:
+        for step in self.steps:
+            doc = step.apply(doc)
+        return doc
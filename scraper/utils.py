@@ -1,10 +1,27 @@
 import os
 
+from click import echo
 from platformdirs import user_data_dir
 
 BASE_DIR = user_data_dir("WebFictionScraper", "Curetix")
 DATA_DIR = os.path.join(BASE_DIR, "data")
 CONFIGS_DIR = os.path.join(BASE_DIR, "configs")
+CACHE_DIR = os.path.join(BASE_DIR, "page_cache")
+
+
+def print_paths():
+    echo("Base: %s" % BASE_DIR)
+    echo("Client config: %s" % os.path.join(BASE_DIR, "client.yaml"))
+    echo("Fiction configs: %s" % CONFIGS_DIR)
+    echo("Data (downloads, books): %s" % DATA_DIR)
+    echo("Page cache: %s" % CACHE_DIR)
+
+
+def list_config_names() -> list[str] | None:
+    """List the names of the configs in the users configs folder, or None if it doesn't exist."""
+    if os.path.isdir(CONFIGS_DIR):
+        return [f.replace(".yaml", "") for f in os.listdir(CONFIGS_DIR) if f.endswith(".yaml")]
+    return None
 
 
 def normalize_string(s):
@@ -17,3 +34,31 @@ def normalize_string(s):
 
 def lowercase_clean(s):
     return "".join([c for c in s if c.isalpha() or c.isdigit()]).strip().lower()
+
+
+class PrefixIndex:
+    """Trie of string prefixes, to find the values of all prefixes of a string in a single pass over it."""
+
+    def __init__(self):
+        self.root = {}
+        self.size = 0
+
+    def add(self, prefix, value):
+        node = self.root
+        for c in prefix:
+            node = node.setdefault(c, {})
+        # Values are stored under the None key of the node, with their position to keep the insertion order
+        node.setdefault(None, []).append((self.size, value))
+        self.size += 1
+
+    def find(self, s) -> list:
+        """Get the values of all prefixes of s, in the order they were added."""
+        node = self.root
+        matches = list(node.get(None, []))
+
+        for c in s:
+            if (node := node.get(c)) is None:
+                break
+            matches.extend(node.get(None, []))
+
+        return [value for (_, value) in sorted(matches, key=lambda m: m[0])]
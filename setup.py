@@ -14,11 +14,18 @@ setup(
         "click",
         "platformdirs",
         "ebooklib",
+        "lxml",
         "python-box[all]",
         "questionary",
         "requests",
-        "schema"
+        "ruamel.yaml",
+        "schema",
+        "soupsieve"
     ],
+    extras_require={
+        "async": ["httpx"],
+        "compression": ["zstandard", "brotli"],
+    },
     entry_points="""
         [console_scripts]
         webfictionscraper=webfictionscraper:cli
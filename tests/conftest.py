@@ -0,0 +1,51 @@
+import os
+
+import pytest
+
+from benchmarks.suite import create_config
+from scraper.config import FictionConfig, validate_fiction_config
+
+
+@pytest.fixture
+def make_config(tmp_path):
+    """Create a validated fiction config with its working folder in the temporary folder of the test."""
+
+    def make_config(name="fiction", **options) -> FictionConfig:
+        working_folder = str(tmp_path / name)
+        for folder in ("cache", "book"):
+            os.makedirs(os.path.join(working_folder, folder), exist_ok=True)
+
+        config = validate_fiction_config({
+            "start_url": "http://localhost/chapter/0",
+            "metadata": {"title": "Test Fiction", "author": "Test Author", "identifier": "test-fiction"},
+            "selectors": {"title_element": "h1", "content_element": ".content", "next_chapter_element": "a.next"},
+            **options,
+        })
+        config["files"].update({
+            "working_folder": working_folder,
+            "cache_folder": os.path.join(working_folder, "cache"),
+            "book_folder": os.path.join(working_folder, "book"),
+            "epub_file": os.path.join(working_folder, "Test Fiction.epub"),
+            "cover_file": os.path.join(working_folder, "cover.jpg"),
+            "manifest_file": os.path.join(working_folder, "manifest.json"),
+            "bind_state_file": os.path.join(working_folder, "bind.json"),
+            "format_state_file": os.path.join(working_folder, "formats.json"),
+        })
+        return FictionConfig.from_dict(config)
+
+    return make_config
+
+
+@pytest.fixture
+def fixture_config(tmp_path):
+    """Create a config for a fiction of a fixture site, with its working folder in the temporary folder of the test."""
+
+    def fixture_config(site, server, crawler_module="Crawler", name="fiction", **options):
+        for folder in ("cache", "book"):
+            os.makedirs(tmp_path / name / folder, exist_ok=True)
+        config = create_config(site, server.base_url, str(tmp_path / name), crawler_module)
+        for (key, value) in options.items():
+            setattr(config, key, value)
+        return config
+
+    return fixture_config
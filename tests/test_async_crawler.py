@@ -0,0 +1,122 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from scraper.manifest import Manifest
+
+pytest.importorskip("httpx")
+
+from scraper.crawler import AsyncCrawler  # noqa: E402
+
+CHAPTERS = 12
+# Chapters which answer with 503 to their first request
+UNAVAILABLE = {2, 7}
+
+
+class FictionServer(ThreadingHTTPServer):
+    """Table of contents and chapters of a fiction, which records the requests and how many were handled at once."""
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), FictionRequestHandler)
+        self.lock = threading.Lock()
+        self.active = 0
+        self.max_active = 0
+        self.requests = []
+
+    @property
+    def base_url(self):
+        return "http://127.0.0.1:%s" % self.server_address[1]
+
+
+class FictionRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests.append(self.path)
+            server.active += 1
+            server.max_active = max(server.max_active, server.active)
+            first_request = server.requests.count(self.path) == 1
+
+        try:
+            if self.path == "/toc":
+                links = "".join('<a class="chapter" href="/chapter/%s">%s</a>' % (i, i) for i in range(CHAPTERS))
+                self.respond(200, "<html><body>%s</body></html>" % links)
+                return
+
+            index = int(self.path.rsplit("/", 1)[1])
+            # Earlier chapters take longer, so they finish after later ones
+            time.sleep(0.08 if index % 3 == 0 else 0.02)
+
+            if index in UNAVAILABLE and first_request:
+                self.respond(503, "Unavailable", {"Retry-After": "0"})
+                return
+
+            self.respond(200, '<html><body><h1>Chapter %s</h1><div class="content"><p>Text of chapter %s</p></div>'
+                              '<a class="next" href="/chapter/%s">Next</a></body></html>' % (index, index, index + 1))
+        finally:
+            with server.lock:
+                server.active -= 1
+
+    def respond(self, status, body, headers=None):
+        content = body.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(content)))
+        for (name, value) in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = FictionServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def create_crawler(make_config, server, name="fiction"):
+    return AsyncCrawler(make_config(
+        name=name,
+        start_url=server.base_url + "/chapter/0",
+        toc_url=server.base_url + "/toc",
+        toc_link_selector="a.chapter",
+        crawler_module="AsyncCrawler",
+        download_workers=3,
+    ))
+
+
+def test_toc_download_keeps_order_limits_concurrency_and_retries(make_config, server):
+    crawler = create_crawler(make_config, server)
+    crawler.start_download()
+
+    manifest = Manifest(crawler.files.manifest_file)
+    assert [c["title"] for c in manifest] == ["Chapter %s" % i for i in range(CHAPTERS)]
+    assert [c["url"] for c in manifest] == [server.base_url + "/chapter/%s" % i for i in range(CHAPTERS)]
+
+    assert 1 < server.max_active <= 3
+    for i in range(CHAPTERS):
+        assert server.requests.count("/chapter/%s" % i) == (2 if i in UNAVAILABLE else 1)
+
+
+def test_crawlers_in_different_threads_share_the_host_limit(make_config, server):
+    crawlers = [create_crawler(make_config, server, "fiction%s" % i) for i in range(3)]
+    threads = [threading.Thread(target=c.start_download) for c in crawlers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for crawler in crawlers:
+        assert len(Manifest(crawler.files.manifest_file)) == CHAPTERS
+    assert server.max_active <= 3
@@ -0,0 +1,69 @@
+import os
+import zipfile
+
+import pytest
+
+from scraper import epub_writer
+from scraper.binder import Binder
+from scraper.const import CHAPTER_DOC, CHAPTER_FILE_NAME
+from scraper.manifest import Manifest
+
+
+def write_chapters(config, count, changed=()):
+    manifest = Manifest(config.files.manifest_file)
+    for i in range(count):
+        file_name = CHAPTER_FILE_NAME % i
+        body = "<body><h1>Chapter %s</h1><p>%s</p></body>" % (i, "Changed" if i in changed else "Text " * 200)
+        with open(os.path.join(config.files.book_folder, file_name), "w", encoding="utf-8") as file:
+            file.write(CHAPTER_DOC.format(title="Chapter %s" % i, body=body))
+        manifest.put(i, {"title": "Chapter %s" % i, "file": file_name, "converted": True, "url": "http://localhost/chapter/%s" % i})
+    manifest.save()
+
+
+def read_chapters(epub_file):
+    with zipfile.ZipFile(epub_file) as book:
+        assert book.testzip() is None
+        return {n: book.read(n) for n in book.namelist() if n.startswith("EPUB/chapter")}
+
+
+@pytest.mark.parametrize("raw_copy", [True, False])
+def test_streaming_bind_reuses_unchanged_chapters(make_config, monkeypatch, capsys, raw_copy):
+    if not raw_copy:
+        # A ZipFile without the attributes needed for raw copies falls back to compressing the chapters again
+        monkeypatch.setattr(epub_writer, "RAW_COPY_ATTRIBUTES", epub_writer.RAW_COPY_ATTRIBUTES + ("missing",))
+
+    config = make_config(streaming_bind=True)
+    write_chapters(config, 5)
+    Binder(config).bind_book()
+    first = read_chapters(config.files.epub_file)
+
+    write_chapters(config, 7, changed={2})
+    capsys.readouterr()
+    Binder(config).bind_book()
+
+    assert "Reused 4 of 7 chapters" in capsys.readouterr().out
+    second = read_chapters(config.files.epub_file)
+    assert len(second) == 7
+    assert b"Changed" in second["EPUB/" + CHAPTER_FILE_NAME % 2]
+    for i in (0, 1, 3, 4):
+        assert second["EPUB/" + CHAPTER_FILE_NAME % i] == first["EPUB/" + CHAPTER_FILE_NAME % i]
+    assert not os.path.exists(config.files.epub_file + ".tmp")
+
+
+@pytest.mark.parametrize("streaming_bind", [True, False])
+def test_volume_files_of_earlier_binds_are_removed(make_config, streaming_bind):
+    config = make_config(streaming_bind=streaming_bind, volumes={"max_chapters": 2})
+    write_chapters(config, 5)
+    Binder(config).bind_book()
+    assert [os.path.exists(Binder(config).get_volume_file(i)) for i in (1, 2, 3)] == [True, True, True]
+
+    config = make_config(streaming_bind=streaming_bind, volumes={"max_chapters": 3})
+    Binder(config).bind_book()
+    assert [os.path.exists(Binder(config).get_volume_file(i)) for i in (1, 2, 3)] == [True, True, False]
+    for i in (1, 2):
+        read_chapters(Binder(config).get_volume_file(i))
+
+    config = make_config(streaming_bind=streaming_bind)
+    Binder(config).bind_book()
+    assert os.listdir(os.path.dirname(config.files.epub_file)).count(os.path.basename(config.files.epub_file)) == 1
+    assert not any(" - Volume " in f for f in os.listdir(os.path.dirname(config.files.epub_file)))
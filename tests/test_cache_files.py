@@ -0,0 +1,94 @@
+import os
+
+import pytest
+from box import Box
+
+from benchmarks.fixtures import FixtureServer
+from scraper import cache_files
+from scraper.cache_files import check_compression, open_cache_file, write_cache_file
+from scraper.client import FictionScraperClient
+from scraper.converter import Converter
+from scraper.crawler import Crawler
+from scraper.manifest import Manifest
+
+CACHE_OPTIONS = [
+    {"cache_compression": "gzip"},
+    {"cache_compression": "zstd"},
+    {"cache_content_only": True},
+    {"cache_compression": "zstd", "cache_content_only": True},
+]
+
+
+def download_and_convert(fixture_config, site, server, name, **options):
+    """Download all chapters of a fixture fiction with the cache options, and return the converted chapter files."""
+    config = fixture_config(site, server, name=name, **options)
+    Crawler(config).start_download()
+
+    converter = Converter(config)
+    books = []
+    for (i, chapter) in enumerate(Manifest(config.files.manifest_file)):
+        converter.convert_file(i, chapter)
+        with open(os.path.join(config.files.book_folder, chapter["file"]), encoding="utf8") as file:
+            books.append(file.read())
+    return config, books
+
+
+@pytest.mark.parametrize("site", ["royalroad", "fictionpress", "wanderinginn"])
+def test_cache_options_convert_like_plain_files(fixture_config, site):
+    pytest.importorskip("zstandard")
+
+    with FixtureServer(4) as server:
+        _, expected = download_and_convert(fixture_config, site, server, "plain")
+        assert len(expected) == 4
+
+        for (i, options) in enumerate(CACHE_OPTIONS):
+            config, books = download_and_convert(fixture_config, site, server, "cached%d" % i, **options)
+            assert books == expected, options
+
+            extension = cache_files.COMPRESSION_EXTENSIONS[options.get("cache_compression", "none")]
+            files = sorted(os.listdir(config.files.cache_folder))
+            assert files and all(f.endswith(extension) for f in files)
+
+
+def test_missing_zstandard_is_reported_before_crawling(monkeypatch, make_config, tmp_path, capsys):
+    monkeypatch.setattr(cache_files, "zstandard", None)
+    error = "cache_compression 'zstd' requires the zstandard package of the compression extra"
+
+    assert check_compression("zstd") == error
+    assert check_compression("gzip") is None
+
+    # Fiction configs with zstd compression fail to load, instead of failing when the first chapter is saved
+    config_file = tmp_path / "fiction.yaml"
+    config_file.write_text(
+        "start_url: http://localhost/chapter/0\n"
+        "metadata: {title: Test Fiction, author: Test Author}\n"
+        "selectors: {title_element: h1, content_element: .content, next_chapter_element: a.next}\n"
+        "cache_compression: zstd\n"
+    )
+    client = FictionScraperClient.__new__(FictionScraperClient)
+    client.client_config = Box(config_overrides=Box())
+    assert client.load_fiction_config(str(config_file)) is None
+    assert error in capsys.readouterr().out
+
+    # Saving and reading compressed chapters fails with the same clear error
+    config = make_config(cache_compression="zstd")
+    with pytest.raises(RuntimeError, match="requires the zstandard package"):
+        Crawler(config).save_chapter(b"<html></html>")
+
+    path = os.path.join(config.files.cache_folder, "chapter00000.html")
+    with open(path + ".zst", "wb") as file:
+        file.write(b"")
+    with pytest.raises(RuntimeError, match="requires the zstandard package"):
+        open_cache_file(path)
+
+
+def test_write_cache_file_replaces_other_compressions(tmp_path):
+    pytest.importorskip("zstandard")
+    path = str(tmp_path / "chapter00000.html")
+
+    for compression in ("none", "gzip", "zstd", "none"):
+        write_cache_file(path, b"<p>%s</p>" % compression.encode(), compression)
+
+        assert os.listdir(tmp_path) == [os.path.basename(path) + cache_files.COMPRESSION_EXTENSIONS[compression]]
+        with open_cache_file(path) as file:
+            assert file.read() == b"<p>%s</p>" % compression.encode()
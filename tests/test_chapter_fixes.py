@@ -0,0 +1,90 @@
+import pytest
+
+from scraper import chapter_fixes
+from scraper.chapter_fixes import (
+    CHAPTER_FIXES, fix_div_paragraphs, get_chapter_fixes, register_chapter_fixes, remove_piracy_paragraphs,
+)
+from scraper.utils import PrefixIndex
+
+METAWORLD_CHAPTER = "https://www.royalroad.com/fiction/14167/metaworld-chronicles/chapter/494392/chapter-346-bride-and-groom"
+
+
+@pytest.fixture(autouse=True)
+def registry(monkeypatch):
+    """Start every test with no registered chapter fixes."""
+    monkeypatch.setattr(chapter_fixes, "_fixes", {})
+    monkeypatch.setattr(chapter_fixes, "_fix_indexes", {})
+    monkeypatch.setattr(chapter_fixes, "_loaded_hosts", set())
+
+
+def test_prefix_index_finds_all_prefixes_in_insertion_order():
+    index = PrefixIndex()
+    index.add("https://example.com/fiction/1/", "fiction")
+    index.add("https://example.com/", "site")
+    index.add("https://example.com/fiction/1/chapter/2", "chapter")
+    index.add("https://example.com/fiction/2/", "other fiction")
+    index.add("https://example.com/", "second site")
+
+    assert index.find("https://example.com/fiction/1/chapter/2") == ["fiction", "site", "chapter", "second site"]
+    assert index.find("https://example.com/fiction/1/chapter/1") == ["fiction", "site", "second site"]
+    assert index.find("https://example.com/fiction/2/chapter/1") == ["site", "other fiction", "second site"]
+
+
+@pytest.mark.parametrize("url", [
+    "https://example.org/fiction/1/chapter/2",
+    "http://example.com/fiction/1/chapter/2",
+    # Shorter than all prefixes
+    "https://example.com",
+    "https://",
+    "",
+])
+def test_prefix_index_doesnt_find_other_strings(url):
+    index = PrefixIndex()
+    index.add("https://example.com/", "site")
+    index.add("https://example.com/fiction/1/", "fiction")
+
+    assert index.find(url) == []
+
+
+def test_get_chapter_fixes_in_registration_order():
+    def first(*args):
+        pass
+
+    def second(*args):
+        pass
+
+    register_chapter_fixes({
+        "https://example.com/fiction/1/chapter/2": first,
+        "https://example.com/": second,
+    })
+    register_chapter_fixes({"https://example.com/fiction/1/": fix_div_paragraphs})
+
+    assert get_chapter_fixes("https://example.com/fiction/1/chapter/2") == [first, second, fix_div_paragraphs]
+    assert get_chapter_fixes("https://example.com/fiction/1/chapter/3") == [second, fix_div_paragraphs]
+    assert get_chapter_fixes("https://example.com/fiction/2/chapter/1") == [second]
+    assert get_chapter_fixes("https://example.com") == []
+    assert get_chapter_fixes("https://example.org/fiction/1/chapter/2") == []
+
+    # Like in a dict, a replaced fix keeps the position of the old one
+    register_chapter_fixes({"https://example.com/fiction/1/chapter/2": fix_div_paragraphs})
+    assert get_chapter_fixes("https://example.com/fiction/1/chapter/2") == [fix_div_paragraphs, second, fix_div_paragraphs]
+
+
+def test_get_chapter_fixes_of_host_module():
+    assert get_chapter_fixes(METAWORLD_CHAPTER) == [remove_piracy_paragraphs, fix_div_paragraphs]
+    assert get_chapter_fixes(METAWORLD_CHAPTER[:-1]) == [remove_piracy_paragraphs]
+    assert get_chapter_fixes("https://www.royalroad.com/fiction/14167") == [remove_piracy_paragraphs]
+    assert get_chapter_fixes("https://www.royalroad.com") == []
+    assert get_chapter_fixes("http://www.royalroad.com/fiction/14167") == []
+
+
+def test_registered_fixes_come_after_the_host_module():
+    def fix(*args):
+        pass
+
+    CHAPTER_FIXES["https://www.royalroad.com/fiction/14167/"] = fix
+
+    assert get_chapter_fixes(METAWORLD_CHAPTER) == [remove_piracy_paragraphs, fix_div_paragraphs, fix]
+    assert CHAPTER_FIXES["https://www.royalroad.com/fiction/14167/"] is fix
+    del CHAPTER_FIXES["https://www.royalroad.com/fiction/14167/"]
+    assert get_chapter_fixes(METAWORLD_CHAPTER) == [remove_piracy_paragraphs, fix_div_paragraphs]
@@ -0,0 +1,68 @@
+import copy
+
+import pytest
+from schema import Schema, SchemaError
+
+from scraper.config import validate_fiction_config
+from scraper.const import FICTION_CONFIG_SCHEMA
+
+MINIMAL_CONFIG = {
+    "start_url": "https://example.com/chapter/1",
+    "metadata": {"title": "Fiction", "author": "Author"},
+    "selectors": {"title_element": "h1", "content_element": ".content", "next_chapter_element": "a.next"},
+}
+
+
+def with_options(**options):
+    config = copy.deepcopy(MINIMAL_CONFIG)
+    for (key, value) in options.items():
+        if isinstance(value, dict) and isinstance(config.get(key), dict):
+            config[key].update(value)
+        else:
+            config[key] = value
+    return config
+
+
+VALID_CONFIGS = [
+    MINIMAL_CONFIG,
+    with_options(official_book_url=["https://example.com/book"], end_url="https://example.com/chapter/9"),
+    with_options(toc_url="https://example.com/toc", toc_link_selector="li a", download_workers=8, rate_limit=0.5),
+    with_options(metadata={"language": "de", "publisher": "Someone", "description": "About it", "subject": "Fantasy"}),
+    with_options(files={"ebook_formats": ["mobi"]}, cache_compression="zstd", streaming_bind=True),
+    with_options(selectors={"content_start_element": [{"chapter_url": "https://example.com/", "selector": "p"}],
+                            "cut_off_element": ["hr", ".note"]}),
+    with_options(volumes={"max_chapters": 100, "max_size": 10.5, "title_pattern": "^Book"}),
+    with_options(substitutions=[{"selector_type": "regex", "selector": "a+", "replace_with": "b"}],
+                 style="p { margin: 0; }"),
+]
+
+INVALID_CONFIGS = [
+    {},
+    with_options(start_url="example.com/chapter/1"),
+    with_options(end_url="ftp://example.com"),
+    with_options(download_workers=0),
+    with_options(download_workers="4"),
+    with_options(rate_limit=-1),
+    with_options(cache_compression="lzma"),
+    with_options(metadata={"language": "eng"}),
+    with_options(metadata={"unknown_tag": "value"}),
+    with_options(selectors={"cut_off_element": 1}),
+    with_options(volumes={"max_chapters": 0}),
+    with_options(substitutions=[{"selector_type": "xpath", "selector": "//p"}]),
+    with_options(unknown_option=True),
+    {key: value for (key, value) in MINIMAL_CONFIG.items() if key != "selectors"},
+]
+
+
+def validate(validator, config):
+    try:
+        return validator(copy.deepcopy(config))
+    except SchemaError:
+        return SchemaError
+
+
+@pytest.mark.parametrize("config", VALID_CONFIGS + INVALID_CONFIGS)
+def test_compiled_schema_matches_schema(config):
+    expected = validate(Schema(FICTION_CONFIG_SCHEMA).validate, config)
+    assert validate(validate_fiction_config, config) == expected
+    assert (expected is SchemaError) == (config in INVALID_CONFIGS)
@@ -0,0 +1,33 @@
+import os
+
+from scraper import config_index
+from scraper.config_index import ConfigIndex
+
+
+class FakeClient:
+    """Client which counts how often configs are loaded, and fails their validation."""
+
+    def __init__(self):
+        self.client_config = {"config_overrides": {}}
+        self.loaded = []
+
+    def load_fiction_config(self, name):
+        self.loaded.append(name)
+        return None
+
+
+def test_entries_are_loaded_again_when_the_schema_changes(tmp_path, monkeypatch):
+    monkeypatch.setattr(config_index, "CONFIGS_DIR", str(tmp_path))
+    (tmp_path / "fiction.yaml").write_text("start_url: https://example.com/\n")
+    index_file = str(tmp_path / "index.json")
+    client = FakeClient()
+
+    ConfigIndex(index_file).refresh(client, ["fiction"])
+    ConfigIndex(index_file).refresh(client, ["fiction"])
+    assert client.loaded == ["fiction"]
+
+    monkeypatch.setattr(config_index, "get_schema_fingerprint", lambda: "upgraded")
+    entries = ConfigIndex(index_file).refresh(client, ["fiction"])
+    assert client.loaded == ["fiction", "fiction"]
+    assert entries["fiction"]["schema"] == "upgraded"
+    assert ConfigIndex(index_file)[os.path.join(str(tmp_path), "fiction.yaml")]["schema"] == "upgraded"
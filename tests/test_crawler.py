@@ -0,0 +1,112 @@
+import os
+
+import pytest
+from bs4 import BeautifulSoup
+
+from benchmarks.fixtures import SITES, FixtureServer, render_page
+from scraper.cache_files import open_cache_file
+from scraper.crawler import Crawler
+from scraper.crawler.crawler import parse_fragments
+from scraper.manifest import Manifest
+
+
+def get_crawler_class(crawler_module):
+    if crawler_module == "AsyncCrawler":
+        pytest.importorskip("httpx")
+        from scraper.crawler import AsyncCrawler
+        return AsyncCrawler
+    return Crawler
+
+
+@pytest.mark.parametrize("crawler_module", ["Crawler", "AsyncCrawler"])
+@pytest.mark.parametrize("site", ["royalroad", "fictionpress", "wanderinginn"])
+def test_resumed_download_finds_new_chapters(fixture_config, site, crawler_module):
+    crawler_class = get_crawler_class(crawler_module)
+
+    with FixtureServer(6) as server:
+        config = fixture_config(site, server, crawler_module, toc_url="")
+        crawler_class(config).start_download()
+        assert len(Manifest(config.files.manifest_file)) == 6
+
+        manifest = Manifest(config.files.manifest_file)
+        manifest.put(5, {**manifest[5], "converted": True})
+        manifest.save()
+
+        server.chapters = 8
+        crawler_class(config).start_download()
+
+    manifest = Manifest(config.files.manifest_file)
+    assert [c["url"] for c in manifest] == [server.base_url + p for p in chapter_paths(site, 8)]
+    # The next chapter link of The Wandering Inn is in the content element, so its last chapter changed. The text of
+    # the others didn't change, so their last chapter isn't converted again, but its file links to the next chapter.
+    assert manifest[5]["converted"] == (site != "wanderinginn")
+    with open_cache_file(os.path.join(config.files.cache_folder, manifest[5]["file"])) as file:
+        assert chapter_paths(site, 8)[6].encode() in file.read()
+
+
+def chapter_paths(site, chapters):
+    return {
+        "royalroad": ["/royalroad/fiction/1/benchmark/chapter/%s/c" % i for i in range(chapters)],
+        "fictionpress": ["/fictionpress/s/1/%s/Benchmark" % (i + 1) for i in range(chapters)],
+        "wanderinginn": ["/wanderinginn/%s/chapter-%s/" % (i, i) for i in range(chapters)],
+    }[site]
+
+
+@pytest.mark.parametrize("crawler_module", ["Crawler", "AsyncCrawler"])
+@pytest.mark.parametrize("site", ["royalroad", "fictionpress", "wanderinginn"])
+def test_pipelined_download_stores_chapters_in_order(fixture_config, site, crawler_module):
+    crawler_class = get_crawler_class(crawler_module)
+
+    with FixtureServer(12) as server:
+        config = fixture_config(site, server, crawler_module, toc_url="")
+        crawler_class(config).start_download()
+        pipelined_config = fixture_config(site, server, crawler_module, "pipelined", toc_url="")
+        pipelined_config.pipelined_download = True
+        crawler_class(pipelined_config).start_download()
+
+    manifest = Manifest(config.files.manifest_file)
+    pipelined_manifest = Manifest(pipelined_config.files.manifest_file)
+    assert [c["url"] for c in pipelined_manifest] == [server.base_url + p for p in chapter_paths(site, 12)]
+    assert pipelined_manifest == manifest
+
+
+@pytest.mark.parametrize("crawler_module", ["Crawler", "AsyncCrawler"])
+def test_pipelined_download_raises_writer_errors(fixture_config, monkeypatch, crawler_module):
+    crawler_class = get_crawler_class(crawler_module)
+    save_chapter = Crawler.save_chapter
+
+    def fail_on_fourth_chapter(crawler, content, index=0):
+        if index == 3:
+            raise OSError("No space left on device")
+        return save_chapter(crawler, content, index)
+
+    monkeypatch.setattr(Crawler, "save_chapter", fail_on_fourth_chapter)
+
+    with FixtureServer(12) as server:
+        config = fixture_config("fictionpress", server, crawler_module)
+        config.pipelined_download = True
+        with pytest.raises(OSError, match="No space left on device"):
+            crawler_class(config).start_download()
+
+    manifest = Manifest(config.files.manifest_file)
+    assert [c["url"] for c in manifest] == [server.base_url + p for p in chapter_paths("fictionpress", 3)]
+
+
+@pytest.mark.parametrize("site", ["royalroad", "fictionpress", "wanderinginn"])
+@pytest.mark.parametrize("selector", [
+    None,
+    "a.btn",
+    "#storytext p:-soup-contains(\"paragraph 3\") em",
+    ".nav-buttons > a[href*=\"chapter\"]",
+    "article a:-soup-contains(\"Previous\")",
+    "p + p",
+    "li:nth-child(3) a",
+    "h1, h2",
+])
+def test_next_chapter_fragment_matches_page(site, selector):
+    selector = selector or SITES[site]["selectors"]["next_chapter_element"]
+    for path in chapter_paths(site, 3):
+        content = render_page(path, 3).encode("utf-8")
+        expected = BeautifulSoup(content, "lxml").select_one(selector)
+        actual = parse_fragments(content, selector).select_one(selector)
+        assert str(actual) == str(expected)
@@ -0,0 +1,109 @@
+import json
+import os
+import sys
+import threading
+import zipfile
+
+import pytest
+
+from scraper.ebook_formats import FormatConverter, get_format_file
+
+# Writes the output file and records the call, or fails for EPUB files with "broken" in their name
+STUB = """#!%(python)s
+import sys, time
+epub_file, output_file = sys.argv[1:3]
+with open(%(log)r, "a") as log:
+    log.write(output_file + "\\n")
+time.sleep(0.1)
+if "broken" in epub_file:
+    print("Conversion error: invalid EPUB", file=sys.stderr)
+    sys.exit(2)
+with open(output_file, "w") as file:
+    file.write("converted " + epub_file)
+"""
+
+pytestmark = pytest.mark.skipif(os.name == "nt", reason="the ebook-convert stub is started by its shebang line")
+
+
+@pytest.fixture
+def ebook_convert(tmp_path, monkeypatch):
+    """Put a stub ebook-convert on the PATH and return the function to read the outputs it was called with."""
+    bin_folder = tmp_path / "bin"
+    bin_folder.mkdir()
+    log = tmp_path / "ebook-convert.log"
+    stub = bin_folder / "ebook-convert"
+    stub.write_text(STUB % {"python": sys.executable, "log": str(log)})
+    stub.chmod(0o755)
+    monkeypatch.setenv("PATH", str(bin_folder) + os.pathsep + os.environ["PATH"])
+
+    return lambda: sorted(log.read_text().splitlines()) if log.exists() else []
+
+
+def create_epub(path, text="Chapter"):
+    with zipfile.ZipFile(path, "w") as book:
+        book.writestr("mimetype", "application/epub+zip")
+        book.writestr("EPUB/content.opf", '<meta property="dcterms:modified">2024-01-01T00:00:00Z</meta>')
+        book.writestr("EPUB/chapter00000.html", text)
+    return str(path)
+
+
+def test_up_to_date_outputs_are_skipped(tmp_path, ebook_convert):
+    epub_file = create_epub(tmp_path / "book.epub")
+    state_file = str(tmp_path / "formats.json")
+
+    FormatConverter(state_file).convert_all([epub_file], ["mobi", "azw3"])
+    assert ebook_convert() == sorted([get_format_file(epub_file, "mobi"), get_format_file(epub_file, "azw3")])
+
+    # Binding again only changes the modification date, so nothing is converted
+    create_epub(tmp_path / "book.epub")
+    FormatConverter(state_file).convert_all([epub_file], ["mobi", "azw3"])
+    assert len(ebook_convert()) == 2
+
+    create_epub(tmp_path / "book.epub", "Changed chapter")
+    os.remove(get_format_file(epub_file, "azw3"))
+    FormatConverter(state_file).convert_all([epub_file], ["mobi", "azw3"])
+    assert len(ebook_convert()) == 4
+
+
+def test_failed_conversion_is_reported_and_not_recorded(tmp_path, ebook_convert, capsys):
+    epub_file = create_epub(tmp_path / "broken.epub")
+    output_file = get_format_file(epub_file, "mobi")
+    state_file = str(tmp_path / "formats.json")
+
+    # An entry of an earlier successful conversion is removed when the output can't be created again
+    with open(state_file, "w") as file:
+        json.dump({output_file: "outdated"}, file)
+
+    FormatConverter(state_file).convert_all([epub_file], ["mobi"])
+
+    out = capsys.readouterr().out
+    assert "Could not convert broken.epub into broken.mobi, exit code: 2" in out
+    assert "Conversion error: invalid EPUB" in out
+    with open(state_file) as file:
+        assert json.load(file) == {}
+
+    FormatConverter(state_file).convert_all([epub_file], ["mobi"])
+    assert len(ebook_convert()) == 2
+
+
+def test_parallel_conversions_keep_the_state_file_intact(tmp_path, ebook_convert):
+    epub_files = [create_epub(tmp_path / ("book%s.epub" % i), "Book %s" % i) for i in range(6)]
+    state_file = str(tmp_path / "formats.json")
+
+    # Converters sharing a state file, like runs of configs with the same working folder
+    threads = [
+        threading.Thread(target=FormatConverter(state_file).convert_all, args=([epub_file], ["mobi", "pdf"]))
+        for epub_file in epub_files
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    with open(state_file) as file:
+        state = json.load(file)
+    assert sorted(state) == sorted(get_format_file(e, f) for e in epub_files for f in ("mobi", "pdf"))
+    assert not [f for f in os.listdir(tmp_path) if f.endswith(".tmp")]
+
+    FormatConverter(state_file).convert_all(epub_files, ["mobi", "pdf"])
+    assert len(ebook_convert()) == 12
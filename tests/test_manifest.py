@@ -0,0 +1,85 @@
+import json
+import os
+
+import pytest
+
+from scraper.manifest import Manifest
+
+
+def entry(index, **fields):
+    return {"title": "Chapter %s" % index, "file": "chapter%05d.html" % index, "converted": False, **fields}
+
+
+def read_lines(path):
+    with open(path, "r", encoding="utf-8") as file:
+        return file.read().splitlines()
+
+
+def test_put_is_replayed_over_the_snapshot(tmp_path):
+    path = str(tmp_path / "manifest.json")
+    manifest = Manifest(path)
+    for i in range(3):
+        manifest.put(i, entry(i))
+    manifest.save()
+
+    manifest.put(1, entry(1, converted=True))
+    manifest.put(3, entry(3))
+
+    # The snapshot is unchanged, the changes are only in the journal
+    with open(path, "r", encoding="utf-8") as file:
+        assert json.load(file) == [entry(i) for i in range(3)]
+    assert len(read_lines(manifest.journal_path)) == 2
+
+    assert Manifest(path) == [entry(0), entry(1, converted=True), entry(2), entry(3)]
+
+
+@pytest.mark.parametrize("cut", [1, 20])
+def test_truncated_last_journal_line_is_ignored(tmp_path, cut):
+    path = str(tmp_path / "manifest.json")
+    manifest = Manifest(path)
+    for i in range(3):
+        manifest.put(i, entry(i))
+
+    # The process was killed while writing the last line
+    with open(manifest.journal_path, "r+", encoding="utf-8") as file:
+        content = file.read()
+        file.seek(0)
+        file.truncate()
+        file.write(content[:-cut])
+
+    recovered = Manifest(path)
+    assert recovered == [entry(0), entry(1)]
+    # Loading doesn't change the journal, which might still be written by another process
+    assert Manifest(path) == [entry(0), entry(1)]
+
+    # The incomplete line is removed, so later changes aren't appended to it
+    recovered.put(2, entry(2, converted=True))
+    assert Manifest(path) == [entry(0), entry(1), entry(2, converted=True)]
+
+
+def test_save_compacts_the_journal_into_the_snapshot(tmp_path):
+    path = str(tmp_path / "manifest.json")
+    manifest = Manifest(path)
+    for i in range(3):
+        manifest.put(i, entry(i))
+    for i in range(3):
+        manifest.put(i, entry(i, converted=True))
+    assert len(read_lines(manifest.journal_path)) == 6
+
+    manifest.save()
+
+    assert not os.path.exists(manifest.journal_path)
+    assert not os.path.exists(path + ".tmp")
+    with open(path, "r", encoding="utf-8") as file:
+        assert json.load(file) == [entry(i, converted=True) for i in range(3)]
+    assert Manifest(path) == manifest
+
+
+def test_journal_which_skips_entries_is_not_applied(tmp_path, capsys):
+    path = str(tmp_path / "manifest.json")
+    with open(Manifest.get_journal_path(path), "w", encoding="utf-8") as file:
+        file.write(json.dumps({"index": 0, "entry": entry(0)}) + "\n")
+        file.write(json.dumps({"index": 2, "entry": entry(2)}) + "\n")
+
+    assert Manifest(path) == [entry(0)]
+    assert "does not match the manifest" in capsys.readouterr().out
@@ -0,0 +1,64 @@
+import os
+
+from scraper.manifest import Manifest
+from scraper.migration import migrate_chapter_files
+
+
+def write_file(path, content=""):
+    with open(path, "w", encoding="utf8") as file:
+        file.write(content)
+
+
+def read_folder(folder):
+    files = {}
+    for name in sorted(os.listdir(folder)):
+        with open(os.path.join(folder, name), "rb") as file:
+            files[name] = file.read()
+    return files
+
+
+def test_migrate_chapter_files(make_config, capsys):
+    files = make_config().files
+    old_names = ["chapter000.html", "chapter001.html", "chapter1234.html", "chapter12345.html"]
+
+    manifest = Manifest(files.manifest_file)
+    for (i, name) in enumerate(old_names):
+        manifest.put(i, {"title": "Chapter %d" % i, "file": name, "converted": True, "url": "http://localhost/%d" % i})
+        write_file(os.path.join(files.book_folder, name), "book %d" % i)
+    manifest.save()
+
+    write_file(os.path.join(files.cache_folder, "chapter000.html.gz"), "cache 0")
+    write_file(os.path.join(files.cache_folder, "chapter1234.html"), "cache 2")
+    write_file(os.path.join(files.cache_folder, "chapter12345.html.zst"), "cache 3")
+    # The cache file of this chapter was already renamed by an interrupted migration
+    write_file(os.path.join(files.cache_folder, "chapter00001.html"), "cache 1")
+    write_file(files.bind_state_file, "{}")
+
+    migrate_chapter_files(files)
+
+    new_names = ["chapter00000.html", "chapter00001.html", "chapter01234.html", "chapter12345.html"]
+    assert [c["file"] for c in Manifest(files.manifest_file)] == new_names
+    assert read_folder(files.book_folder) == {name: b"book %d" % i for (i, name) in enumerate(new_names)}
+    assert read_folder(files.cache_folder) == {
+        "chapter00000.html.gz": b"cache 0",
+        "chapter00001.html": b"cache 1",
+        "chapter01234.html": b"cache 2",
+        "chapter12345.html.zst": b"cache 3",
+    }
+    assert not os.path.isfile(files.bind_state_file)
+    assert "Renaming 3 chapter files" in capsys.readouterr().out
+
+    # Running it again doesn't change anything
+    with open(files.manifest_file, "rb") as file:
+        manifest_content = file.read()
+    book, cache = read_folder(files.book_folder), read_folder(files.cache_folder)
+    write_file(files.bind_state_file, "{}")
+
+    migrate_chapter_files(files)
+
+    with open(files.manifest_file, "rb") as file:
+        assert file.read() == manifest_content
+    assert read_folder(files.book_folder) == book
+    assert read_folder(files.cache_folder) == cache
+    assert os.path.isfile(files.bind_state_file)
+    assert capsys.readouterr().out == ""
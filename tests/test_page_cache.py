@@ -0,0 +1,74 @@
+import itertools
+import os
+import random
+from types import SimpleNamespace
+
+import pytest
+
+from scraper import page_cache
+from scraper.page_cache import PageCache
+
+
+@pytest.fixture(autouse=True)
+def clock(monkeypatch):
+    """Let every access happen one second after the previous one, so the order of accesses is unambiguous."""
+    counter = itertools.count(1000)
+    monkeypatch.setattr(page_cache, "time", SimpleNamespace(time=lambda: next(counter)))
+
+
+def page(i):
+    # Random bytes don't compress, so all pages have the same size in the cache
+    return random.Random(i).randbytes(4000)
+
+
+def files_on_disk(folder):
+    return {f[:-len(".gz")] for (_, _, files) in os.walk(folder) for f in files if f.endswith(".gz")}
+
+
+def test_least_recently_used_pages_are_evicted(tmp_path):
+    cache = PageCache(str(tmp_path), max_size=1)
+    for i in range(8):
+        cache.put("https://example.com/chapter/%s" % i, "https://example.com/chapter/%s" % i, page(i))
+
+    sizes = {e["size"] for e in cache.index.values()}
+    assert len(sizes) == 1
+    cache.max_size = 5 * sizes.pop()
+
+    # The oldest pages are read again, so pages 2, 3 and 4 are the least recently used ones
+    assert cache.get("https://example.com/chapter/0")[1] == page(0)
+    assert cache.get("HTTPS://Example.com:443/chapter/1")[1] == page(1)
+    cache.save()
+
+    kept = [0, 1, 5, 6, 7]
+    assert sorted(cache.index) == ["https://example.com/chapter/%s" % i for i in kept]
+    assert files_on_disk(tmp_path) == {e["hash"] for e in cache.index.values()}
+    assert cache.get("https://example.com/chapter/2") is None
+
+    reloaded = PageCache(str(tmp_path), cache.max_size)
+    assert reloaded.index == cache.index
+    for i in kept:
+        assert reloaded.get("https://example.com/chapter/%s" % i)[1] == page(i)
+
+
+def test_pages_are_stored_by_content(tmp_path):
+    cache = PageCache(str(tmp_path), max_size=1024 * 1024)
+    cache.put("https://example.com/chapter/1", "https://example.com/chapter/1", page(1), {"etag": '"1"'})
+    # A redirect and another URL of the same page share the file
+    cache.put("https://example.com/c/1", "https://example.com/chapter/1", page(1))
+    cache.put("https://example.com/chapter/2", "https://example.com/chapter/2", page(2))
+    assert len(files_on_disk(tmp_path)) == 2
+
+    assert cache.get("https://example.com/c/1") == ("https://example.com/chapter/1", page(1), {})
+
+    # The old version of a changed page is removed, once no URL refers to it
+    cache.put("https://example.com/chapter/2", "https://example.com/chapter/2", page(3))
+    cache.save()
+    assert files_on_disk(tmp_path) == {e["hash"] for e in cache.index.values()}
+    assert len(files_on_disk(tmp_path)) == 2
+    assert cache.get("https://example.com/chapter/2")[1] == page(3)
+
+    # A new version downloaded through the redirect replaces the page of both URLs
+    cache.put("https://example.com/c/1", "https://example.com/chapter/1", page(4))
+    cache.save()
+    assert files_on_disk(tmp_path) == {e["hash"] for e in cache.index.values()}
+    assert cache.get("https://example.com/chapter/1")[1] == page(4)
@@ -0,0 +1,58 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from scraper.rate_limit import get_rate_limiter
+from scraper.session import configure_session, create_session
+
+
+class UnavailableRequestHandler(BaseHTTPRequestHandler):
+    """Answers the first two requests with 503."""
+
+    def do_GET(self):
+        self.server.requests += 1
+        status = 503 if self.server.requests <= 2 else 200
+        self.send_response(status)
+        self.send_header("Retry-After", "0")
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), UnavailableRequestHandler)
+    server.requests = 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def rate_limiter():
+    rate_limiter = get_rate_limiter()
+    rate_limiter.configure(requests_per_second=20, burst=1)
+    rate_limiter.metrics.clear()
+    configure_session(backoff_factor=0)
+    yield rate_limiter
+    rate_limiter.configure()
+    rate_limiter.metrics.clear()
+    configure_session()
+
+
+def test_retries_wait_for_the_rate_limit(server, rate_limiter):
+    url = "http://127.0.0.1:%s/chapter" % server.server_address[1]
+
+    r = create_session().get(url)
+
+    assert r.status_code == 200
+    assert len(r.raw.retries.history) == 2
+    metrics = rate_limiter.get_metrics()["127.0.0.1:%s" % server.server_address[1]]
+    assert metrics["requests"] == 3
+    # The burst is spent by the first attempt, so both retries waited for a token
+    assert metrics["wait_time"] > 0.05
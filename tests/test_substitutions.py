@@ -0,0 +1,106 @@
+import random
+import re
+
+import pytest
+from bs4 import BeautifulSoup
+
+from scraper.config import Substitution
+from scraper.substitutions import SubstitutionPlan, TextReplacement
+
+
+def text(selector, replace_with=""):
+    return Substitution("text", selector, replace_with=replace_with)
+
+
+def regex(selector, replace_with=""):
+    return Substitution("regex", selector, replace_with=replace_with)
+
+
+def css(selector, replace_with="", chapter_url=""):
+    return Substitution("css", selector, chapter_url=chapter_url, replace_with=replace_with, warn=False)
+
+
+def apply_one_by_one(substitutions, doc):
+    """Apply the text and regex substitutions one after another, like the converter did before they were merged."""
+    for s in substitutions:
+        if s.selector_type == "text":
+            doc = doc.replace(s.selector, s.replace_with)
+        elif s.selector_type == "regex":
+            doc = re.sub(s.selector, s.replace_with, doc)
+    return doc
+
+
+def apply_css_one_by_one(substitutions, content_el, url):
+    for s in substitutions:
+        if s.selector_type != "css" or (s.chapter_url and s.chapter_url != url):
+            continue
+        for el in content_el.select(s.selector):
+            if s.replace_with:
+                el.replace_with(s.replace_with)
+            else:
+                el.decompose()
+
+
+DOC = "<p>Chapter (1): a.b costs $5 \\ abc axb, ab+ [note] a*b end.</p>"
+
+
+@pytest.mark.parametrize("substitutions", [
+    # Chained replacements
+    [text("a", "b"), text("b", "c")],
+    [text("ab", "x"), text("x", "y"), text("y", "ab")],
+    # Overlapping strings
+    [text("ab", "x"), text("bc", "y")],
+    [text("abc", "1"), text("bc", "2"), text("c", "3")],
+    [text("a", "b"), text("a", "c")],
+    # Text around a removed string joins into another string
+    [text("x"), text("ab", "Z")],
+    [text(" "), text("costs$5", "free")],
+    # Regex-special characters in text selectors and replacements
+    [text("a.b", "X"), text("(1)", "[one]"), text("$", "USD"), text("\\", "/"), text("a*b", "\\1")],
+    [text("[note]", ""), text("ab+", "$0"), text("end.", "|")],
+    # Regex substitutions between text substitutions
+    [text("a", "b"), regex(r"b+", "B"), text("B", "c"), text("end", "fin")],
+    [regex(r"\((\d)\)", r"<\1>"), text("<1>", "one"), text("one", "two")],
+])
+def test_merged_text_substitutions_match_one_by_one(substitutions):
+    assert SubstitutionPlan(substitutions).apply_text(DOC) == apply_one_by_one(substitutions, DOC)
+
+
+def test_random_text_substitutions_match_one_by_one():
+    rng = random.Random(1)
+    merged = 0
+
+    for _ in range(3000):
+        substitutions = [
+            text("".join(rng.choices("ab.*", k=rng.randint(1, 3))), "".join(rng.choices("ab.*", k=rng.randint(0, 2))))
+            for _ in range(rng.randint(2, 5))
+        ]
+        doc = "".join(rng.choices("ab.*c", k=30))
+        plan = SubstitutionPlan(substitutions)
+        merged += sum(len(s.replacements) - 1 for s in plan.steps if isinstance(s, TextReplacement))
+
+        assert plan.apply_text(doc) == apply_one_by_one(substitutions, doc), substitutions
+
+    # Some of the rule sets were merged, otherwise the comparison would be meaningless
+    assert merged > 100
+
+
+@pytest.mark.parametrize("url", ["https://example.com/1", "https://example.com/2"])
+def test_css_substitutions_match_one_by_one(url):
+    substitutions = [
+        css(".ad"),
+        css("p.note", "[note]", chapter_url="https://example.com/1"),
+        css("span", "(span)"),
+        css("p:-soup-contains(\"[note]\")", chapter_url="https://example.com/1"),
+        css("em", chapter_url="https://example.com/2"),
+        text("span", "SPAN"),
+    ]
+    page = '<div class="content"><p>One <span>two</span> <em>three</em></p><p class="note">Note <span>x</span></p>' \
+           '<div class="ad">Ad</div><p>Four</p></div>'
+
+    expected = BeautifulSoup(page, "lxml").select_one(".content")
+    apply_css_one_by_one(substitutions, expected, url)
+    actual = BeautifulSoup(page, "lxml").select_one(".content")
+    SubstitutionPlan(substitutions).apply_css(actual, "Chapter", url)
+
+    assert str(actual) == str(expected)
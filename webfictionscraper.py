@@ -1,16 +1,24 @@
 import os
 
 import click
-import questionary
-from questionary import Choice, Separator
 from click import echo, progressbar
 
-from scraper import FictionScraperClient
-
-client = FictionScraperClient()
+from scraper.utils import list_config_names, print_paths as print_scraper_paths
 
 HEADLESS = False
 
+# The client and the modules of the commands are loaded when a command needs them, so --help and the commands which
+# only read the configs folder start quickly
+_client = None
+
+
+def get_client():
+    global _client
+    if _client is None:
+        from scraper.client import FictionScraperClient
+        _client = FictionScraperClient()
+    return _client
+
 
 @click.group()
 @click.option("--headless", is_flag=True, help="Do not prompt for any user input")
@@ -29,23 +37,20 @@ def interactive(ctx):
         echo("Don't pass the --headless argument and set the SCRAPER_HEADLESS env variable to anything but 'true'.")
         return
 
-    configs = client.list_fiction_configs()
+    import questionary
+    from questionary import Choice, Separator
+
+    client = get_client()
+    # Only configs which changed since the last time are loaded and validated again
+    configs = client.index_fiction_configs()
     choices = []
 
     if len(configs) > 0:
-        with progressbar(configs, label="Loading configs") as bar:
-            for config_name in bar:
-                try:
-                    config = client.load_fiction_config(config_name)
-                except Exception as error:
-                    echo('Error loading config \'%s\': %s' % (config_name, error))
-                    input('Press enter to continue...')
-                    continue
-
-                if config:
-                    choices.append(Choice(title=config.metadata.title, value='config:%s' % config_name))
-                else:
-                    input('Press enter to continue...')
+        for (config_name, entry) in configs.items():
+            if entry["valid"]:
+                choices.append(Choice(title=entry["title"], value="config:%s" % config_name))
+            else:
+                choices.append(Choice(title="%s (invalid)" % config_name, disabled=entry["error"]))
 
         choices.sort(key=lambda c: c.title)
     else:
@@ -104,6 +109,7 @@ def interactive(ctx):
             choices=[
                 Choice(title="Download chapters", value="download", checked=True),
                 Choice(title="Clean download chapters", value="clean_download", checked=False),
+                Choice(title="Update changed chapters", value="update", checked=False),
                 Choice(title="Convert chapters", value="convert", checked=True),
                 Choice(title="Clean convert chapters", value="clean_convert", checked=False),
                 Choice(title="Bind chapters into eBook", value="bind", checked=True),
@@ -121,7 +127,8 @@ def interactive(ctx):
             "convert" in tasks,
             "clean_convert" in tasks,
             "bind" in tasks,
-            "format" in tasks
+            "format" in tasks,
+            "update" in tasks
         )
 
     if questionary.confirm("Do you want to return to the main menu?").ask():
@@ -133,24 +140,68 @@ def interactive(ctx):
 @click.argument("config_name")
 @click.option("--download/--no-download", default=True, help="Enable/disable chapter download")
 @click.option("--clean-download", is_flag=True, help="Clear existing downloaded chapters")
+@click.option("--update", is_flag=True, help="Download chapters again, which changed since they were downloaded")
 @click.option("--convert/--no-convert", default=True, help="Enable/disable chapter conversion")
 @click.option("--clean-convert", is_flag=True, help="Clear existing converted chapters")
 @click.option("--bind/--no-bind", default=True, help="Enable/disable eBook creation")
 @click.option("--ebook-convert/--no-ebook-convert", default=True, help="Create eBook formats specified in the config")
-def run(config_name, download, clean_download, convert, clean_convert, bind, ebook_convert):
+@click.option("--report", type=click.Path(dir_okay=False), help="Write a JSON report with timings and metrics of the run")
+@click.option("--prometheus", type=click.Path(dir_okay=False), help="Write the metrics of the run in Prometheus text format")
+@click.option("--profile", is_flag=True, help="Profile the run and print the functions which took the most time")
+def run(config_name, download, clean_download, update, convert, clean_convert, bind, ebook_convert, report, prometheus, profile):
     """Run the scraper with the provided CONFIG_NAME.
 
     CONFIG_NAME can be a path to a YAML config file, the name of a built-in config or the name of a config inside
     the users configs/ directory. To list all automatically detected config files, use the list-configs command.
     """
-    client.run(config_name, download, clean_download, convert, clean_convert, bind, ebook_convert)
+    args = (config_name, download, clean_download, convert, clean_convert, bind, ebook_convert, update, report, prometheus)
+    if profile:
+        from scraper.metrics import run_profiled
+        run_profiled(get_client().run, *args)
+    else:
+        get_client().run(*args)
+
+
+@cli.command()
+@click.argument("config_names", nargs=-1)
+@click.option("--download/--no-download", default=True, help="Enable/disable chapter download")
+@click.option("--clean-download", is_flag=True, help="Clear existing downloaded chapters")
+@click.option("--update", is_flag=True, help="Download chapters again, which changed since they were downloaded")
+@click.option("--convert/--no-convert", default=True, help="Enable/disable chapter conversion")
+@click.option("--clean-convert", is_flag=True, help="Clear existing converted chapters")
+@click.option("--bind/--no-bind", default=True, help="Enable/disable eBook creation")
+@click.option("--ebook-convert/--no-ebook-convert", default=True, help="Create eBook formats specified in the config")
+@click.option("--jobs", "-j", type=int, default=4, help="Number of sites processed in parallel")
+@click.option("--report", type=click.Path(dir_okay=False), help="Write a JSON report with timings and metrics of the runs")
+@click.option("--prometheus", type=click.Path(dir_okay=False), help="Write the metrics of the runs in Prometheus text format")
+@click.option("--profile", is_flag=True, help="Profile the runs and print the functions which took the most time")
+def run_all(config_names, download, clean_download, update, convert, clean_convert, bind, ebook_convert, jobs, report, prometheus, profile):
+    """Run the scraper with multiple configs at once.
+
+    CONFIG_NAMES are the names or paths of the configs to run, if none are provided all configs inside the users
+    configs/ directory are run. Fictions from different sites are processed in parallel, fictions from the same site
+    one after another.
+    """
+    if not config_names:
+        config_names = sorted(list_config_names() or [])
+
+    args = (list(config_names), download, clean_download, convert, clean_convert, bind, ebook_convert, update, jobs, report, prometheus)
+    if profile:
+        from scraper.metrics import run_profiled
+        run_profiled(get_client().run_all, *args)
+    else:
+        get_client().run_all(*args)
 
 
 @cli.command()
 @click.option("--remote", "-r", is_flag=True, help="List all configs in the remote repository")
-def list_configs(remote: bool):
+@click.option("--details", "-d", is_flag=True, help="Show title, author, validation status and chapters of the configs")
+def list_configs(remote: bool, details: bool):
     """List all detected configs."""
-    configs = client.list_fiction_configs(remote)
+    if details and not remote:
+        configs = get_client().index_fiction_configs()
+    else:
+        configs = get_client().list_fiction_configs(remote) if remote else list_config_names() or []
 
     if remote and not configs:
         echo("Could not get repository contents.")
@@ -159,7 +210,14 @@ def list_configs(remote: bool):
     else:
         echo("Available configs:")
         for c in configs:
-            echo("  %s" % c)
+            if not details or remote:
+                echo("  %s" % c)
+            elif (entry := configs[c])["valid"]:
+                stats = entry["stats"]
+                echo("  %s: %s by %s, %s chapters, %s converted%s" % (
+                    c, entry["title"], entry["author"], stats["chapters"], stats["converted"], ", eBook created" if stats["epub"] else ""))
+            else:
+                echo("  %s: invalid config (%s)" % (c, entry["error"]))
 
 
 @cli.command()
@@ -172,6 +230,9 @@ def download_config(config_name: str, all: bool, overwrite: bool, prompt=True):
         echo("Either the config_name argument or the --all option is required.")
         return
 
+    import questionary
+
+    client = get_client()
     if all:
         configs = client.list_fiction_configs(remote=True)
         downloaded = []
@@ -209,15 +270,28 @@ def generate_config(url, name=None):
     - Royal Road
     - FictionPress
     """
+    import questionary
+
+    client = get_client()
     config_name = client.generate_fiction_config(url, name)
     if not HEADLESS and questionary.confirm("Do you want to run the config now?", default=False).ask():
         client.run(config_name, True, False, True, False, True, False)
 
 
+@cli.command()
+@click.option("--interval", "-i", type=int, default=0, help="Minutes between checks, check only once if not set")
+def watch(interval: int):
+    """Run the monitored fictions from the client config, if their feeds have new items.
+
+    The feeds are fetched with conditional requests, the items already seen are stored in the base directory.
+    """
+    get_client().watch(interval)
+
+
 @cli.command()
 def print_paths():
     """Print all paths used by the scraper."""
-    client.print_paths()
+    print_scraper_paths()
 
 
 @cli.command()
@@ -239,7 +313,7 @@ def clean_space(all_folders: bool, orphan_folders: bool, config: [str], everythi
 
     If nothing is selected, nothing will happen.
     """
-    client.clean_space(all_folders, orphan_folders, config, everything, downloads, converted, books, misc, dry_run)
+    get_client().clean_space(all_folders, orphan_folders, config, everything, downloads, converted, books, misc, dry_run)
 
 
 if __name__ == "__main__":